@@ -0,0 +1,54 @@
+"""Compare per-record cost of the previous list-based EndpointFilter with the set/prefix-based filter in
+lims_utils.logging, with the default ignore list (with and without a query string), and as the ignore list grows
+
+Run with: python -m benchmarks.endpoint_filter"""
+
+import logging
+from timeit import repeat
+
+from lims_utils.logging import EndpointFilter
+
+NUMBER = 100_000
+
+
+class ListEndpointFilter(logging.Filter):
+    def __init__(self, paths_to_ignore):
+        self.paths_to_ignore = paths_to_ignore
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if type(record.args) is not tuple:
+            return True
+
+        return not record.args or record.args[2] not in self.paths_to_ignore
+
+
+def record(path: str):
+    return logging.LogRecord("uvicorn.access", logging.INFO, "", 0, "%s %s %s", ("127.0.0.1", "GET", path), None)
+
+
+def report(name: str, func):
+    # Best of several runs, since other processes easily add noise at this scale
+    seconds = min(repeat(func, number=NUMBER, repeat=10))
+    print(f"{name:<40} {seconds / NUMBER * 1e9:>10.0f} ns/record")
+
+
+if __name__ == "__main__":
+    default = ["/api/docs", "/docs"]
+    list_default = ListEndpointFilter(default)
+    set_default = EndpointFilter(default)
+    for label, path in (("no query", "/proposals/cm12345/sessions"), ("query", "/proposals/cm12345/sessions?page=2")):
+        logged = record(path)
+        report(f"list (default, {label})", lambda: list_default.filter(logged))
+        report(f"set + prefixes (default, {label})", lambda: set_default.filter(logged))
+
+    logged = record("/proposals/cm12345/sessions?page=2")
+
+    for size in (2, 20, 200):
+        paths = [f"/ignored/{i}" for i in range(size)]
+        patterns = paths[: size // 2] + [f"/prefix/{i}/*" for i in range(size // 2)]
+
+        list_filter = ListEndpointFilter(paths)
+        set_filter = EndpointFilter(patterns)
+
+        report(f"list ({size} paths)", lambda: list_filter.filter(logged))
+        report(f"set + prefixes ({size} paths)", lambda: set_filter.filter(logged))
@@ -0,0 +1,94 @@
+"""Compare loading a proposal's processing results by walking ORM relationships with lims_utils.hierarchy
+
+Run with: python -m benchmarks.hierarchy"""
+
+from itertools import count
+from time import perf_counter
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.hierarchy import load_hierarchy
+from lims_utils.tables import (  # type: ignore
+    AutoProc,
+    AutoProcIntegration,
+    AutoProcProgram,
+    AutoProcScaling,
+    AutoProcScalingStatistics,
+    BLSession,
+    DataCollection,
+    DataCollectionGroup,
+    Proposal,
+)
+
+PROPOSALS = 2
+SESSIONS = 20
+GROUPS = 5
+COLLECTIONS = 4
+PROGRAMS = 3
+STATISTICS = 3
+
+
+def populate(session: Session):
+    ids = count(1)
+    for proposal_id in range(1, PROPOSALS + 1):
+        session.add(Proposal(proposalId=proposal_id, proposalCode="cm", proposalNumber=str(proposal_id), personId=1))
+        for visit_number in range(1, SESSIONS + 1):
+            session_id = next(ids)
+            session.add(BLSession(sessionId=session_id, proposalId=proposal_id, visit_number=visit_number))
+            for _ in range(GROUPS):
+                group_id = next(ids)
+                session.add(DataCollectionGroup(dataCollectionGroupId=group_id, sessionId=session_id))
+                for _ in range(COLLECTIONS):
+                    collection_id = next(ids)
+                    session.add(DataCollection(dataCollectionId=collection_id, dataCollectionGroupId=group_id))
+                    for _ in range(PROGRAMS):
+                        program_id, auto_proc_id, scaling_id = next(ids), next(ids), next(ids)
+                        session.add_all(
+                            [
+                                AutoProcProgram(autoProcProgramId=program_id),
+                                AutoProcIntegration(dataCollectionId=collection_id, autoProcProgramId=program_id),
+                                AutoProc(autoProcId=auto_proc_id, autoProcProgramId=program_id),
+                                AutoProcScaling(autoProcScalingId=scaling_id, autoProcId=auto_proc_id),
+                                *(AutoProcScalingStatistics(autoProcScalingId=scaling_id) for _ in range(STATISTICS)),
+                            ]
+                        )
+    session.commit()
+
+
+def walk_relationships(session: Session):
+    statistics = 0
+    for proposal in session.scalars(select(Proposal).filter(Proposal.proposalId.in_(range(1, PROPOSALS + 1)))):
+        for bl_session in proposal.BLSession:
+            for group in bl_session.DataCollectionGroup:
+                for collection in group.DataCollection:
+                    for integration in collection.AutoProcIntegration:
+                        for auto_proc in integration.AutoProcProgram.AutoProc:
+                            for scaling in auto_proc.AutoProcScaling:
+                                statistics += len(scaling.AutoProcScalingStatistics)
+    return statistics
+
+
+def run(name, engine, function):
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+
+    with Session(engine) as session:
+        start = perf_counter()
+        function(session)
+        elapsed = perf_counter() - start
+
+    event.remove(engine, "before_cursor_execute", listener)
+    print(f"{name:<30} {elapsed * 1000:>10.2f} ms {len(statements):>8} queries")
+
+
+if __name__ == "__main__":
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        populate(session)
+
+    print(f"{PROPOSALS} proposals, {PROPOSALS * SESSIONS * GROUPS * COLLECTIONS} data collections (in-memory SQLite)")
+    run("relationship walk", engine, walk_relationships)
+    run("load_hierarchy", engine, lambda session: load_hierarchy(session, range(1, PROPOSALS + 1)))
@@ -0,0 +1,40 @@
+"""Compare a typical JSON formatter wrapper with JSONFormatter in lims_utils.logging
+
+Run with: python -m benchmarks.json_logging"""
+
+import datetime
+import json
+import logging
+from timeit import timeit
+
+from lims_utils.logging import JSONFormatter
+
+NUMBER = 100_000
+
+
+class WrapperFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(
+            {
+                "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": super().format(record),
+            }
+        )
+
+
+def report(name: str, seconds: float):
+    print(f"{name:<40} {seconds / NUMBER * 1e9:>10.0f} ns/record")
+
+
+if __name__ == "__main__":
+    record = logging.LogRecord(
+        "uvicorn", logging.WARNING, "", 0, "%s @ %s: %s", ("abc12345", "/proposals/cm1", "Not found"), None
+    )
+
+    wrapper = WrapperFormatter()
+    formatter = JSONFormatter()
+
+    report("wrapper", timeit(lambda: wrapper.format(record), number=NUMBER))
+    report("JSONFormatter", timeit(lambda: formatter.format(record), number=NUMBER))
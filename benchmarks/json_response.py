@@ -0,0 +1,78 @@
+"""Compare FastAPI's jsonable_encoder with lims_utils.models.dump_json when serialising pages
+
+Run with: python -m benchmarks.json_response"""
+
+import datetime
+import json
+from timeit import timeit
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.models import Paged, dump_json
+from lims_utils.tables import Proposal  # type: ignore
+
+PAGE_SIZE = 500
+NUMBER = 20
+
+
+class ProposalOut(BaseModel):
+    proposalId: int
+    proposalCode: str
+    proposalNumber: str
+    title: str
+    startDate: datetime.datetime
+    state: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+def report(name: str, seconds: float):
+    print(f"{name:<45} {seconds / NUMBER * 1000:>10.2f} ms/page")
+
+
+if __name__ == "__main__":
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all(
+            [
+                Proposal(
+                    proposalId=i,
+                    personId=1,
+                    proposalCode="cm",
+                    proposalNumber=str(i),
+                    title=f"Proposal {i}",
+                    startDate=datetime.datetime(2024, 1, 1),
+                    state="Open",
+                )
+                for i in range(1, PAGE_SIZE + 1)
+            ]
+        )
+        session.commit()
+
+        objects = session.scalars(select(Proposal)).all()
+        rows = session.execute(select(*(getattr(Proposal, field) for field in ProposalOut.model_fields))).all()
+
+        page = Paged.from_trusted(items=objects, total=PAGE_SIZE, page=0, limit=PAGE_SIZE)
+        row_page = Paged.from_trusted(items=rows, total=PAGE_SIZE, page=0, limit=PAGE_SIZE)
+
+        print(f"{PAGE_SIZE} items per page")
+        report(
+            "response model + jsonable_encoder (objects)",
+            timeit(
+                lambda: json.dumps(jsonable_encoder(Paged[ProposalOut].model_validate(page))).encode(),  # type: ignore
+                number=NUMBER,
+            ),
+        )
+        report(
+            "response model + jsonable_encoder (rows)",
+            timeit(
+                lambda: json.dumps(jsonable_encoder(Paged[ProposalOut].model_validate(row_page))).encode(),  # type: ignore
+                number=NUMBER,
+            ),
+        )
+        report("dump_json (objects)", timeit(lambda: dump_json(page), number=NUMBER))
+        report("dump_json (rows)", timeit(lambda: dump_json(row_page), number=NUMBER))
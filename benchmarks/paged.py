@@ -0,0 +1,78 @@
+"""Compare validated and trusted construction of Paged responses, and the cost of each row format
+
+Run with: python -m benchmarks.paged"""
+
+from timeit import timeit
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.models import Paged
+from lims_utils.tables import Proposal  # type: ignore
+
+PAGE_SIZES = [25, 100, 500]
+NUMBER = 200
+
+
+class ProposalOut(BaseModel):
+    proposalId: int
+    proposalNumber: str
+    title: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+def report(name: str, page_size: int, seconds: float):
+    print(f"{name:<30} {page_size:>5} items {seconds / NUMBER * 1e6:>10.1f} us/page")
+
+
+if __name__ == "__main__":
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all(
+            [
+                Proposal(proposalId=i, proposalCode="cm", proposalNumber=str(i), title=f"Proposal {i}", personId=1)
+                for i in range(1, max(PAGE_SIZES) + 1)
+            ]
+        )
+        session.commit()
+
+        for page_size in PAGE_SIZES:
+            columns_query = select(Proposal.proposalId, Proposal.proposalNumber, Proposal.title).limit(page_size)
+            rows = session.execute(columns_query).all()
+            objects = session.scalars(select(Proposal).limit(page_size)).all()
+
+            for name, items in (("rows", rows), ("ORM objects", objects)):
+                report(
+                    f"validated ({name})",
+                    page_size,
+                    timeit(lambda: Paged(items=items, total=1000, page=0, limit=page_size), number=NUMBER),
+                )
+                report(
+                    f"trusted ({name})",
+                    page_size,
+                    timeit(lambda: Paged.from_trusted(items=items, total=1000, page=0, limit=page_size), number=NUMBER),
+                )
+
+            report(
+                "validated (Paged[schema])",
+                page_size,
+                timeit(
+                    lambda: Paged[ProposalOut](items=objects, total=1000, page=0, limit=page_size),  # type: ignore
+                    number=NUMBER,
+                ),
+            )
+
+            report("fetch as rows", page_size, timeit(lambda: session.execute(columns_query).all(), number=NUMBER))
+            report(
+                "fetch as tuples",
+                page_size,
+                timeit(lambda: [tuple(row) for row in session.execute(columns_query)], number=NUMBER),
+            )
+            report(
+                "fetch as dicts",
+                page_size,
+                timeit(lambda: [dict(row) for row in session.execute(columns_query).mappings()], number=NUMBER),
+            )
@@ -0,0 +1,39 @@
+"""Compare validating every proposal reference with the memoised parse_proposal/parse_proposals in lims_utils.models
+
+Run with: python -m benchmarks.parse_proposal"""
+
+from timeit import timeit
+
+from lims_utils.models import ProposalReference, parse_proposal, parse_proposals
+
+NUMBER = 100_000
+REFERENCES = [f"cm{number}" for number in range(30000, 30100)]
+
+
+def validated_parse_proposal(proposal_reference: str, visit_number: int | None = None):
+    return ProposalReference(
+        code=proposal_reference[0:2],
+        number=proposal_reference[2:],  # type: ignore
+        visit_number=visit_number,
+    )
+
+
+def report(name: str, seconds: float, calls: int = NUMBER):
+    print(f"{name:<40} {seconds / calls * 1e9:>10.0f} ns/reference")
+
+
+if __name__ == "__main__":
+    report("validated", timeit(lambda: validated_parse_proposal("cm31234", 2), number=NUMBER))
+    report("parse_proposal", timeit(lambda: parse_proposal("cm31234", 2), number=NUMBER))
+    report(
+        "parse_proposal (cache misses)",
+        timeit(lambda: [parse_proposal(f"mx{i}") for i in range(10_000)], number=1),
+        10_000,
+    )
+
+    batch = [f"{reference}-1" for reference in REFERENCES]
+    report(
+        "validated (batch of 100)",
+        timeit(lambda: [validated_parse_proposal(r, 1) for r in REFERENCES], number=NUMBER // 100),
+    )
+    report("parse_proposals (batch of 100)", timeit(lambda: parse_proposals(batch), number=NUMBER // 100))
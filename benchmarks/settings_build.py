@@ -0,0 +1,60 @@
+"""Compare building settings when the config file is parsed for every field, once per build, and only when it
+changes, for an increasing number of fields
+
+Run with: python -m benchmarks.settings_build"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from timeit import timeit
+from typing import Any, Tuple
+
+from pydantic import create_model
+from pydantic.fields import FieldInfo
+
+from lims_utils import settings as settings_module
+from lims_utils.settings import DB, JsonConfigSettingsSource, Settings
+
+NUMBER = 1000
+
+
+class PerFieldSource(JsonConfigSettingsSource):
+    """Previous implementation, which parsed the whole file for each field"""
+
+    def get_field_value(self, field: FieldInfo, field_name: str) -> Tuple[Any, str, bool]:
+        encoding = self.config.get("env_file_encoding")
+        file_content_json = json.loads(Path(os.environ.get("CONFIG_PATH") or "config.json").read_text(encoding))
+        return file_content_json.get(field_name), field_name, False
+
+
+def settings_class(field_count: int, source: type):
+    fields: Any = {f"field{i}": (DB, DB()) for i in range(field_count)}
+    cls = create_model(f"Settings{field_count}", __base__=Settings, **fields)
+    cls.settings_customise_sources = classmethod(  # type: ignore
+        lambda _, settings_cls, init_settings, **kwargs: (init_settings, source(settings_cls))
+    )
+    return cls
+
+
+def report(name: str, field_count: int, seconds: float):
+    print(f"{name:<20} {field_count:>4} fields {seconds / NUMBER * 1e6:>10.1f} us/build")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        for field_count in (2, 10, 20, 50):
+            config = Path(directory) / f"config{field_count}.json"
+            config.write_text(json.dumps({f"field{i}": {"pool": i, "overflow": i} for i in range(field_count)}))
+            os.environ["CONFIG_PATH"] = str(config)
+
+            per_field = settings_class(field_count, PerFieldSource)
+            cached = settings_class(field_count, JsonConfigSettingsSource)
+
+            def once_per_build():
+                settings_module._config_cache.clear()
+                cached()
+
+            report("per field", field_count, timeit(per_field, number=NUMBER))
+            report("once per build", field_count, timeit(once_per_build, number=NUMBER))
+            report("cached", field_count, timeit(cached, number=NUMBER))
@@ -0,0 +1,63 @@
+"""Compare pure Python decoding/compositing of XRF maps with the vectorised implementation in lims_utils.xrf
+
+Run with: python -m benchmarks.xrf_maps"""
+
+import gzip
+import json
+import struct
+from timeit import timeit
+
+import numpy as np
+
+from lims_utils.xrf import composite, decode_map
+
+ROWS = COLUMNS = 1000
+REPEATS = 5
+
+rng = np.random.default_rng(0)
+layers = [rng.gamma(2, 100, ROWS * COLUMNS).astype(np.float32) for _ in range(3)]
+raw_blobs = [layer.tobytes() for layer in layers]
+json_blobs = [gzip.compress(json.dumps(layer.tolist()).encode()) for layer in layers]
+
+
+def python_decode(data: bytes):
+    values = struct.unpack(f"{len(data) // 4}f", data)
+    return [list(values[row * COLUMNS : (row + 1) * COLUMNS]) for row in range(ROWS)]
+
+
+def python_composite(r, g, b):
+    scaled = []
+    for layer in (r, g, b):
+        min_value = min(min(row) for row in layer)
+        max_value = max(max(row) for row in layer)
+        span = max_value - min_value
+        scaled.append([[round((value - min_value) / span * 255) for value in row] for row in layer])
+
+    return [[(scaled[0][y][x], scaled[1][y][x], scaled[2][y][x], 255) for x in range(COLUMNS)] for y in range(ROWS)]
+
+
+def report(name: str, seconds: float):
+    print(f"{name:<40} {seconds / REPEATS * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    print(f"{ROWS}x{COLUMNS} maps, mean of {REPEATS} runs")
+
+    report("decode float32 (python)", timeit(lambda: python_decode(raw_blobs[0]), number=REPEATS))
+    report(
+        "decode float32 (numpy)", timeit(lambda: decode_map(raw_blobs[0], "float32", (ROWS, COLUMNS)), number=REPEATS)
+    )
+    report(
+        "decode json+gzip (python)",
+        timeit(lambda: json.loads(gzip.decompress(json_blobs[0])), number=REPEATS),
+    )
+    report(
+        "decode json+gzip (numpy)",
+        timeit(lambda: decode_map(json_blobs[0], "json+gzip", (ROWS, COLUMNS)), number=REPEATS),
+    )
+
+    python_maps = [python_decode(blob) for blob in raw_blobs]
+    r, g, b = (decode_map(blob, "float32", (ROWS, COLUMNS)) for blob in raw_blobs)
+
+    report("composite (python)", timeit(lambda: python_composite(*python_maps), number=1) * REPEATS)
+    report("composite (numpy)", timeit(lambda: composite(r, g, b), number=REPEATS))
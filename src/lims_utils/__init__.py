@@ -1,5 +1,8 @@
 from importlib.metadata import version
 
+# Registers the listener that defers large columns, before any table models are defined
+from . import deferral  # noqa: F401
+
 __version__ = version("lims_utils")
 del version
 
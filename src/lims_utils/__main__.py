@@ -1,3 +1,4 @@
+import os
 from argparse import ArgumentParser
 
 from . import __version__
@@ -5,11 +6,59 @@ from . import __version__
 __all__ = ["main"]
 
 
+def _export(args):
+    from sqlalchemy import create_engine, select, text
+    from sqlalchemy.orm import Session
+
+    from . import tables
+    from .export import write_arrow, write_parquet
+
+    model = getattr(tables, args.table, None)
+    if model is None or not hasattr(model, "__table__"):
+        raise SystemExit(f"Unknown table {args.table}")
+
+    columns = [getattr(model, column) for column in args.columns.split(",")] if args.columns else [model]
+    query = select(*columns)
+    if args.where:
+        query = query.filter(text(args.where))
+
+    engine = create_engine(args.url)
+    try:
+        with Session(engine) as session:
+            if args.format == "arrow":
+                rows = write_arrow(session, query, args.output, args.batch_size)
+            else:
+                rows = write_parquet(session, query, args.output, args.batch_size, compression=args.compression)
+    finally:
+        engine.dispose()
+
+    print(f"Exported {rows} rows to {args.output}")
+
+
 def main(args=None):
     parser = ArgumentParser()
     parser.add_argument("-v", "--version", action="version", version=__version__)
+
+    subparsers = parser.add_subparsers(dest="command")
+    export = subparsers.add_parser("export", help="Export table to Parquet or Arrow IPC stream")
+    export.add_argument("table", help="Table model name, such as DataCollection")
+    export.add_argument("output", help="Output file")
+    export.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    export.add_argument("--columns", help="Comma separated list of columns. Exports all columns if not set")
+    export.add_argument("--where", help="SQL filter, such as 'sessionId = 1'")
+    export.add_argument("--batch-size", type=int, default=10000, help="Rows held in memory at a time")
+    export.add_argument("--compression", default="snappy", help="Parquet compression codec")
+    export.add_argument(
+        "--url", default=os.environ.get("SQL_DATABASE_URL"), help="Database URL, defaults to $SQL_DATABASE_URL"
+    )
+
     args = parser.parse_args(args)
 
+    if args.command == "export":
+        if not args.url:
+            parser.error("Database URL must be provided with --url or SQL_DATABASE_URL")
+        _export(args)
+
 
 # test with: python -m lims_utils
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import Select, false, null, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from .auth import GenericUser
+from .cache import MISSING, TTLCache
+from .database import Database
+from .tables import BLSession, Person, ProposalHasPerson, SessionHasPerson  # type: ignore
+
+
+@dataclass(frozen=True, slots=True)
+class Grants:
+    """Proposals and sessions a user is a member of"""
+
+    proposals: frozenset[int]
+    sessions: frozenset[int]
+
+
+class AccessControl:
+    """Checks which proposals and sessions users can access. Users can access proposals they are members of
+    (`ProposalHasPerson`), sessions they are members of (`SessionHasPerson`) and all sessions in proposals they
+    are members of. Users with any of the `admin_permissions` can access everything. Permissions are read from the
+    user (as reported by the auth service or the token's claims), not from the database.
+
+    Users are matched to people by ID if it is numeric, or by login (`fedid`) otherwise, as is the case for
+    users built from JWT claims without an `id` claim. Users that don't match anyone can't access anything.
+
+    Each user's memberships are fetched with a single query and cached for a short time, so that checking
+    any number of items costs at most one query."""
+
+    def __init__(self, admin_permissions: Iterable[str] = (), ttl: float = 60, maxsize: int = 10000):
+        """
+        Args:
+            admin_permissions: Permissions that grant access to all proposals and sessions
+            ttl: Time (in seconds) before a user's memberships are fetched again
+            maxsize: Maximum number of cached users
+        """
+        self.admin_permissions = frozenset(admin_permissions)
+        self.cache: TTLCache[str, Grants] = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    def is_admin(self, user: GenericUser) -> bool:
+        return not self.admin_permissions.isdisjoint(user.permissions)
+
+    def grants(self, user: GenericUser, session: Optional[Session] = None) -> Grants:
+        """Get proposals and sessions user is a member of
+
+        Args:
+            user: User
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Proposal and session IDs"""
+        grants = self.cache.get(user.id)
+        if grants is MISSING or grants is None:
+            grants = self._fetch(user, session or Database().session)
+            self.cache.set(user.id, grants)
+
+        return grants
+
+    def filter_proposals(
+        self, user: GenericUser, proposal_ids: Iterable[int], session: Optional[Session] = None
+    ) -> set[int]:
+        """Get proposals user can access
+
+        Args:
+            user: User
+            proposal_ids: Proposal IDs to check
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Subset of proposal IDs the user can access"""
+        if self.is_admin(user):
+            return set(proposal_ids)
+
+        return set(proposal_ids) & self.grants(user, session).proposals
+
+    def filter_sessions(
+        self, user: GenericUser, session_ids: Iterable[int], session: Optional[Session] = None
+    ) -> set[int]:
+        """Get sessions user can access. Sessions the user isn't a member of are checked against the user's
+        proposals with a single query
+
+        Args:
+            user: User
+            session_ids: Session IDs to check
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Subset of session IDs the user can access"""
+        session_ids = set(session_ids)
+        if self.is_admin(user):
+            return session_ids
+
+        db_session = session or Database().session
+        grants = self.grants(user, db_session)
+        allowed = session_ids & grants.sessions
+        remaining = session_ids - allowed
+
+        if remaining and grants.proposals:
+            allowed.update(
+                db_session.scalars(
+                    select(BLSession.sessionId).filter(
+                        BLSession.sessionId.in_(remaining), BLSession.proposalId.in_(grants.proposals)
+                    )
+                )
+            )
+
+        return allowed
+
+    def restrict(
+        self,
+        query: Select,
+        user: GenericUser,
+        proposal_column: Any = BLSession.proposalId,
+        session_column: Optional[Any] = None,
+        session: Optional[Session] = None,
+    ) -> Select:
+        """Restrict query to rows the user can access. Can be used on any query, before passing it to
+        `Database.paginate`
+
+        Args:
+            query: Original query
+            user: User
+            proposal_column: Column holding the proposal ID of each row
+            session_column: Column holding the session ID of each row, for queries that return sessions or items
+            in sessions. If set, rows in sessions the user is a member of are also allowed
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Filtered query"""
+        if self.is_admin(user):
+            return query
+
+        grants = self.grants(user, session)
+        conditions = []
+
+        if grants.proposals:
+            conditions.append(proposal_column.in_(grants.proposals))
+        if session_column is not None and grants.sessions:
+            conditions.append(session_column.in_(grants.sessions))
+
+        return query.filter(or_(*conditions) if conditions else false())
+
+    def invalidate(self, user: Optional[GenericUser] = None):
+        """Remove user's memberships from cache, such as after adding them to a proposal
+
+        Args:
+            user: User to remove, clears whole cache if not set"""
+        self.cache.invalidate(None if user is None else user.id)
+
+    @staticmethod
+    def _fetch(user: GenericUser, session: Session) -> Grants:
+        person_id: Any
+        if user.id.isdigit():
+            person_id = int(user.id)
+        else:
+            # Looked up in the same query, a missing person matches no memberships
+            person_id = select(Person.personId).filter(Person.login == user.fedid).scalar_subquery()
+
+        query = union_all(
+            select(ProposalHasPerson.proposalId, null().label("sessionId")).filter(
+                ProposalHasPerson.personId == person_id
+            ),
+            select(null().label("proposalId"), SessionHasPerson.sessionId).filter(
+                SessionHasPerson.personId == person_id
+            ),
+        )
+
+        proposals: set[int] = set()
+        sessions: set[int] = set()
+        for proposal_id, session_id in session.execute(query):
+            if proposal_id is not None:
+                proposals.add(proposal_id)
+            else:
+                sessions.add(session_id)
+
+        return Grants(proposals=frozenset(proposals), sessions=frozenset(sessions))
@@ -1,22 +1,78 @@
-from dataclasses import dataclass
-from typing import Optional
+import asyncio
+import hashlib
+import sys
+import time
+from dataclasses import dataclass, field, fields
+from typing import Awaitable, Callable, Iterable, Literal, Optional
 
 from fastapi import HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.security.utils import get_authorization_scheme_param
 
+from .cache import MISSING, TTLCache
+from .logging import set_request_user
+from .metrics import REGISTRY
+from .settings import Auth
+from .timing import timed
 
-@dataclass
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None  # type: ignore
+
+_cache_lookups = REGISTRY.counter("lims_auth_cache_lookups_total", "Token lookups in the auth cache", ["result"])
+_cache_hits = _cache_lookups.labels("hit")
+_cache_misses = _cache_lookups.labels("miss")
+
+_auth_requests = REGISTRY.counter("lims_auth_requests_total", "Requests to the auth service", ["outcome"])
+_auth_success = _auth_requests.labels("success")
+_auth_errors = _auth_requests.labels("error")
+_auth_rejected = _auth_requests.labels("rejected")
+
+
+@dataclass(frozen=True, slots=True, init=False)
 class GenericUser:
-    """Generic user model, to be used with ISPyB"""
+    """Generic user model, to be used with ISPyB. Immutable, so that it can be safely shared between requests
+    through caches. Permissions can be passed as any iterable (such as a list from a JSON response), and are
+    stored as a frozenset of interned strings, so that checking for a permission takes constant time.
+    `expires_at` (a Unix timestamp) is set when the token the user was resolved from expires, such as for JWTs,
+    and is not compared"""
 
     fedid: str
     id: str
     familyName: str
     title: str
     givenName: str
-    permissions: list[str]
-    email: str | None = None
+    permissions: frozenset[str]
+    email: str | None
+    expires_at: float | None = field(default=None, compare=False)
+
+    def __init__(
+        self,
+        fedid: str,
+        id: str,
+        familyName: str,
+        title: str,
+        givenName: str,
+        permissions: Iterable[str],
+        email: str | None = None,
+        expires_at: float | None = None,
+    ):
+        object.__setattr__(self, "fedid", fedid)
+        object.__setattr__(self, "id", id)
+        object.__setattr__(self, "familyName", familyName)
+        object.__setattr__(self, "title", title)
+        object.__setattr__(self, "givenName", givenName)
+        object.__setattr__(self, "permissions", frozenset(sys.intern(permission) for permission in permissions))
+        object.__setattr__(self, "email", email)
+        object.__setattr__(self, "expires_at", expires_at)
+
+    def has_permission(self, *permissions: str) -> bool:
+        """Check if user has any of the permissions provided"""
+        return not self.permissions.isdisjoint(permissions)
+
+
+_USER_FIELDS = frozenset(field.name for field in fields(GenericUser))
 
 
 class CookieOrHTTPBearer(HTTPBearer):
@@ -48,15 +104,343 @@ class CookieOrHTTPBearer(HTTPBearer):
         self.cookie_key = cookie_key
 
     async def __call__(self, request: Request):
-        token = request.cookies.get(self.cookie_key)
-        if token is not None:
-            return HTTPAuthorizationCredentials(scheme="cookie", credentials=token)
+        with timed("auth"):
+            token = request.cookies.get(self.cookie_key)
+            if token is not None:
+                return HTTPAuthorizationCredentials(scheme="cookie", credentials=token)
+
+            authorization = request.headers.get("Authorization")
+            scheme, credentials = get_authorization_scheme_param(authorization)
+
+            if not (authorization and scheme and credentials):
+                if self.auto_error:
+                    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+
+            return await super().__call__(request)
+
+
+TokenValidator = Callable[[str], Awaitable[Optional[GenericUser]]]
+"""Asynchronous function that validates a token, returning the user it belongs to or None if it is invalid.
+Should raise an exception if the token could not be validated (for example, if the auth service is down)"""
+
+
+def _retrieve_exception(future: asyncio.Future):
+    if not future.cancelled():
+        future.exception()
+
+
+class AuthResolver:
+    """Resolves tokens into users, caching validated users (and invalid tokens) in process. Concurrent requests
+    with the same token share a single call to the validator. Tokens are only stored as hashes. Users with an
+    `expires_at` are never cached past their token's expiry.
+
+    Can be used as a dependency, in which case the token is extracted from the request with `bearer`"""
+
+    def __init__(
+        self,
+        validate: TokenValidator,
+        ttl: float = 60,
+        negative_ttl: float = 5,
+        maxsize: int = 10000,
+        bearer: Optional[CookieOrHTTPBearer] = None,
+    ):
+        """
+        Args:
+            validate: Token validator, such as a function that calls the auth microservice
+            ttl: Time (in seconds) before a validated token is validated again
+            negative_ttl: Time (in seconds) before an invalid token is validated again
+            maxsize: Maximum number of cached tokens
+            bearer: Credential extractor used when called as a dependency
+        """
+        self.validate = validate
+        self.bearer = bearer or CookieOrHTTPBearer()
+        self.cache: TTLCache[bytes, GenericUser] = TTLCache(ttl=ttl, maxsize=maxsize, negative_ttl=negative_ttl)
+        self._pending: dict[bytes, asyncio.Future[Optional[GenericUser]]] = {}
+
+    async def resolve(self, token: str) -> Optional[GenericUser]:
+        """Get user a token belongs to
+
+        Args:
+            token: Token, as sent by the client
+
+        Returns:
+            User, or None if the token is invalid"""
+        key = hashlib.sha256(token.encode()).digest()
+
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            _cache_hits.inc()
+            return cached
+
+        _cache_misses.inc()
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._validate(key, token))
+            # If every waiter is cancelled, nothing else retrieves the validator's exception
+            pending.add_done_callback(_retrieve_exception)
 
-        authorization = request.headers.get("Authorization")
-        scheme, credentials = get_authorization_scheme_param(authorization)
+        # A cancelled request must not cancel validation for other requests waiting on the same token
+        return await asyncio.shield(pending)
 
-        if not (authorization and scheme and credentials):
-            if self.auto_error:
+    def invalidate(self, token: Optional[str] = None):
+        """Remove token from cache, such as when a user logs out
+
+        Args:
+            token: Token to remove, clears whole cache if not set"""
+        key = None if token is None else hashlib.sha256(token.encode()).digest()
+        self.cache.invalidate(key)
+
+        # Validations still running started before the token was invalidated, so their results must not be cached
+        if key is None:
+            self._pending.clear()
+        else:
+            self._pending.pop(key, None)
+
+    async def _validate(self, key: bytes, token: str) -> Optional[GenericUser]:
+        task = asyncio.current_task()
+        try:
+            user = await self.validate(token)
+            if self._pending.get(key) is task:
+                ttl = None
+                if user is not None and user.expires_at is not None:
+                    ttl = min(self.cache.ttl, user.expires_at - time.time())
+                self.cache.set(key, user, ttl=ttl)
+            return user
+        finally:
+            if self._pending.get(key) is task:
+                del self._pending[key]
+
+    async def __call__(self, request: Request) -> GenericUser:
+        with timed("auth"):
+            credentials = await self.bearer(request)
+            if credentials is None:
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
-        return await super().__call__(request)
+            user = await self.resolve(credentials.credentials)
+            if user is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+        set_request_user(user.fedid)
+        return user
+
+
+class CircuitBreaker:
+    """Stops calls to a failing service for a while, so that requests fail fast instead of queueing up behind
+    timeouts. After `failure_threshold` consecutive failures, the circuit opens and calls are rejected for
+    `reset_timeout` seconds. After that, a single trial call is let through, closing the circuit if it succeeds."""
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30, timer: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            failure_threshold: Number of consecutive failures before the circuit opens
+            reset_timeout: Time (in seconds) before a call is allowed through an open circuit
+            timer: Monotonic clock function
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._timer = timer
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> Literal["closed", "open", "half-open"]:
+        if self._opened_at is None:
+            return "closed"
+        if self._timer() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> Optional[Literal["call", "trial"]]:
+        """Check whether a call can be made, reserving the trial call if the circuit is half-open
+
+        Returns:
+            `"trial"` if this call reserved the trial call, `"call"` if the circuit is closed, or None if the call
+            is rejected"""
+        state = self.state
+        if state == "closed":
+            return "call"
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return "trial"
+        return None
+
+    def record_success(self):
+        self.failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self._opened_at = self._timer()
+        self._trial_running = False
+
+    def release(self):
+        """Give up trial call without recording an outcome, such as when the call was cancelled. Should only be
+        called by the call `allow` returned `"trial"` for"""
+        self._trial_running = False
+
+
+class AuthClient:
+    """Shared client for the auth microservice, keeping a pool of keep-alive (and HTTP/2, if supported by the
+    server) connections open for the lifetime of the application. Should be opened and closed in the
+    application's lifespan, such as:
+
+    ```
+    @asynccontextmanager
+    async def lifespan(app):
+        async with auth_client:
+            yield
+    ```
+
+    Calls count as failures for the circuit breaker if they time out, return a server error, or take longer
+    than `slow_call_threshold`. While the circuit is open, calls fail immediately with a 503 response."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        timeout: float = 5,
+        connect_timeout: float = 2,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30,
+        http2: bool = True,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        slow_call_threshold: Optional[float] = None,
+    ):
+        """
+        Args:
+            endpoint: Auth microservice base URL
+            timeout: Time (in seconds) to wait for a response
+            connect_timeout: Time (in seconds) to wait for a connection to be established
+            max_connections: Maximum number of concurrent connections
+            max_keepalive_connections: Maximum number of idle connections kept open
+            keepalive_expiry: Time (in seconds) before an idle connection is closed
+            http2: Use HTTP/2 if the server supports it. Requires the `h2` package
+            failure_threshold: Number of consecutive failures before the circuit breaker opens
+            reset_timeout: Time (in seconds) before a call is allowed through an open circuit breaker
+            slow_call_threshold: Time (in seconds) after which a successful call still counts as a failure
+        """
+        if httpx is None:  # pragma: no cover
+            raise ImportError("httpx is required to use AuthClient, install lims-utils[auth]")
+
+        self.endpoint = endpoint.rstrip("/") + "/"
+        self.slow_call_threshold = slow_call_threshold
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._client_options = {
+            "timeout": httpx.Timeout(timeout, connect=connect_timeout),
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            "http2": http2,
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_settings(cls, settings: Auth, **kwargs) -> "AuthClient":
+        """Create client from application settings
+
+        Args:
+            settings: Auth settings
+            kwargs: Extra arguments passed to the constructor
+
+        Returns:
+            Auth client"""
+        return cls(
+            settings.endpoint,
+            timeout=settings.timeout,
+            max_connections=settings.max_connections,
+            http2=settings.http2,
+            **kwargs,
+        )
+
+    async def open(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.endpoint, **self._client_options)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def request(self, path: str, token: str) -> "httpx.Response":
+        """Make authenticated GET request to the auth microservice
+
+        Args:
+            path: Path relative to the endpoint, such as `user`
+            token: Token, sent as a bearer token
+
+        Returns:
+            Response"""
+        if self._client is None:
+            raise RuntimeError("AuthClient must be opened before use")
+
+        permit = self.breaker.allow()
+        if permit is None:
+            _auth_rejected.inc()
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Auth service unavailable")
+
+        start = time.monotonic()
+        try:
+            response = await self._client.get(path, headers={"Authorization": f"Bearer {token}"})
+        except httpx.HTTPError as exc:
+            self.breaker.record_failure()
+            _auth_errors.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Auth service unavailable"
+            ) from exc
+        except BaseException:
+            # Cancelled (i.e.: the client disconnected) or unexpected error, which says nothing about the service,
+            # but a trial call must not stay reserved forever. Other calls must not free a trial they don't hold
+            if permit == "trial":
+                self.breaker.release()
+            raise
+
+        slow = self.slow_call_threshold is not None and time.monotonic() - start > self.slow_call_threshold
+        if response.status_code >= 500 or response.status_code == 429 or slow:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        if response.status_code >= 500:
+            _auth_errors.inc()
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Auth service unavailable")
+
+        _auth_success.inc()
+        return response
+
+    async def get_user(self, token: str) -> Optional[GenericUser]:
+        """Validate token with the auth microservice. Can be used as the validator for `AuthResolver`
+
+        Args:
+            token: Token
+
+        Returns:
+            User, or None if the token is invalid (401 or 403). Raises a 503 for any other unexpected response, so
+            that it isn't cached as an invalid token"""
+        response = await self.request("user", token)
+        if response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN):
+            return None
+
+        if response.status_code == status.HTTP_200_OK:
+            try:
+                data = response.json()
+                return GenericUser(**{key: value for key, value in data.items() if key in _USER_FIELDS})
+            except (ValueError, TypeError, AttributeError):
+                pass
+
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Auth service unavailable")
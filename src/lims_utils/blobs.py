@@ -0,0 +1,222 @@
+import re
+from dataclasses import dataclass
+from typing import AsyncGenerator, Generator, Optional
+
+import anyio
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import ColumnElement, func, select
+from sqlalchemy.orm import InstrumentedAttribute, Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+_range_pattern = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+@dataclass(frozen=True)
+class ByteRange:
+    """Inclusive byte range within a blob"""
+
+    start: int
+    end: int
+
+    @property
+    def length(self):
+        return self.end - self.start + 1
+
+
+def parse_range(header: Optional[str], total: int) -> Optional[ByteRange]:
+    """Parse HTTP Range header. Only single byte ranges are supported, anything else is ignored and the full
+    blob is returned instead, as allowed by RFC 9110.
+
+    Args:
+        header: Range header value, such as `bytes=0-1023`, `bytes=1024-` or `bytes=-500`
+        total: Total length of the blob
+
+    Returns:
+        Byte range, or None if the full blob should be returned"""
+    if header is None:
+        return None
+
+    match = _range_pattern.match(header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+
+    if first:
+        start = int(first)
+        end = min(int(last), total - 1) if last else total - 1
+    elif last:
+        # Suffix range, last N bytes
+        start = max(total - int(last), 0)
+        end = total - 1
+    else:
+        return None
+
+    if start >= total or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{total}"},
+        )
+
+    return ByteRange(start=start, end=end)
+
+
+def blob_length(session: Session, column: InstrumentedAttribute[bytes], *where: ColumnElement[bool]) -> Optional[int]:
+    """Get length of blob in bytes without fetching it
+
+    Args:
+        session: Database session
+        column: Blob column
+        where: Filters that select a single row
+
+    Returns:
+        Blob length, or None if no row matches the filters"""
+    length = session.execute(select(func.length(column)).where(*where)).one_or_none()
+
+    if length is None:
+        return None
+
+    return length[0] or 0
+
+
+def _read_chunk(
+    session: Session,
+    column: InstrumentedAttribute[bytes],
+    where: tuple[ColumnElement[bool], ...],
+    offset: int,
+    size: int,
+) -> bytes:
+    # SUBSTRING is 1-indexed
+    return session.execute(select(func.substring(column, offset + 1, size)).where(*where)).scalar_one_or_none() or b""
+
+
+def iter_blob(
+    session: Session,
+    column: InstrumentedAttribute[bytes],
+    *where: ColumnElement[bool],
+    start: int = 0,
+    end: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Generator[bytes, None, None]:
+    """Read blob in fixed size chunks, using SUBSTRING range reads, so that the whole blob is never held in memory
+
+    Args:
+        session: Database session
+        column: Blob column, such as `XRFFluorescenceMapping.data`
+        where: Filters that select a single row
+        start: First byte to read
+        end: Last byte to read (inclusive), reads until the end of the blob if not set
+        chunk_size: Maximum number of bytes per chunk
+
+    Returns:
+        Generator of byte chunks"""
+    offset = start
+    while end is None or offset <= end:
+        size = chunk_size if end is None else min(chunk_size, end - offset + 1)
+        chunk = _read_chunk(session, column, where, offset, size)
+        if chunk:
+            yield chunk
+        if len(chunk) < size:
+            return
+        offset += size
+
+
+async def stream_blob(
+    session_maker: sessionmaker[Session],
+    column: InstrumentedAttribute[bytes],
+    *where: ColumnElement[bool],
+    start: int = 0,
+    end: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> AsyncGenerator[bytes, None]:
+    """Asynchronous version of `iter_blob`, suitable for streaming responses. Uses its own session, since
+    request scoped sessions are closed before streaming responses are sent. Queries are run in a threadpool.
+
+    Args:
+        session_maker: Session maker, returned by SQLAlchemy ORM's `sessionmaker` builder
+        column: Blob column, such as `XRFFluorescenceMapping.data`
+        where: Filters that select a single row
+        start: First byte to read
+        end: Last byte to read (inclusive), reads until the end of the blob if not set
+        chunk_size: Maximum number of bytes per chunk
+
+    Returns:
+        Asynchronous generator of byte chunks"""
+    session = session_maker()
+    offset = start
+    try:
+        while end is None or offset <= end:
+            size = chunk_size if end is None else min(chunk_size, end - offset + 1)
+            chunk = await run_in_threadpool(_read_chunk, session, column, where, offset, size)
+            if chunk:
+                yield chunk
+            if len(chunk) < size:
+                return
+            offset += size
+    finally:
+        # Shielded, since Starlette cancels the response's task group when the client disconnects
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(session.close)
+
+
+async def blob_response(
+    request: Request,
+    session_maker: sessionmaker[Session],
+    column: InstrumentedAttribute[bytes],
+    *where: ColumnElement[bool],
+    media_type: str = "application/octet-stream",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> StreamingResponse:
+    """Build streaming response for blob, honouring HTTP Range requests
+
+    Args:
+        request: Incoming request
+        session_maker: Session maker, returned by SQLAlchemy ORM's `sessionmaker` builder
+        column: Blob column, such as `XRFFluorescenceMapping.data`
+        where: Filters that select a single row
+        media_type: Response media type
+        chunk_size: Maximum number of bytes per chunk
+
+    Returns:
+        Streaming response, with status 206 if a range was requested"""
+
+    def _get_length():
+        with session_maker() as session:
+            return blob_length(session, column, *where)
+
+    total = await run_in_threadpool(_get_length)
+
+    if total is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+
+    headers = {"Accept-Ranges": "bytes"}
+    byte_range = parse_range(request.headers.get("range"), total) if total else None
+
+    if byte_range is None:
+        headers["Content-Length"] = str(total)
+        return StreamingResponse(
+            stream_blob(session_maker, column, *where, chunk_size=chunk_size),
+            media_type=media_type,
+            headers=headers,
+        )
+
+    headers["Content-Length"] = str(byte_range.length)
+    headers["Content-Range"] = f"bytes {byte_range.start}-{byte_range.end}/{total}"
+
+    return StreamingResponse(
+        stream_blob(
+            session_maker,
+            column,
+            *where,
+            start=byte_range.start,
+            end=byte_range.end,
+            chunk_size=chunk_size,
+        ),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers,
+    )
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+MISSING: Any = object()
+"""Sentinel returned by `TTLCache.get` when a key is not cached"""
+
+
+class TTLCache(Generic[K, V]):
+    """Thread-safe, size-bounded LRU cache where entries expire after a fixed time. Storing `None` caches a
+    negative result, which expires after `negative_ttl` seconds instead."""
+
+    def __init__(
+        self,
+        ttl: float,
+        maxsize: int = 1024,
+        negative_ttl: Optional[float] = None,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            ttl: Time (in seconds) before an entry expires
+            maxsize: Maximum number of entries, least recently used entries are evicted first
+            negative_ttl: Time (in seconds) before a negative (`None`) entry expires. Defaults to `ttl`
+            timer: Monotonic clock function
+        """
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.maxsize = maxsize
+        self._timer = timer
+        self._data: OrderedDict[K, tuple[float, Optional[V]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: K, default: Any = MISSING) -> Optional[V]:
+        """Get cached value
+
+        Args:
+            key: Cache key
+            default: Value returned if key is not cached or has expired
+
+        Returns:
+            Cached value, `None` if a negative result is cached"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            expires, value = entry
+            if expires <= self._timer():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: Optional[V], ttl: Optional[float] = None):
+        """Store value in cache
+
+        Args:
+            key: Cache key
+            value: Value to store, `None` for negative results
+            ttl: Time (in seconds) before this entry expires. Defaults to `ttl`, or `negative_ttl` for `None`"""
+        if ttl is None:
+            ttl = self.ttl if value is not None else self.negative_ttl
+
+        expires = self._timer() + ttl
+
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Optional[K] = None):
+        """Remove entry from cache
+
+        Args:
+            key: Key to remove, clears whole cache if not set"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
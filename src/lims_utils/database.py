@@ -1,16 +1,22 @@
 import contextlib
 from contextvars import ContextVar
-from typing import Generator, Optional, Sequence, Tuple, TypeVar
+from typing import Generator, Literal, Optional, Sequence, Tuple, TypeVar
 
 from sqlalchemy import Row, Select, func, literal_column, select
 from sqlalchemy.orm import Session, sessionmaker
 
+from .metrics import REGISTRY
 from .models import Paged
 
 _inner_session: ContextVar[Session | None] = ContextVar("_inner_session", default=None)
 
 T = TypeVar("T")
 
+_sessions_open = REGISTRY.gauge("lims_db_sessions_open", "Database sessions currently open")
+_session_rollbacks = REGISTRY.counter(
+    "lims_db_session_rollbacks_total", "Database sessions rolled back after an exception"
+)
+
 
 class Database:
     """Database session provider helper class. All it does is check whether or not a session is set, and if not
@@ -43,6 +49,7 @@ class Database:
         slow_count=True,
         precounted_total: Optional[int] = None,
         scalar=True,
+        row_format: Literal["row", "tuple", "dict"] = "row",
     ):
         """Paginate a query before querying database
 
@@ -53,6 +60,8 @@ class Database:
             slow_count: Count number of total items in a slower, safer manner (useful with GROUP statements)
             precounted_total: Skip count, use this total instead
             scalar: Is query already scalar (use `execute` instead of `scalars` when executing)
+            row_format: Return rows as SQLAlchemy `Row` objects, plain tuples or dictionaries (only applies if
+            `scalar` is set)
 
         Returns
             Paged representation of query"""
@@ -66,7 +75,7 @@ class Database:
         else:
             total = self.fast_count(query)
 
-        data: Sequence[Row[Tuple[T]]] | Sequence[T] = []
+        data: Sequence[Row[Tuple[T]]] | Sequence[T] | Sequence[tuple] | Sequence[dict] = []
 
         if total:
             if page < 0:
@@ -74,12 +83,17 @@ class Database:
 
             new_query = query.limit(limit).offset((page) * limit)
 
-            if scalar:
-                data = self.session.execute(new_query).all()
-            else:
+            if not scalar:
                 data = self.session.scalars(new_query).all()
+            elif row_format == "tuple":
+                data = [tuple(row) for row in self.session.execute(new_query)]
+            elif row_format == "dict":
+                data = [dict(row) for row in self.session.execute(new_query).mappings()]
+            else:
+                data = self.session.execute(new_query).all()
 
-        return Paged(items=data, total=total, limit=limit, page=page)
+        # Items come straight from the database, so there's no need to validate them
+        return Paged.from_trusted(items=data, total=total, limit=limit, page=page)
 
 
 @contextlib.contextmanager
@@ -91,12 +105,15 @@ def get_session(session_maker: sessionmaker[Session]) -> Generator[Session, None
         session_maker: Session maker, returned by SQLAlchemy ORM's `sessionmaker` builder.
     """
     inner_db_session = session_maker()
+    _sessions_open.inc()
     try:
         Database.set_session(inner_db_session)
         yield inner_db_session
     except Exception:
+        _session_rollbacks.inc()
         inner_db_session.rollback()
         raise
     finally:
         Database.set_session(None)
         inner_db_session.close()
+        _sessions_open.dec()
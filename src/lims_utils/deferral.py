@@ -0,0 +1,41 @@
+import sys
+from typing import Any
+
+from sqlalchemy import LargeBinary, event, inspect
+from sqlalchemy.dialects.mysql import LONGBLOB, LONGTEXT, MEDIUMTEXT
+from sqlalchemy.orm import ColumnProperty, InstrumentedAttribute, Mapper
+
+HEAVY_COLUMN_TYPES = (LONGBLOB, LONGTEXT, MEDIUMTEXT, LargeBinary)
+
+
+def _is_heavy(prop: ColumnProperty[Any]) -> bool:
+    return any(isinstance(column.type, HEAVY_COLUMN_TYPES) for column in prop.columns)
+
+
+@event.listens_for(Mapper, "after_mapper_constructed")
+def _defer_heavy_columns(mapper: Mapper, class_: type):
+    # Kept out of the generated table models, so that it survives them being regenerated. Only applies to models
+    # based on lims_utils.tables.Base, which is defined before any of the models (so before this runs for them)
+    base = getattr(sys.modules.get(f"{__package__}.tables"), "Base", None)
+    if base is None or not issubclass(class_, base):
+        return
+
+    # Public accessors (such as column_attrs) would configure all mappers, before related models are defined
+    prop: Any
+    for prop in mapper._props.values():
+        if isinstance(prop, ColumnProperty) and not prop.deferred and _is_heavy(prop):
+            prop.deferred = True
+            prop.strategy_key = (("deferred", True), *prop.strategy_key[1:])
+
+
+def heavy_columns(model: type) -> tuple[InstrumentedAttribute, ...]:
+    """List large binary/text columns of a model, which are deferred by default, so that they are only loaded
+    on attribute access or when undeferred
+
+    Args:
+        model: Mapped table model
+
+    Returns:
+        Tuple of column attributes, which can be passed to `undefer` when they're needed"""
+    mapper: Mapper[Any] = inspect(model)
+    return tuple(getattr(model, prop.key) for prop in mapper.column_attrs if _is_heavy(prop))
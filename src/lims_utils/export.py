@@ -0,0 +1,195 @@
+import datetime
+from decimal import Decimal
+from typing import Any, BinaryIO, Callable, Generator, Optional, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import (
+    BINARY,
+    Boolean,
+    Date,
+    DateTime,
+    Double,
+    Enum,
+    Float,
+    Integer,
+    LargeBinary,
+    Numeric,
+    Select,
+    String,
+    Text,
+    Time,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.type_api import TypeEngine
+
+DEFAULT_BATCH_SIZE = 10000
+
+_Converter = Optional[Callable[[Any], Any]]
+
+
+def _to_float(value: Optional[Decimal]) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def _to_timedelta(value: Union[datetime.time, datetime.timedelta, None]) -> Optional[datetime.timedelta]:
+    if value is None or isinstance(value, datetime.timedelta):
+        return value
+    return datetime.timedelta(
+        hours=value.hour, minutes=value.minute, seconds=value.second, microseconds=value.microsecond
+    )
+
+
+def _to_string(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _python_type(column_type: TypeEngine) -> Optional[type]:
+    try:
+        return column_type.python_type
+    except NotImplementedError:
+        return None
+
+
+def arrow_type(column_type: TypeEngine) -> tuple[pa.DataType, _Converter]:
+    """Get Arrow type for SQLAlchemy column type. Types are never inferred from the data, so that all batches
+    (including ones with only nulls) share the same schema
+
+    Args:
+        column_type: SQLAlchemy column type
+
+    Returns:
+        Arrow type and function used to convert each value to a type Arrow accepts (None if values can be used
+        as they are)"""
+    # Order matters, since some types are subclasses of others (i.e.: Enum is a String, Double is a Float)
+    if isinstance(column_type, Boolean):
+        return pa.bool_(), None
+    if isinstance(column_type, Integer):
+        return pa.int64(), None
+    if isinstance(column_type, Double):
+        return pa.float64(), _to_float if column_type.asdecimal else None
+    if isinstance(column_type, Float):
+        return pa.float32(), _to_float if column_type.asdecimal else None
+    if isinstance(column_type, Numeric):
+        if column_type.precision is not None and column_type.scale is not None and column_type.asdecimal:
+            return pa.decimal128(column_type.precision, column_type.scale), None
+        return pa.float64(), _to_float if column_type.asdecimal else None
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us"), None
+    if isinstance(column_type, Date):
+        return pa.date32(), None
+    if isinstance(column_type, Enum):
+        return pa.dictionary(pa.int32(), pa.string()), None
+    if isinstance(column_type, Text):
+        return pa.large_string(), None
+    if isinstance(column_type, String):
+        return pa.string(), None
+    if isinstance(column_type, BINARY) and column_type.length is not None:
+        return pa.binary(column_type.length), None
+    if isinstance(column_type, Time):
+        # MySQL TIME columns hold durations, returned as timedelta or time depending on the driver
+        return pa.duration("us"), _to_timedelta
+    if isinstance(column_type, LargeBinary) or _python_type(column_type) is bytes:
+        # Dialect specific blobs (such as LONGBLOB) aren't LargeBinary subclasses
+        return pa.large_binary(), None
+
+    # Anything else is exported as text
+    return pa.string(), _to_string
+
+
+def _prepare(query: Select) -> tuple[Select, pa.Schema, list[_Converter]]:
+    query = query.with_only_columns(*query.selected_columns, maintain_column_froms=True)
+    columns = list(query.selected_columns)
+    plan = [arrow_type(column.type) for column in columns]
+    schema = pa.schema([pa.field(column.key, data_type) for column, (data_type, _) in zip(columns, plan)])
+
+    return query, schema, [converter for _, converter in plan]
+
+
+def arrow_schema(query: Select) -> pa.Schema:
+    """Get Arrow schema of query results, derived from the SQLAlchemy column types
+
+    Args:
+        query: Query
+
+    Returns:
+        Arrow schema"""
+    return _prepare(query)[1]
+
+
+def iter_record_batches(
+    session: Session, query: Select, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Generator[pa.RecordBatch, None, None]:
+    """Run query with a server-side cursor, yielding results as Arrow record batches. Column types are derived
+    from the SQLAlchemy column types. ORM entities in the query are expanded into their columns.
+
+    Args:
+        session: Database session
+        query: Query to run
+        batch_size: Maximum number of rows per batch
+
+    Returns:
+        Generator of record batches"""
+    query, schema, converters = _prepare(query)
+
+    result = session.execute(query, execution_options={"yield_per": batch_size})
+    try:
+        for partition in result.partitions():
+            arrays = []
+            for values, field, converter in zip(zip(*partition), schema, converters):
+                if converter is not None:
+                    values = tuple(map(converter, values))
+                arrays.append(pa.array(values, type=field.type))
+
+            yield pa.record_batch(arrays, schema=schema)
+    finally:
+        result.close()
+
+
+def _write(session: Session, query: Select, writer_factory: Callable[[pa.Schema], Any], batch_size: int) -> int:
+    writer = writer_factory(arrow_schema(query))
+    rows = 0
+
+    try:
+        for batch in iter_record_batches(session, query, batch_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+
+    return rows
+
+
+def write_parquet(
+    session: Session, query: Select, where: Union[str, BinaryIO], batch_size: int = DEFAULT_BATCH_SIZE, **kwargs
+) -> int:
+    """Write query results to Parquet file, one batch at a time. If there are no results, the file only holds
+    the schema.
+
+    Args:
+        session: Database session
+        query: Query to run
+        where: File path or file-like object
+        batch_size: Maximum number of rows held in memory at a time
+        kwargs: Arguments passed to `pyarrow.parquet.ParquetWriter`, such as `compression`
+
+    Returns:
+        Number of rows written"""
+    return _write(session, query, lambda schema: pq.ParquetWriter(where, schema, **kwargs), batch_size)
+
+
+def write_arrow(
+    session: Session, query: Select, sink: Union[str, BinaryIO], batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """Write query results as an Arrow IPC stream, one batch at a time. If there are no results, the stream only
+    holds the schema.
+
+    Args:
+        session: Database session
+        query: Query to run
+        sink: File path or file-like object
+        batch_size: Maximum number of rows held in memory at a time
+
+    Returns:
+        Number of rows written"""
+    return _write(session, query, lambda schema: pa.ipc.new_stream(sink, schema), batch_size)
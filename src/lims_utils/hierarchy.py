@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional, Sequence
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import InstrumentedAttribute, Session
+
+from .joins import apply_join_path
+from .tables import (  # type: ignore
+    AutoProc,
+    AutoProcIntegration,
+    AutoProcProgram,
+    AutoProcScaling,
+    AutoProcScalingStatistics,
+    BLSession,
+    DataCollection,
+    DataCollectionGroup,
+    Proposal,
+)
+
+_PARENT_KEY = "_parentId"
+
+
+@dataclass(frozen=True)
+class Level:
+    """Single level of a hierarchy"""
+
+    model: Any
+    """Table model"""
+    columns: Optional[Sequence[Any]] = None
+    """Columns to load. Loads all non-deferred columns if not set. The primary key is always loaded"""
+    via: Sequence[Any] = field(default_factory=tuple)
+    """Intermediate models between the previous level and this one, used to build the join path"""
+    name: Optional[str] = None
+    """Key used for this level's items in the parent's dictionary. Defaults to the model's name"""
+
+    @property
+    def key(self) -> str:
+        return self.name or self.model.__name__
+
+    @property
+    def primary_key(self) -> InstrumentedAttribute:
+        mapper = inspect(self.model)
+        if len(mapper.primary_key) != 1:
+            raise ValueError(f"{self.key} must have a single column primary key")
+
+        return getattr(self.model, mapper.get_property_by_column(mapper.primary_key[0]).key)
+
+    def selected_columns(self) -> list[Any]:
+        if self.columns is not None:
+            columns = list(self.columns)
+        else:
+            columns = [getattr(self.model, prop.key) for prop in inspect(self.model).column_attrs if not prop.deferred]
+
+        if not any(column is self.primary_key for column in columns):
+            columns.insert(0, self.primary_key)
+
+        return columns
+
+
+PROCESSING_HIERARCHY = (
+    Level(Proposal),
+    Level(BLSession),
+    Level(DataCollectionGroup),
+    Level(DataCollection),
+    Level(AutoProcProgram, via=[AutoProcIntegration]),
+    Level(AutoProcScalingStatistics, via=[AutoProc, AutoProcScaling]),
+)
+"""Default hierarchy, from proposals down to processing results. Use `PROCESSING_HIERARCHY[1:]` to start from
+sessions."""
+
+
+def _batched(items: Sequence[Any], batch_size: int) -> Iterable[Sequence[Any]]:
+    for i in range(0, len(items), batch_size):
+        yield items[i : i + batch_size]
+
+
+def load_hierarchy(
+    session: Session,
+    ids: Iterable[int],
+    levels: Sequence[Level] = PROCESSING_HIERARCHY,
+    depth: Optional[int] = None,
+    batch_size: int = 1000,
+) -> list[dict[str, Any]]:
+    """Load a whole subtree of the hierarchy with a single query per level (or per batch of parent IDs for very
+    large trees), instead of walking relationships item by item.
+
+    Args:
+        session: Database session
+        ids: Primary keys of items in the first level, such as proposal IDs
+        levels: Hierarchy levels, from top to bottom
+        depth: Maximum number of levels to load. Loads all levels if not set
+        batch_size: Maximum number of parent IDs in each query's `IN` clause
+
+    Returns:
+        List of dictionaries for the first level items, each containing the selected columns and a list of
+        children under the next level's key"""
+    if depth is not None:
+        levels = levels[:depth]
+
+    if not levels:
+        return []
+
+    roots: list[dict[str, Any]] = []
+    # Items in previous level, indexed by primary key. An item can be reached through more than one parent
+    previous: dict[Any, list[dict[str, Any]]] = {}
+
+    for i, level in enumerate(levels):
+        primary_key = level.primary_key
+        columns = level.selected_columns()
+        parent_ids = list(previous) if i else list(dict.fromkeys(ids))
+        current: dict[Any, list[dict[str, Any]]] = {}
+
+        if i:
+            parent_level = levels[i - 1]
+            parent_key = parent_level.primary_key
+            query = apply_join_path(
+                select(*columns, parent_key.label(_PARENT_KEY)).select_from(level.model),
+                level.model,
+                parent_level.model,
+                via=list(reversed(level.via)),
+            )
+        else:
+            parent_key = primary_key
+            query = select(*columns)
+
+        for batch in _batched(parent_ids, batch_size):
+            for row in session.execute(query.filter(parent_key.in_(batch)).order_by(primary_key)):
+                mapping = row._asdict()
+                parent_id = mapping.pop(_PARENT_KEY, None)
+                item = {**mapping, levels[i + 1].key: []} if i + 1 < len(levels) else mapping
+
+                current.setdefault(mapping[primary_key.key], []).append(item)
+
+                if i:
+                    for parent in previous[parent_id]:
+                        parent[level.key].append(item)
+                else:
+                    roots.append(item)
+
+        if not current:
+            break
+
+        previous = current
+
+    return roots
@@ -0,0 +1,192 @@
+import heapq
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import count
+from typing import Any, Iterable, Optional, Sequence
+
+from sqlalchemy import ColumnElement, FromClause, Select, Table, and_, inspect, select
+
+from .tables import Base  # type: ignore
+
+
+@dataclass(frozen=True)
+class JoinStep:
+    """Single join between two tables, along a foreign key constraint"""
+
+    source: FromClause
+    target: FromClause
+    onclause: ColumnElement[bool]
+    indexed: bool
+    """Whether the columns in the target table are covered by an index"""
+    required: bool
+    """Whether the foreign key columns are non-nullable, i.e. the join follows a mandatory relationship"""
+    to_parent: bool
+    """Whether the join goes from the table holding the foreign key to the table it references (many-to-one)"""
+    preferred: bool = False
+    """Whether the join is part of the canonical hierarchy (see `PREFERRED_JOINS`)"""
+
+
+PREFERRED_JOINS = frozenset(
+    {
+        ("BLSession", "proposalId"),
+        ("DataCollectionGroup", "sessionId"),
+        ("DataCollection", "dataCollectionGroupId"),
+        ("AutoProcIntegration", "dataCollectionId"),
+        ("AutoProcIntegration", "autoProcProgramId"),
+        ("Protein", "proposalId"),
+        ("Crystal", "proteinId"),
+        ("BLSample", "crystalId"),
+        ("BLSample", "containerId"),
+        ("Container", "dewarId"),
+        ("Dewar", "shippingId"),
+        ("Shipping", "proposalId"),
+    }
+)
+"""(Table, foreign key column) pairs of the canonical hierarchy, which join paths follow whenever possible"""
+
+
+def _is_indexed(table: Table, column_names: set[str]) -> bool:
+    candidates = [[column.name for column in table.primary_key.columns]]
+    candidates += [[column.name for column in index.columns] for index in table.indexes]
+
+    return any(set(columns[: len(column_names)]) == column_names for columns in candidates)
+
+
+def _build_graph(tables: Iterable[Table]) -> dict[FromClause, list[JoinStep]]:
+    graph: dict[FromClause, list[JoinStep]] = {}
+
+    for table in tables:
+        for constraint in sorted(table.foreign_key_constraints, key=lambda fk: str(fk.name)):
+            referred = constraint.referred_table
+            if referred is table:
+                continue
+
+            onclause = and_(*(element.parent == element.column for element in constraint.elements))
+            local_columns = {element.parent.name for element in constraint.elements}
+            referred_columns = {element.column.name for element in constraint.elements}
+            required = not any(element.parent.nullable for element in constraint.elements)
+            preferred = all((table.name, column) in PREFERRED_JOINS for column in local_columns)
+
+            graph.setdefault(table, []).append(
+                JoinStep(table, referred, onclause, _is_indexed(referred, referred_columns), required, True, preferred)
+            )
+            graph.setdefault(referred, []).append(
+                JoinStep(referred, table, onclause, _is_indexed(table, local_columns), required, False, preferred)
+            )
+
+    return graph
+
+
+_graph = _build_graph(Base.metadata.sorted_tables)
+
+# Step costs. Canonical hierarchy joins are cheapest, then joins through mandatory foreign keys, then optional ones
+_PREFERRED_COST = 1
+_REQUIRED_COST = 2
+_OPTIONAL_COST = 4
+_SIBLING_PENALTY = 4
+
+
+def _to_table(model: Any) -> FromClause:
+    if isinstance(model, FromClause):
+        return model
+
+    return inspect(model).local_table
+
+
+@lru_cache(maxsize=1024)
+def _shortest_path(start: FromClause, end: FromClause) -> tuple[JoinStep, ...]:
+    if start is end:
+        return ()
+
+    # Cost is (path length, number of joins on unindexed columns). To keep paths following the main hierarchy
+    # (such as Proposal -> BLSession -> DataCollectionGroup) ahead of shortcuts through loosely related tables:
+    # - joins in `PREFERRED_JOINS` count half, and joins through optional (nullable) foreign keys count double
+    # - going up to a parent and back down to one of its other children (i.e.: going through siblings such as
+    #   Proposal -> Person -> DataCollectionComment) adds a penalty. Going down and back up, as done when going
+    #   through association tables, is not penalised
+    # Indexed joins are preferred between paths of the same length
+    tie_breaker = count()
+    queue: list[tuple[tuple[int, int], int, FromClause, bool, tuple[JoinStep, ...]]] = [((0, 0), 0, start, False, ())]
+    visited: set[tuple[FromClause, bool]] = set()
+
+    while queue:
+        (length, unindexed), _, table, to_parent, path = heapq.heappop(queue)
+        if table is end:
+            return path
+        if (table, to_parent) in visited:
+            continue
+        visited.add((table, to_parent))
+
+        for step in _graph.get(table, []):
+            if step.preferred:
+                step_length = _PREFERRED_COST
+            else:
+                step_length = _REQUIRED_COST if step.required else _OPTIONAL_COST
+            if to_parent and not step.to_parent and not step.preferred:
+                step_length += _SIBLING_PENALTY
+            cost = (length + step_length, unindexed + (not step.indexed))
+            heapq.heappush(queue, (cost, next(tie_breaker), step.target, step.to_parent, path + (step,)))
+
+    raise ValueError(f"No join path between {start} and {end}")
+
+
+def join_path(start: Any, end: Any, via: Sequence[Any] = ()) -> tuple[JoinStep, ...]:
+    """Get shortest join path between two models, using the foreign key graph built from the table models.
+    Joins in the canonical hierarchy (`PREFERRED_JOINS`) are favoured, joins through nullable foreign keys or through
+    sibling tables are penalised, and joins on indexed columns are preferred between paths of the same length.
+
+    Args:
+        start: Starting model or table
+        end: Final model or table
+        via: Intermediate models or tables the path must go through, in order
+
+    Returns:
+        Join steps, from start to end"""
+    waypoints = [_to_table(model) for model in (start, *via, end)]
+    path: tuple[JoinStep, ...] = ()
+
+    for source, target in zip(waypoints, waypoints[1:]):
+        path += _shortest_path(source, target)
+
+    return path
+
+
+def apply_join_path(query: Select, start: Any, end: Any, via: Sequence[Any] = ()) -> Select:
+    """Apply joins from start to end to an existing query
+
+    Args:
+        query: Query to append joins to. Must already select from the starting model
+        start: Starting model or table
+        end: Final model or table
+        via: Intermediate models or tables the path must go through, in order
+
+    Returns:
+        Query with joins applied"""
+    joined = {_to_table(start)}
+
+    for step in join_path(start, end, via):
+        if step.target in joined:
+            continue
+        query = query.join(step.target, step.onclause)
+        joined.add(step.target)
+
+    return query
+
+
+def join_select(start: Any, end: Any, *entities: Any, via: Optional[Sequence[Any]] = None) -> Select:
+    """Build query selecting from start, joined all the way to end
+
+    Args:
+        start: Starting model or table
+        end: Final model or table
+        entities: Entities/columns to select. Selects the final model if not set
+        via: Intermediate models or tables the path must go through, in order
+
+    Returns:
+        Query with joins applied
+
+    Example:
+        `join_select(Proposal, AutoProcProgram, via=[DataCollection]).filter(Proposal.proposalId == 1)`"""
+    query = select(*(entities or (end,))).select_from(start)
+
+    return apply_join_path(query, start, end, via or ())
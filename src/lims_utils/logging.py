@@ -1,32 +1,652 @@
+import atexit
+import copy
+import heapq
 import logging
-from typing import List
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Hashable, Iterable, List, Optional, Sequence
 
 from fastapi import Request
 from fastapi.exception_handlers import http_exception_handler
 from fastapi.exceptions import HTTPException
 
+from .metrics import REGISTRY
+from .models import dump_json
+
 app_logger = logging.getLogger("uvicorn")
 uvicorn_logger = logging.getLogger("uvicorn.access")
 
+_records_dropped = REGISTRY.counter(
+    "lims_log_records_dropped_total", "Log records dropped because the log queue was full"
+)
+_messages_suppressed = REGISTRY.counter("lims_log_messages_suppressed_total", "Duplicate log messages suppressed")
+
+
+class RequestContext:
+    """Details about the request being handled, attached to log records by `JSONFormatter`"""
+
+    __slots__ = ("request_id", "fedid", "scope")
+
+    def __init__(self, request_id: str, scope: Optional[dict] = None):
+        self.request_id = request_id
+        self.fedid: Optional[str] = None
+        self.scope = scope or {}
+
+    @property
+    def route(self) -> Optional[str]:
+        """Path template of the route handling the request (such as `/proposals/{proposalReference}`), only
+        available once the request has been routed"""
+        route = self.scope.get("route")
+        return getattr(route, "path", None)
+
+
+_request_context: ContextVar[RequestContext | None] = ContextVar("_request_context", default=None)
+
+
+def get_request_context() -> Optional[RequestContext]:
+    return _request_context.get()
+
+
+def set_request_user(fedid: str):
+    """Set user for the request being handled, if any. The context object is shared with the middleware that
+    created it, so this works from dependencies running in other tasks or threads"""
+    context = _request_context.get()
+    if context is not None:
+        context.fedid = fedid
+
+
+class RequestContextMiddleware:
+    """ASGI middleware that sets the request context for each HTTP request. The request ID is taken from the
+    `X-Request-ID` header if present, and generated otherwise. It is also returned in the response headers"""
+
+    def __init__(self, app, header: str = "x-request-id"):
+        self.app = app
+        self.header = header.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = next(
+            (value.decode("latin-1") for key, value in scope["headers"] if key == self.header), uuid.uuid4().hex
+        )
+        token = _request_context.set(RequestContext(request_id, scope))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request_context.reset(token)
+
+
+def _access_path(record: logging.LogRecord) -> Optional[str]:
+    """Get path (without query string) from Uvicorn access log record"""
+    if type(record.args) is not tuple or len(record.args) < 3:
+        return None
+
+    path = record.args[2]
+    if type(path) is not str:
+        return None
+
+    if "?" in path:
+        path = path.partition("?")[0]
+
+    return path
+
+
+class _PathMatcher:
+    """Matches paths exactly, or by prefix for paths ending in `*`"""
+
+    def __init__(self, paths: Iterable[str]):
+        paths = list(paths)
+        self.exact = frozenset(path for path in paths if not path.endswith("*"))
+
+        prefixes = [path[:-1] for path in paths if path.endswith("*")]
+        # Single combined pattern, so that matching costs one call however many prefixes there are
+        self.prefix_match = re.compile("|".join(map(re.escape, prefixes))).match if prefixes else None
+
+    def __call__(self, path: str) -> bool:
+        return path in self.exact or (self.prefix_match is not None and self.prefix_match(path) is not None)
+
 
 class EndpointFilter(logging.Filter):
+    """Filters out access log records for ignored paths. Paths ending in `*` match any path starting with
+    them (such as `/metrics/*`), other paths must match exactly. Query strings are ignored"""
+
     def __init__(self, paths_to_ignore=["/api/docs", "/docs"]):
         self.paths_to_ignore = paths_to_ignore
+        matcher = _PathMatcher(paths_to_ignore)
+        self._exact = matcher.exact
+        self._exact_lengths = frozenset(map(len, matcher.exact))
+        self._prefix_match = matcher.prefix_match
 
     def filter(self, record: logging.LogRecord) -> bool:
-        if type(record.args) is not tuple:
+        # Inlined, since this runs for every access log record
+        args = record.args
+        if type(args) is not tuple or len(args) < 3:
             return True
 
-        return not record.args or record.args[2] not in self.paths_to_ignore
+        path = args[2]
+        if type(path) is not str:
+            return True
+
+        # The query string is only stripped if what is left could match exactly, since building the stripped
+        # path costs more than the rest of the filter. Prefixes never contain "?", so they match either way
+        if "?" not in path:
+            if path in self._exact:
+                return False
+        elif (query := path.find("?")) in self._exact_lengths and path[:query] in self._exact:
+            return False
+
+        return self._prefix_match is None or self._prefix_match(path) is None
+
+
+@dataclass(frozen=True)
+class SamplingRule:
+    """Sampling rate for access log records matching a path and status class"""
+
+    rate: float
+    """Fraction of matching records logged, from 0 (none) to 1 (all)"""
+    paths: Sequence[str] = ("*",)
+    """Paths the rule applies to. Paths ending in `*` are treated as prefixes"""
+    status: Sequence[str] = ("2xx", "3xx")
+    """Status classes the rule applies to"""
+
+
+class AccessLogSampler(logging.Filter):
+    """Logs a fraction of access log records, according to the first matching rule. Records that don't match
+    any rule (by default, all errors) are always logged. Sampling is deterministic and spreads logged records
+    evenly: with a rate of 0.1, every tenth matching record is logged, and with a rate of 0.3, three in every ten"""
+
+    def __init__(self, rules: Sequence[SamplingRule]):
+        """
+        Args:
+            rules: Sampling rules, in order of precedence
+        """
+        self.rules = list(rules)
+        self._matchers = [(_PathMatcher(rule.paths), frozenset(rule.status)) for rule in self.rules]
+        self._counters = [0] * len(self.rules)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        path = _access_path(record)
+        if path is None or len(record.args) < 5:  # type: ignore[arg-type]
+            return True
+
+        status_class = f"{str(record.args[4])[:1]}xx"  # type: ignore[index]
+        for i, (match, status) in enumerate(self._matchers):
+            if status_class in status and match(path):
+                rate = self.rules[i].rate
+                if rate <= 0:
+                    return False
+
+                # Logged whenever the count times the rate reaches the next whole number, which (unlike adding the
+                # rate up) doesn't drift. Races between threads only make sampling slightly less exact
+                count = self._counters[i] = self._counters[i] + 1
+                return int(count * rate) > int((count - 1) * rate)
+
+        return True
+
+
+class _SuppressedMessages:
+    """Token bucket and suppressed messages for a single message key"""
+
+    __slots__ = ("tokens", "updated", "suppressed", "deadline", "origin")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.suppressed = 0
+        # Time at which a summary is due if no message gets through first, and the first suppressed record's
+        # logger name, level, location and message
+        self.deadline = 0.0
+        self.origin: Optional[tuple[str, int, str, int, str]] = None
+
+
+class DuplicateSuppressor(logging.Filter):
+    """Rate limits identical messages with a token bucket per message. Each message can be logged `burst` times
+    in a row, after which it is let through `rate` times per second. The next message let through after some
+    have been suppressed reports how many were suppressed.
+
+    If no identical message gets through once a message could be logged again, or if the message is forgotten to
+    make room for others, a summary with the number of suppressed messages is logged instead, through the logger
+    of the suppressed records. Summaries are logged from a background timer once due, so they don't wait for
+    another record to reach the filter. Call `close` to cancel the timer when the filter is no longer used."""
+
+    def __init__(
+        self,
+        rate: float = 1,
+        burst: int = 5,
+        maxsize: int = 1024,
+        key: Callable[[logging.LogRecord], Hashable] = lambda record: (record.levelno, record.getMessage()),
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            rate: Messages per second let through once the burst is used up
+            burst: Number of identical messages let through before rate limiting starts
+            maxsize: Maximum number of distinct messages tracked, least recently seen messages are forgotten first
+            key: Function that determines which records are identical
+            timer: Monotonic clock function
+        """
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.key = key
+        self._timer = timer
+        self._buckets: OrderedDict[Hashable, _SuppressedMessages] = OrderedDict()
+        # (deadline, sequence number, message key), for messages with suppressed records. Entries for messages
+        # that were reported in the meantime are skipped when they come up
+        self._deadlines: list[tuple[float, int, Hashable]] = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._flush_at: Optional[float] = None
+        self._closed = False
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = self.key(record)
+        now = self._timer()
+        summaries: list[tuple[tuple[str, int, str, int, str], int]] = []
+
+        with self._lock:
+            bucket = self._buckets.pop(key, None) or _SuppressedMessages(self.burst, now)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets[key] = bucket
+
+            if bucket.tokens < 1:
+                if not bucket.suppressed:
+                    bucket.origin = (record.name, record.levelno, record.pathname, record.lineno, record.getMessage())
+                    if self.rate > 0:
+                        bucket.deadline = now + (1 - bucket.tokens) / self.rate
+                        self._sequence += 1
+                        heapq.heappush(self._deadlines, (bucket.deadline, self._sequence, key))
+                        self._schedule_flush()
+
+                bucket.suppressed += 1
+                _messages_suppressed.inc()
+                allowed = False
+            else:
+                bucket.tokens -= 1
+                suppressed, bucket.suppressed = bucket.suppressed, 0
+                allowed = True
+
+            summaries.extend(self._pop_due(now))
+
+            while len(self._buckets) > self.maxsize:
+                _, evicted = self._buckets.popitem(last=False)
+                if evicted.suppressed:
+                    summaries.append((evicted.origin, evicted.suppressed))  # type: ignore[arg-type]
+
+        # Logged outside of the lock, since summaries go through this filter again
+        for origin, count in summaries:
+            self._log_summary(origin, count)
+
+        if allowed and suppressed:
+            record.msg = f"{record.getMessage()} (suppressed {suppressed} similar messages)"
+            record.args = None
 
+        return allowed
+
+    def flush(self):
+        """Log summaries of suppressed messages that are due"""
+        now = self._timer()
+        with self._lock:
+            summaries = self._pop_due(now)
+
+        for origin, count in summaries:
+            self._log_summary(origin, count)
+
+    def close(self):
+        """Cancel the background timer. Summaries that are not due yet are not logged"""
+        with self._lock:
+            self._closed = True
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+                self._flush_at = None
+
+    def _pop_due(self, now: float) -> list[tuple[tuple[str, int, str, int, str], int]]:
+        summaries: list[tuple[tuple[str, int, str, int, str], int]] = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, _, expired_key = heapq.heappop(self._deadlines)
+            expired = self._buckets.get(expired_key)
+            if expired is not None and expired.suppressed and expired.deadline == deadline:
+                summaries.append((expired.origin, expired.suppressed))  # type: ignore[arg-type]
+                expired.suppressed = 0
+
+        return summaries
+
+    def _schedule_flush(self):
+        # Called with the lock held. A single timer is armed for the earliest deadline, and re-armed for the next
+        # one when it fires
+        if self._closed or not self._deadlines:
+            return
+
+        deadline = self._deadlines[0][0]
+        if self._flush_at is not None and self._flush_at <= deadline:
+            return
+
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._flush_at = deadline
+        self._flush_timer = threading.Timer(max(0.0, deadline - self._timer()), self._flush_scheduled)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _flush_scheduled(self):
+        now = self._timer()
+        with self._lock:
+            self._flush_timer = None
+            self._flush_at = None
+            summaries = self._pop_due(now)
+            self._schedule_flush()
+
+        for origin, count in summaries:
+            self._log_summary(origin, count)
+
+    @staticmethod
+    def _log_summary(origin: tuple[str, int, str, int, str], count: int):
+        name, level, pathname, lineno, message = origin
+        logging.getLogger(name).handle(
+            logging.LogRecord(
+                name, level, pathname, lineno, f"{message} (suppressed {count} similar messages)", None, None
+            )
+        )
+
+
+class _DispatchingListener(QueueListener):
+    """Passes each record to the handlers of the logger that produced it"""
+
+    def handle(self, record: logging.LogRecord):
+        for handler in record.__dict__.pop("_handlers", ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class _BoundedQueueHandler(QueueHandler):
+    _exception_formatter = logging.Formatter()
+
+    def __init__(
+        self,
+        queue: queue.Queue,
+        handlers: Iterable[logging.Handler],
+        block: bool,
+        notice_handlers: Iterable[logging.Handler],
+    ):
+        super().__init__(queue)
+        self.handlers = tuple(handlers)
+        self.notice_handlers = tuple(notice_handlers)
+        self.block = block
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the default implementation, message arguments are kept, since some formatters (such as Uvicorn's
+        # access log formatter) use them. Exceptions are formatted straight away, since tracebacks can't be
+        # formatted once the exception has been handled
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+
+        record._handlers = self.handlers
+        # Records are formatted in the background thread, where the request context isn't set
+        record._request_context = _request_context.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.block:
+            self.queue.put(record)  # type: ignore[attr-defined]
+            return
+
+        try:
+            if self.dropped:
+                self.queue.put_nowait(self._dropped_record())
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            _records_dropped.inc()
+
+    def _dropped_record(self) -> logging.LogRecord:
+        # Handled by the application logger's handlers, since the handlers of the logger that overflowed may
+        # expect specific arguments (such as Uvicorn's access log formatter)
+        record = logging.LogRecord(
+            app_logger.name, logging.WARNING, __file__, 0, "Log queue full, dropped %d messages", (self.dropped,), None
+        )
+        record._handlers = self.notice_handlers
+        return record
+
+
+class QueueLogging:
+    """Moves the handlers of the loggers provided behind a bounded queue, so that formatting and I/O happen in a
+    background thread instead of the thread that logs the message (usually the event loop). When the queue is
+    full, records are either dropped (and counted, with a warning logged once there's space again) or the
+    logging thread blocks until there is space.
+
+    Message arguments are formatted in the background thread, so they shouldn't be modified after logging."""
+
+    def __init__(self, loggers: Iterable[logging.Logger], maxsize: int = 10000, block: bool = False):
+        """
+        Args:
+            loggers: Loggers whose handlers are moved to the background thread
+            maxsize: Maximum number of records waiting to be handled
+            block: Block when the queue is full, instead of dropping records
+        """
+        self.loggers = list(loggers)
+        self.block = block
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self._listener = _DispatchingListener(self.queue)
+        self._original_handlers: dict[logging.Logger, list[logging.Handler]] = {}
+
+    @property
+    def dropped(self) -> int:
+        """Number of records dropped since the last time a record could be queued"""
+        return sum(
+            handler.dropped
+            for logger in self.loggers
+            for handler in logger.handlers
+            if isinstance(handler, _BoundedQueueHandler)
+        )
+
+    def start(self):
+        """Move handlers behind the queue and start the background thread. Does nothing if already started, and
+        leaves out loggers whose handlers are already behind a queue"""
+        if self._listener._thread is not None:
+            return
+
+        for logger in self.loggers:
+            if logger.handlers and not any(isinstance(handler, _BoundedQueueHandler) for handler in logger.handlers):
+                self._original_handlers[logger] = logger.handlers[:]
+
+        notice_handlers = (
+            self._original_handlers.get(app_logger)
+            or self._original_handlers.get(logging.getLogger())
+            or [handler for handler in (logging.lastResort,) if handler is not None]
+        )
+        for logger, handlers in self._original_handlers.items():
+            logger.handlers = [_BoundedQueueHandler(self.queue, handlers, self.block, notice_handlers)]
+
+        self._listener.start()
+
+    def stop(self):
+        """Handle all queued records, stop the background thread and restore the original handlers"""
+        if self._listener._thread is None:
+            return
+
+        self._listener.stop()
+        for logger, handlers in self._original_handlers.items():
+            logger.handlers = handlers
+
+        self._original_handlers.clear()
+
+
+_RECORD_FIELDS: dict[str, Callable[[logging.LogRecord], Any]] = {
+    "level": lambda record: record.levelname,
+    "logger": lambda record: record.name,
+    "message": lambda record: record.getMessage(),
+    "module": lambda record: record.module,
+    "function": lambda record: record.funcName,
+    "line": lambda record: record.lineno,
+    "thread": lambda record: record.threadName,
+    "process": lambda record: record.process,
+}
+
+_CONTEXT_FIELDS: dict[str, Callable[[RequestContext], Any]] = {
+    "request_id": lambda context: context.request_id,
+    "user": lambda context: context.fedid,
+    "route": lambda context: context.route,
+}
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as a single line JSON object. The list of fields is turned into a list of getters
+    once, when the formatter is created, rather than for every record. Request fields (`request_id`, `user` and
+    `route`) are taken from the context set by `RequestContextMiddleware`, and omitted outside of requests"""
+
+    def __init__(
+        self,
+        fields: Sequence[str] = ("time", "level", "logger", "message", "request_id", "user", "route"),
+        static: Optional[dict[str, Any]] = None,
+    ):
+        """
+        Args:
+            fields: Fields included in each object. Available fields are `time` (ISO 8601, UTC), `level`,
+            `logger`, `message`, `module`, `function`, `line`, `thread`, `process`, `request_id`, `user` and `route`
+            static: Fields with fixed values added to each object, such as the service name
+        """
+        super().__init__()
+        unknown = set(fields) - {"time", *_RECORD_FIELDS, *_CONTEXT_FIELDS}
+        if unknown:
+            raise ValueError(f"Unknown log fields: {', '.join(sorted(unknown))}")
+
+        self.static = static or {}
+        self._time = "time" in fields
+        self._record_plan = [(field, _RECORD_FIELDS[field]) for field in fields if field in _RECORD_FIELDS]
+        self._context_plan = [(field, _CONTEXT_FIELDS[field]) for field in fields if field in _CONTEXT_FIELDS]
+        self._second: tuple[int, str] = (-1, "")
+
+    def _format_time(self, created: float) -> str:
+        # Timestamps are formatted once per second, with only the milliseconds added for each record. The second
+        # and its formatted prefix are read and replaced together, so threads sharing the formatter never pair a
+        # prefix with the wrong second
+        second = int(created)
+        cached_second, prefix = self._second
+        if second != cached_second:
+            prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+            self._second = (second, prefix)
+
+        return f"{prefix}.{int((created - second) * 1000):03d}Z"
+
+    def format(self, record: logging.LogRecord) -> str:
+        content: dict[str, Any] = {"time": self._format_time(record.created)} if self._time else {}
+
+        for field, getter in self._record_plan:
+            content[field] = getter(record)
+
+        # Set on records queued by `QueueLogging`, which are formatted outside of the request
+        context = getattr(record, "_request_context", None) or _request_context.get()
+        if context is not None:
+            for field, context_getter in self._context_plan:
+                content[field] = context_getter(context)
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            content["exception"] = record.exc_text
+        if record.stack_info:
+            content["stack"] = self.formatStack(record.stack_info)
+
+        if self.static:
+            content.update(self.static)
+
+        return dump_json(content).decode()
+
+
+_queue_logging: Optional[QueueLogging] = None
+"""Queue logging installed by `register_loggers`"""
+
+
+def register_loggers(
+    paths_to_ignore: List[str] = ["/api/docs", "/docs"],
+    queue_size: Optional[int] = None,
+    block_when_full=False,
+    sampling_rules: Optional[Sequence[SamplingRule]] = None,
+    duplicate_rate: Optional[float] = None,
+    duplicate_burst: int = 5,
+    json_format=False,
+) -> Optional[QueueLogging]:
+    """Register Uvicorn error and access logs, filtering out calls to /docs by default. Calling it again replaces
+    the filters and queue set up by the previous call
+
+    Args:
+        paths_to_ignore: Paths not logged by the access log. Paths ending in `*` are treated as prefixes
+        queue_size: If set, handle records in a background thread, with up to this many records queued
+        block_when_full: Block when the queue is full, instead of dropping records
+        sampling_rules: If set, only log a fraction of access log records matching these rules
+        duplicate_rate: If set, rate limit identical application log messages to this many per second
+        duplicate_burst: Number of identical messages logged before rate limiting starts
+        json_format: Log JSON objects with request context (see `JSONFormatter`) instead of plain text
+
+    Returns:
+        Queue logging instance (stopped automatically on exit), if `queue_size` is set"""
+    global _queue_logging
+
+    # Calling again replaces the previous configuration, rather than stacking filters and queues
+    if _queue_logging is not None:
+        _queue_logging.stop()
+        _queue_logging = None
+    for logger in (app_logger, uvicorn_logger):
+        for log_filter in logger.filters[:]:
+            if isinstance(log_filter, (EndpointFilter, AccessLogSampler, DuplicateSuppressor)):
+                logger.removeFilter(log_filter)
+            if isinstance(log_filter, DuplicateSuppressor):
+                log_filter.close()
 
-def register_loggers(paths_to_ignore: List[str] = ["/api/docs", "/docs"]):
-    """Register Uvicorn error and access logs, filtering out calls to /docs by default"""
     uvicorn_logger.addFilter(EndpointFilter(paths_to_ignore=paths_to_ignore))
 
-    logging.basicConfig(format="%(levelname)s: %(message)s")
+    if sampling_rules is not None:
+        uvicorn_logger.addFilter(AccessLogSampler(sampling_rules))
+
+    if duplicate_rate is not None:
+        app_logger.addFilter(DuplicateSuppressor(rate=duplicate_rate, burst=duplicate_burst))
+
+    if json_format:
+        formatter = JSONFormatter()
+        handler = logging.StreamHandler()
+        handler.setFormatter(formatter)
+        logging.basicConfig(handlers=[handler])
+        # Uvicorn sets up its own handlers, which don't propagate to the root logger
+        for logger in (app_logger, uvicorn_logger):
+            for logger_handler in logger.handlers:
+                logger_handler.setFormatter(formatter)
+    else:
+        logging.basicConfig(format="%(levelname)s: %(message)s")
     app_logger.setLevel("INFO")
 
+    if queue_size is None:
+        return None
+
+    _queue_logging = QueueLogging([logging.getLogger(), app_logger, uvicorn_logger], queue_size, block_when_full)
+    _queue_logging.start()
+    atexit.register(_queue_logging.stop)
+
+    return _queue_logging
+
 
 async def log_exception_handler(request: Request, exc: HTTPException):
     """HTTP exception handler, takes HTTP exception and prints more details about the context
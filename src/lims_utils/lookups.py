@@ -0,0 +1,263 @@
+import threading
+import time
+from collections import namedtuple
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from typing import Any, Callable, Iterable, Mapping, Optional
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.orm import Session
+
+from .database import Database
+from .tables import (  # type: ignore
+    BLSampleType,
+    ComponentType,
+    ConcentrationType,
+    ContainerType,
+    DewarLocationList,
+    ExperimentType,
+    InspectionType,
+    Permission,
+    ProcessingPipeline,
+    SpaceGroup,
+)
+
+
+@dataclass(frozen=True)
+class LookupTable:
+    """Static table to be cached"""
+
+    model: Any
+    """Table model"""
+    natural_key: str
+    """Column used to find rows by name, such as `name` or `spaceGroupShortName`"""
+
+
+@dataclass(frozen=True)
+class LookupSnapshot:
+    """Immutable copy of a lookup table's contents"""
+
+    rows: tuple[Any, ...]
+    """All rows, as named tuples, ordered by primary key"""
+    by_id: Mapping[Any, Any]
+    """Rows indexed by primary key"""
+    by_key: Mapping[Any, Any]
+    """Rows indexed by natural key. If more than one row has the same natural key, the first one is used"""
+    fingerprint: tuple[Any, ...]
+    """Result of change detection query when the table was loaded"""
+    checked_at: float
+    """Last time the fingerprint was checked"""
+    loaded_at: float
+    """Time the table was loaded"""
+
+
+DEFAULT_LOOKUPS = (
+    LookupTable(BLSampleType, "name"),
+    LookupTable(ComponentType, "name"),
+    LookupTable(ConcentrationType, "name"),
+    LookupTable(ContainerType, "name"),
+    LookupTable(DewarLocationList, "locationName"),
+    LookupTable(ExperimentType, "name"),
+    LookupTable(InspectionType, "name"),
+    LookupTable(Permission, "type"),
+    LookupTable(ProcessingPipeline, "name"),
+    LookupTable(SpaceGroup, "spaceGroupShortName"),
+)
+
+
+class LookupCache:
+    """Read-through, in-process cache for static lookup tables. Tables are loaded in full the first time they're
+    used. Every `check_interval` seconds, a cheap change detection query (row count and highest primary key) is
+    run, and the table is only reloaded if the result differs. Since that doesn't pick up rows updated in place,
+    tables are also reloaded unconditionally every `max_age` seconds.
+
+    Reads only block while a table is loaded for the first time: snapshots are immutable, and are replaced as a
+    whole when a table is reloaded. Each table is refreshed by a single thread at a time, while other threads keep
+    getting the current snapshot, and refreshing one table doesn't hold up others."""
+
+    def __init__(
+        self,
+        tables: Iterable[LookupTable] = DEFAULT_LOOKUPS,
+        check_interval: float = 60,
+        max_age: float = 3600,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            tables: Tables that can be cached
+            check_interval: Time (in seconds) before checking whether a table has changed
+            max_age: Time (in seconds) before a table is reloaded, even if no changes were detected
+            timer: Monotonic clock function
+        """
+        self.tables = {table.model: table for table in tables}
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._timer = timer
+        self._snapshots: dict[Any, LookupSnapshot] = {}
+        self._row_types: dict[Any, Any] = {}
+        self._locks = {model: threading.Lock() for model in self.tables}
+
+    def snapshot(self, model: Any, session: Optional[Session] = None) -> LookupSnapshot:
+        """Get current contents of lookup table, loading or refreshing it if needed
+
+        Args:
+            model: Table model
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Table snapshot"""
+        snapshot = self._snapshots.get(model)
+        now = self._timer()
+
+        if snapshot is not None and now - snapshot.checked_at < self.check_interval:
+            return snapshot
+
+        table = self._get_table(model)
+        lock = self._locks[model]
+
+        if snapshot is None:
+            lock.acquire()
+        elif not lock.acquire(blocking=False):
+            # Stale snapshots are still served while another thread refreshes the table
+            return snapshot
+
+        try:
+            # Another thread may have refreshed the table while waiting for the lock
+            snapshot = self._snapshots.get(model)
+            if snapshot is not None and now - snapshot.checked_at < self.check_interval:
+                return snapshot
+
+            session = session or Database().session
+
+            if snapshot is not None and now - snapshot.loaded_at < self.max_age:
+                fingerprint = self._fingerprint(table, session)
+                if fingerprint == snapshot.fingerprint:
+                    snapshot = replace(snapshot, checked_at=now)
+                    self._snapshots[model] = snapshot
+                    return snapshot
+
+            snapshot = self._load(table, session, now)
+            self._snapshots[model] = snapshot
+            return snapshot
+        finally:
+            lock.release()
+
+    def get(self, model: Any, id: Any, session: Optional[Session] = None) -> Optional[Any]:
+        """Get row by primary key
+
+        Args:
+            model: Table model
+            id: Primary key
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Row as a named tuple, or None if it does not exist"""
+        return self.snapshot(model, session).by_id.get(id)
+
+    def find(self, model: Any, key: Any, session: Optional[Session] = None) -> Optional[Any]:
+        """Get row by natural key (such as a container type's name)
+
+        Args:
+            model: Table model
+            key: Natural key
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Row as a named tuple, or None if it does not exist"""
+        return self.snapshot(model, session).by_key.get(key)
+
+    def all(self, model: Any, session: Optional[Session] = None) -> tuple[Any, ...]:
+        """Get all rows in table
+
+        Args:
+            model: Table model
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Rows as named tuples, ordered by primary key"""
+        return self.snapshot(model, session).rows
+
+    def join(
+        self,
+        items: Iterable[Mapping[str, Any]],
+        model: Any,
+        on: str,
+        columns: Mapping[str, str],
+        session: Optional[Session] = None,
+    ) -> list[dict[str, Any]]:
+        """Add columns from a lookup table to query results, replacing a join with that table in the query.
+
+        For example, instead of joining `ExperimentType` to get each data collection group's experiment type
+        name, select `DataCollectionGroup.experimentTypeId` and use
+        `cache.join(rows, ExperimentType, "experimentTypeId", {"experimentTypeName": "name"})`
+
+        Args:
+            items: Query results, as mappings (such as `Row._mapping`) or dictionaries
+            model: Lookup table model
+            on: Key holding the lookup table's primary key in each item
+            columns: Keys to add to each item, mapped to the lookup table column they're taken from
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            List of dictionaries. Added keys are None if an item's foreign key is None or doesn't exist"""
+        by_id = self.snapshot(model, session).by_id
+        joined = []
+
+        for item in items:
+            row = by_id.get(item[on])
+            extra = {key: None if row is None else getattr(row, column) for key, column in columns.items()}
+            joined.append({**item, **extra})
+
+        return joined
+
+    def invalidate(self, model: Optional[Any] = None):
+        """Remove table from cache, so that it is reloaded next time it is used
+
+        Args:
+            model: Table to remove, clears all tables if not set"""
+        # Waits for refreshes in progress, so that they don't put back a table loaded before it was invalidated
+        for table_model, lock in self._locks.items():
+            if model is None or table_model == model:
+                with lock:
+                    self._snapshots.pop(table_model, None)
+
+    def _get_table(self, model: Any) -> LookupTable:
+        table = self.tables.get(model)
+        if table is None:
+            raise KeyError(f"{getattr(model, '__name__', model)} is not a cached lookup table")
+
+        return table
+
+    @staticmethod
+    def _primary_key(model: Any):
+        mapper = inspect(model)
+        return getattr(model, mapper.get_property_by_column(mapper.primary_key[0]).key)
+
+    def _fingerprint(self, table: LookupTable, session: Session) -> tuple[Any, ...]:
+        primary_key = self._primary_key(table.model)
+        return tuple(session.execute(select(func.count(primary_key), func.max(primary_key))).one())
+
+    def _load(self, table: LookupTable, session: Session, now: float) -> LookupSnapshot:
+        model = table.model
+        primary_key = self._primary_key(model)
+        columns = [getattr(model, prop.key) for prop in inspect(model).column_attrs if not prop.deferred]
+
+        row_type = self._row_types.get(model)
+        if row_type is None:
+            row_type = self._row_types[model] = namedtuple(model.__name__, [column.key for column in columns])  # type: ignore[misc]
+
+        fingerprint = self._fingerprint(table, session)
+        rows = tuple(row_type(*row) for row in session.execute(select(*columns).order_by(primary_key)))
+
+        by_key: dict[Any, Any] = {}
+        for row in rows:
+            by_key.setdefault(getattr(row, table.natural_key), row)
+
+        return LookupSnapshot(
+            rows=rows,
+            by_id=MappingProxyType({getattr(row, primary_key.key): row for row in rows}),
+            by_key=MappingProxyType(by_key),
+            fingerprint=fingerprint,
+            checked_at=now,
+            loaded_at=now,
+        )
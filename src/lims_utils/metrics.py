@@ -0,0 +1,532 @@
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Literal, Optional, Sequence, Union
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+MULTIPROCESS_DIR_ENV = "LIMS_METRICS_DIR"
+"""Environment variable with the directory used to share metrics between worker processes"""
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+MetricType = Literal["counter", "gauge", "histogram"]
+
+# (Metric name, sample suffix, (label, value) pairs)
+_Key = tuple[str, str, tuple[tuple[str, str], ...]]
+
+_HEADER = struct.Struct("Q")
+_KEY_LENGTH = struct.Struct("I")
+_VALUE = struct.Struct("d")
+
+
+def _read_entries(data: Union[bytes, mmap.mmap]) -> Iterator[tuple[_Key, float, int]]:
+    """Read (key, value, value offset) entries from metrics file contents"""
+    used = _HEADER.unpack_from(data, 0)[0]
+    pos = _HEADER.size
+    while pos < used:
+        (length,) = _KEY_LENGTH.unpack_from(data, pos)
+        pos += _KEY_LENGTH.size
+        name, suffix, labels = json.loads(bytes(data[pos : pos + length]))
+        # Values are 8 byte aligned, so that they are written and read in one go
+        pos += length + (-(pos + length) % 8)
+        yield (name, suffix, tuple(map(tuple, labels))), _VALUE.unpack_from(data, pos)[0], pos
+        pos += _VALUE.size
+
+
+class _LocalStore:
+    """Values of metrics kept in process memory"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._values: dict[_Key, float] = {}
+
+    def create(self, key: _Key):
+        with self.lock:
+            self._values.setdefault(key, 0.0)
+
+    def add(self, updates: Iterable[tuple[_Key, float]]):
+        with self.lock:
+            for key, amount in updates:
+                self._values[key] += amount
+
+    def set(self, key: _Key, value: float):
+        with self.lock:
+            self._values[key] = value
+
+    def collect(self, gauges: frozenset[str]) -> dict[_Key, float]:
+        with self.lock:
+            return dict(self._values)
+
+
+class _MmapStore:
+    """Values of metrics kept in a memory mapped file per process, so that any process can aggregate the values
+    of all workers. Files are append only: each entry is a key followed by its value, and the header holds the
+    number of bytes in use, which is only updated once an entry is complete.
+
+    The file is only created once a value is first updated, so that importing modules that define metrics has no
+    side effects. A file left behind by an earlier process with the same PID is emptied when the file is opened.
+    There must only be one store per directory in each process (see `_mmap_store`)"""
+
+    initial_size = 1 << 16
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._path = self.directory
+        self._mmap: Optional[mmap.mmap] = None
+        self._positions: dict[_Key, int] = {}
+        # Keys reported (with a value of 0) by this process even if it hasn't written them yet
+        self._created: set[_Key] = set()
+
+    def _open(self) -> mmap.mmap:
+        # Reopen after forking, so that workers don't share the file of the parent process
+        if self._pid != os.getpid() or self._mmap is None:
+            self._pid = os.getpid()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._path = self.directory / f"{self._pid}.db"
+            # Values in an existing file belong to an earlier process that had the same PID
+            with open(self._path, "wb"):
+                pass
+            mm = self._mmap = self._map(self.initial_size)
+            _HEADER.pack_into(mm, 0, _HEADER.size)
+            self._positions = {}
+
+        return self._mmap
+
+    def _map(self, min_size: int) -> mmap.mmap:
+        with open(self._path, "a+b") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < min_size:
+                file.truncate(min_size)
+                size = min_size
+            return mmap.mmap(file.fileno(), size)
+
+    def _position(self, key: _Key) -> int:
+        pos = self._positions.get(key)
+        if pos is not None:
+            return pos
+
+        mm = self._open()
+        encoded = json.dumps(key).encode()
+        used = _HEADER.unpack_from(mm, 0)[0]
+        start = used + _KEY_LENGTH.size
+        pos = start + len(encoded) + (-(start + len(encoded)) % 8)
+        end = pos + _VALUE.size
+
+        if end > len(mm):
+            size = len(mm)
+            while end > size:
+                size *= 2
+            mm.close()
+            mm = self._mmap = self._map(size)
+
+        _KEY_LENGTH.pack_into(mm, used, len(encoded))
+        mm[start : start + len(encoded)] = encoded
+        _VALUE.pack_into(mm, pos, 0.0)
+        _HEADER.pack_into(mm, 0, end)
+        self._positions[key] = pos
+        return pos
+
+    def create(self, key: _Key):
+        with self.lock:
+            self._created.add(key)
+
+    def add(self, updates: Iterable[tuple[_Key, float]]):
+        with self.lock:
+            self._open()
+            for key, amount in updates:
+                pos = self._position(key)
+                # Adding an entry can grow the file, which replaces the mapping
+                mm = self._open()
+                _VALUE.pack_into(mm, pos, _VALUE.unpack_from(mm, pos)[0] + amount)
+
+    def set(self, key: _Key, value: float):
+        with self.lock:
+            self._open()
+            pos = self._position(key)
+            _VALUE.pack_into(self._open(), pos, value)
+
+    def collect(self, gauges: frozenset[str]) -> dict[_Key, float]:
+        """Sum values of all processes. Gauges of processes that have exited are skipped"""
+        values: dict[_Key, float] = {}
+        for path in self.directory.glob("*.db"):
+            alive = _is_alive(int(path.stem))
+            data = path.read_bytes()
+            if len(data) < _HEADER.size:
+                continue
+
+            for key, value, _ in _read_entries(data):
+                if key[0] in gauges and not alive:
+                    continue
+                values[key] = values.get(key, 0.0) + value
+
+        for key in self._created:
+            values.setdefault(key, 0.0)
+
+        return values
+
+
+_mmap_stores: dict[Path, _MmapStore] = {}
+_mmap_stores_lock = threading.Lock()
+
+
+def _mmap_store(directory: Union[str, Path]) -> _MmapStore:
+    """Get store for directory, shared by all registries of the process, since stores for the same directory
+    would write to the same file"""
+    path = Path(directory).resolve()
+    with _mmap_stores_lock:
+        store = _mmap_stores.get(path)
+        if store is None:
+            store = _mmap_stores[path] = _MmapStore(path)
+        return store
+
+
+def _is_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def _label_pairs(names: Sequence[str], values: Sequence[str]) -> tuple[tuple[str, str], ...]:
+    return tuple(zip(names, map(str, values)))
+
+
+class _Metric:
+    type: MetricType
+
+    def __init__(self, registry: "Registry", name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._store = registry._store
+        self._children: dict[tuple[str, ...], Any] = {}
+        self._default: Any = _LabelsRequired(name) if self.label_names else self.labels()
+
+    def labels(self, *values: Any) -> Any:
+        """Get child metric for label values
+
+        Args:
+            values: Label values, in the same order as the label names
+
+        Returns:
+            Child metric"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"Expected {len(self.label_names)} label values for {self.name}, got {len(values)}")
+            child = self._children.setdefault(values, self._child(_label_pairs(self.label_names, values)))
+
+        return child
+
+    def _child(self, labels: tuple[tuple[str, str], ...]) -> Any:
+        raise NotImplementedError
+
+
+class _LabelsRequired:
+    """Stands in for the child of metrics with labels, so that updating them without label values fails with a
+    clear message rather than an `AttributeError` on `None`"""
+
+    __slots__ = ("_name",)
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def _fail(self, *args, **kwargs):
+        raise ValueError(f"Metric {self._name} has labels, call .labels() first")
+
+    inc = dec = set = observe = _fail
+
+
+class _CounterChild:
+    __slots__ = ("_store", "_key")
+
+    def __init__(self, store, key: _Key):
+        self._store = store
+        self._key = key
+        store.create(key)
+
+    def inc(self, amount: float = 1):
+        """Increase counter
+
+        Args:
+            amount: Amount to increase counter by, cannot be negative"""
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        self._store.add(((self._key, amount),))
+
+
+class Counter(_Metric):
+    """Value that only goes up, such as the number of requests handled"""
+
+    type = "counter"
+
+    def _child(self, labels):
+        return _CounterChild(self._store, (self.name, "", labels))
+
+    def inc(self, amount: float = 1):
+        """Increase counter without labels"""
+        self._default.inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("_store", "_key")
+
+    def __init__(self, store, key: _Key):
+        self._store = store
+        self._key = key
+        store.create(key)
+
+    def inc(self, amount: float = 1):
+        self._store.add(((self._key, amount),))
+
+    def dec(self, amount: float = 1):
+        self._store.add(((self._key, -amount),))
+
+    def set(self, value: float):
+        self._store.set(self._key, value)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, such as the number of open sessions. Across processes, values of
+    running processes are summed"""
+
+    type = "gauge"
+
+    def _child(self, labels):
+        return _GaugeChild(self._store, (self.name, "", labels))
+
+    def inc(self, amount: float = 1):
+        """Increase gauge without labels"""
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1):
+        """Decrease gauge without labels"""
+        self._default.dec(amount)
+
+    def set(self, value: float):
+        """Set value of gauge without labels"""
+        self._default.set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("_store", "_bounds", "_buckets", "_sum", "_count")
+
+    def __init__(self, store, name: str, labels: tuple[tuple[str, str], ...], bounds: tuple[float, ...]):
+        self._store = store
+        self._bounds = bounds
+        self._buckets = [(name, "_bucket", (*labels, ("le", _format_value(bound)))) for bound in (*bounds, math.inf)]
+        self._sum = (name, "_sum", labels)
+        self._count = (name, "_count", labels)
+        for key in (*self._buckets, self._sum, self._count):
+            store.create(key)
+
+    def observe(self, value: float):
+        """Record observation, such as the duration of a request"""
+        self._store.add(((self._buckets[bisect_left(self._bounds, value)], 1), (self._sum, value), (self._count, 1)))
+
+
+class Histogram(_Metric):
+    """Distribution of observations in fixed buckets, such as request durations"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        registry: "Registry",
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.bounds = tuple(sorted(b for b in buckets if b != math.inf))
+        super().__init__(registry, name, documentation, labels)
+
+    def _child(self, labels):
+        return _HistogramChild(self._store, self.name, labels, self.bounds)
+
+    def observe(self, value: float):
+        """Record observation in histogram without labels"""
+        self._default.observe(value)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _escape(value: str, quotes: bool = True) -> str:
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quotes else value
+
+
+def _format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Registry:
+    """Collection of metrics, rendered in the Prometheus text format. Updates are thread safe.
+
+    If `multiprocess_dir` is set, values are stored in a memory mapped file per process in that directory, and
+    rendering aggregates all processes, so that any worker can serve the totals. The directory should be emptied
+    before the server starts"""
+
+    def __init__(self, multiprocess_dir: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            multiprocess_dir: Directory shared by all worker processes
+        """
+        self._store: Union[_LocalStore, _MmapStore] = (
+            _LocalStore() if multiprocess_dir is None else _mmap_store(multiprocess_dir)
+        )
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls: type, name: str, documentation: str, labels: Sequence[str], **kwargs) -> Any:
+        with self._lock:
+            existing = self._metrics.get(name)
+            if existing is not None:
+                if type(existing) is not cls or existing.label_names != tuple(labels):
+                    raise ValueError(f"Metric {name} is already registered with a different type or labels")
+                return existing
+
+            metric = self._metrics[name] = cls(self, name, documentation, labels, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        """Get counter, registering it if it doesn't exist yet
+
+        Args:
+            name: Metric name, should end with `_total`
+            documentation: Description of the metric
+            labels: Label names
+
+        Returns:
+            Counter"""
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        """Get gauge, registering it if it doesn't exist yet
+
+        Args:
+            name: Metric name
+            documentation: Description of the metric
+            labels: Label names
+
+        Returns:
+            Gauge"""
+        return self._register(Gauge, name, documentation, labels)
+
+    def histogram(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Get histogram, registering it if it doesn't exist yet
+
+        Args:
+            name: Metric name
+            documentation: Description of the metric
+            labels: Label names
+            buckets: Bucket upper bounds, an infinite bucket is always added
+
+        Returns:
+            Histogram"""
+        return self._register(Histogram, name, documentation, labels, buckets=buckets)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format
+
+        Returns:
+            Metrics"""
+        gauges = frozenset(name for name, metric in self._metrics.items() if metric.type == "gauge")
+        samples: dict[str, list[tuple[str, tuple[tuple[str, str], ...], float]]] = {}
+        for (name, suffix, labels), value in self._store.collect(gauges).items():
+            samples.setdefault(name, []).append((suffix, labels, value))
+
+        lines = []
+        for name, metric in list(self._metrics.items()):
+            lines.append(f"# HELP {name} {_escape(metric.documentation, quotes=False)}")
+            lines.append(f"# TYPE {name} {metric.type}")
+
+            metric_samples = samples.get(name, [])
+            if metric.type == "histogram":
+                metric_samples = _cumulate_buckets(metric_samples)
+            else:
+                metric_samples.sort(key=lambda sample: sample[1])
+
+            for suffix, labels, value in metric_samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _cumulate_buckets(samples: list[tuple[str, tuple[tuple[str, str], ...], float]]):
+    """Sort histogram samples by label set, turning bucket counts into cumulative counts"""
+    series: dict[tuple[tuple[str, str], ...], dict[str, Any]] = {}
+    for suffix, labels, value in samples:
+        if suffix == "_bucket":
+            bound = next(v for k, v in labels if k == "le")
+            base = tuple(pair for pair in labels if pair[0] != "le")
+            series.setdefault(base, {}).setdefault("_bucket", []).append((float(bound), labels, value))
+        else:
+            series.setdefault(labels, {})[suffix] = value
+
+    result = []
+    for labels in sorted(series):
+        cumulative = 0.0
+        for _, bucket_labels, value in sorted(series[labels].get("_bucket", [])):
+            cumulative += value
+            result.append(("_bucket", bucket_labels, cumulative))
+        for suffix in ("_sum", "_count"):
+            if suffix in series[labels]:
+                result.append((suffix, labels, series[labels][suffix]))
+
+    return result
+
+
+REGISTRY = Registry(multiprocess_dir=os.environ.get(MULTIPROCESS_DIR_ENV))
+"""Default registry, used by metrics of this package. Shared between worker processes if the `LIMS_METRICS_DIR`
+environment variable is set"""
+
+
+def prometheus_router(registry: Registry = REGISTRY, path: str = "/metrics", **kwargs) -> APIRouter:
+    """Build router exposing metrics in the Prometheus text format. Not included by default, since metrics may
+    reveal details about the application that shouldn't be public
+
+    Args:
+        registry: Registry to render
+        path: Path of the metrics endpoint
+        kwargs: Arguments passed to the route, such as `dependencies` to restrict access
+
+    Returns:
+        Router"""
+    router = APIRouter()
+
+    @router.get(path, include_in_schema=False, response_class=PlainTextResponse, **kwargs)
+    def get_metrics():
+        return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+    return router
@@ -1,7 +1,27 @@
-from typing import Generic, Sequence, TypeVar
+import base64
+import datetime
+import enum
+import json
+import re
+from decimal import Decimal
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, Generic, Iterable, Sequence, TypeVar
+from uuid import UUID
 
 from fastapi import Query
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, ConfigDict, Field, field_validator
+from sqlalchemy import BINARY, Row, inspect
+from sqlalchemy.exc import NoInspectionAvailable
+from sqlalchemy.orm import Mapper
+
+from .timing import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
 
 
 def pagination(
@@ -25,12 +45,29 @@ class Paged(BaseModel, Generic[T]):
 
     model_config = ConfigDict(from_attributes=True, arbitrary_types_allowed=True)
 
+    @classmethod
+    def from_trusted(cls, items: Sequence[T], total: int, page: int, limit: int) -> "Paged[T]":
+        """Build page without validating it or its items. Only use with data that is known to be valid, such
+        as items returned by the database
+
+        Args:
+            items: Page items
+            total: Total number of items
+            page: Page number
+            limit: Number of items per page
+
+        Returns:
+            Paged representation of items"""
+        return cls.model_construct(items=items, total=total, page=page, limit=limit)
+
 
 class ProposalReference(BaseModel):
     code: str = Field(max_length=2)
     number: int
     visit_number: int | None = None
 
+    model_config = ConfigDict(frozen=True)
+
     def __str__(self):
         string_proposal_reference = f"{self.code}{self.number}"
 
@@ -47,18 +84,11 @@ class ProposalReference(BaseModel):
         return v
 
 
-def parse_proposal(proposal_reference: str, visit_number: int | None = None):
-    """Parse proposal string and return ProposalReference object
+_proposal_with_visit_pattern = re.compile(r"^(.+)-([0-9]+)$")
 
-        Args:
-            proposal_reference: Proposal reference, formatted as ab12345
-            visit_numb
-        uvicorn_logger.error("Message %s %s %s", "Arg 1", "Arg 2", "/test")
-    er: Visit number
-
-        Returns:
-            ProposalReference object"""
 
+@lru_cache(maxsize=4096)
+def _parse_proposal(proposal_reference: str, visit_number: int | None) -> ProposalReference:
     if len(proposal_reference) < 3:
         raise ValueError("Proposal reference must be at least three characters long")
 
@@ -71,3 +101,199 @@ def parse_proposal(proposal_reference: str, visit_number: int | None = None):
         number=number,  # type: ignore
         visit_number=visit_number,
     )
+
+
+def parse_proposal(proposal_reference: str, visit_number: int | None = None):
+    """Parse proposal string and return ProposalReference object. Results are cached, and since
+    ProposalReference is immutable, the same object may be returned for repeated calls.
+
+    Args:
+        proposal_reference: Proposal reference, formatted as ab12345
+        visit_number: Visit number
+
+    Returns:
+        ProposalReference object"""
+    return _parse_proposal(proposal_reference, visit_number)
+
+
+def parse_proposals(proposal_references: Iterable[str]) -> list[ProposalReference | ValueError]:
+    """Parse list of proposal strings, which can include visit numbers
+
+    Args:
+        proposal_references: Proposal references, formatted as ab12345 or ab12345-1
+
+    Returns:
+        ProposalReference object for each valid reference, and the validation error for each invalid reference,
+        in the same order"""
+    results: list[ProposalReference | ValueError] = []
+
+    for proposal_reference in proposal_references:
+        visit_number = None
+        match = _proposal_with_visit_pattern.match(proposal_reference)
+        if match is not None:
+            proposal_reference, visit_number = match.group(1), int(match.group(2))
+
+        try:
+            results.append(parse_proposal(proposal_reference, visit_number))
+        except ValueError as e:
+            results.append(e)
+
+    return results
+
+
+def _encode_bytes(value: bytes) -> str:
+    return base64.b64encode(value).decode("ascii")
+
+
+def _encode_uuid(value: bytes | None) -> str | None:
+    return None if value is None else str(UUID(bytes=value))
+
+
+class _ColumnPlan:
+    """Precomputed serialisation plan for a mapped class"""
+
+    __slots__ = ("keys", "getter", "converters")
+
+    def __init__(self, mapped_class: type):
+        mapper: Mapper = inspect(mapped_class)
+        props = [prop for prop in mapper.column_attrs if not prop.deferred]
+        self.keys = tuple(prop.key for prop in props)
+        getter = attrgetter(*self.keys)
+        self.getter: Callable[[Any], tuple] = getter if len(self.keys) > 1 else lambda obj: (getter(obj),)
+        # Binary UUID columns can't be told apart from other binary data by value alone
+        self.converters = tuple((i, _encode_uuid) for i, prop in enumerate(props) if _is_uuid_column(prop.columns[0]))
+
+    def __call__(self, obj: Any) -> dict[str, Any]:
+        values = self.getter(obj)
+        if self.converters:
+            converted = list(values)
+            for i, converter in self.converters:
+                converted[i] = converter(converted[i])
+            return dict(zip(self.keys, converted))
+
+        return dict(zip(self.keys, values))
+
+
+_plans: dict[type, _ColumnPlan | None] = {}
+
+# Result metadata and UUID column positions of the last rows serialised. Rows from the same result share metadata,
+# so this is only recomputed once per result
+_last_row_plan: tuple[Any, tuple[int, ...]] = (None, ())
+
+
+def _is_uuid_column(column: Any) -> bool:
+    column_type = getattr(column, "type", None)
+    return isinstance(column_type, BINARY) and column_type.length == 16
+
+
+def _row_uuid_positions(row: Row) -> tuple[int, ...]:
+    """Get positions of `BINARY(16)` columns in row, so that they are serialised as UUIDs, like in ORM objects"""
+    global _last_row_plan
+
+    parent = row._parent
+    cached_parent, positions = _last_row_plan
+    if cached_parent is parent:
+        return positions
+
+    try:
+        keymap = parent._keymap
+        positions = tuple(
+            i
+            for i, key in enumerate(row._fields)
+            if key in keymap and any(_is_uuid_column(column) for column in keymap[key][2] or ())
+        )
+    except (AttributeError, IndexError, TypeError):  # pragma: no cover
+        # Column types are only available through result metadata internals
+        positions = ()
+
+    _last_row_plan = (parent, positions)
+    return positions
+
+
+def _row_to_dict(row: Row) -> dict[str, Any]:
+    positions = _row_uuid_positions(row)
+    if not positions:
+        return dict(zip(row._fields, row))
+
+    values = list(row)
+    for i in positions:
+        values[i] = _encode_uuid(values[i])
+    return dict(zip(row._fields, values))
+
+
+def _get_plan(cls: type) -> _ColumnPlan | None:
+    if cls not in _plans:
+        try:
+            inspect(cls)
+            _plans[cls] = _ColumnPlan(cls)
+        except NoInspectionAvailable:
+            _plans[cls] = None
+
+    return _plans[cls]
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Row):
+        return _row_to_dict(value)
+    if isinstance(value, Decimal):
+        # NaN and infinity are not valid JSON
+        if not value.is_finite():
+            return None
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _encode_bytes(bytes(value))
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+
+    plan = _get_plan(type(value))
+    if plan is not None:
+        return plan(value)
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_json_encoder = json.JSONEncoder(default=_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def dump_json(content: Any) -> bytes:
+    """Serialise content to JSON, with fast paths for pages, ORM objects and rows. ORM objects are serialised
+    according to a precomputed plan for their mapped class, which includes all non-deferred columns and no
+    relationships. `BINARY(16)` columns (in ORM objects and rows alike) are converted to UUID strings, other
+    binary data is base64 encoded. Non-finite decimals are serialised as null.
+
+    Each ORM object or row is still turned into one dict, which the encoder consumes directly; no other
+    intermediate structures are built.
+
+    Args:
+        content: Content to serialise
+
+    Returns:
+        JSON bytes"""
+    if isinstance(content, Paged):
+        content = {"items": content.items, "total": content.total, "page": content.page, "limit": content.limit}
+
+    if orjson is not None:
+        # Non-string keys are converted like the standard library encoder does
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    return _json_encoder.encode(content).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that serialises pages, ORM objects and rows directly, skipping FastAPI's
+    `jsonable_encoder`. Return it directly from endpoints (i.e.: `return FastJSONResponse(db.paginate(...))`),
+    since FastAPI runs the response model's validation and `jsonable_encoder` on anything else"""
+
+    def render(self, content: Any) -> bytes:
+        with timed("serialization"):
+            return dump_json(content)
@@ -0,0 +1,93 @@
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from .auth import GenericUser
+from .lookups import LookupCache
+from .tables import Permission  # type: ignore
+
+
+class PermissionIndex:
+    """Assigns a bit to each permission type, so that permission sets can be stored and compared as integers.
+    Useful when checking permissions for every row of a large result set"""
+
+    def __init__(self, permissions: Iterable[str]):
+        """
+        Args:
+            permissions: All known permission types. Order determines which bit is assigned to each type
+        """
+        self.bits = {permission: 1 << i for i, permission in enumerate(dict.fromkeys(permissions))}
+        self._user_masks: dict[frozenset[str], int] = {}
+
+    @classmethod
+    def from_database(cls, session: Optional[Session] = None, lookups: Optional[LookupCache] = None):
+        """Build index from the `Permission` table
+
+        Args:
+            session: Database session, uses the session set in `Database` if not set
+            lookups: Lookup cache the table is read from. A new cache is used if not set
+
+        Returns:
+            Permission index"""
+        return cls(row.type for row in (lookups or LookupCache()).all(Permission, session))
+
+    def mask(self, permissions: Iterable[str]) -> int:
+        """Get mask for permissions. Unknown permissions are ignored
+
+        Args:
+            permissions: Permission types
+
+        Returns:
+            Mask"""
+        mask = 0
+        for permission in permissions:
+            mask |= self.bits.get(permission, 0)
+
+        return mask
+
+    def user_mask(self, user: GenericUser) -> int:
+        """Get mask for user's permissions. Masks are memoised, since most users share one of a few permission
+        sets
+
+        Args:
+            user: User
+
+        Returns:
+            Mask"""
+        mask = self._user_masks.get(user.permissions)
+        if mask is None:
+            mask = self._user_masks[user.permissions] = self.mask(user.permissions)
+
+        return mask
+
+
+def require_permission(
+    *permissions: str,
+    user: Callable[..., Any],
+    require_all=False,
+) -> Callable[..., GenericUser]:
+    """Build FastAPI dependency that checks whether the current user has the permissions provided, raising a
+    403 error otherwise. The set of required permissions is computed once, when the dependency is built.
+
+    Args:
+        permissions: Permission types
+        user: Dependency that returns the current user, such as an `AuthResolver`
+        require_all: Require all permissions, instead of any of them
+
+    Returns:
+        Dependency that returns the current user"""
+    required = frozenset(permissions)
+
+    def check_permission(current_user: GenericUser = Depends(user)) -> GenericUser:
+        if require_all:
+            allowed = required <= current_user.permissions
+        else:
+            allowed = not required.isdisjoint(current_user.permissions)
+
+        if not allowed:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not authorised")
+
+        return current_user
+
+    return check_permission
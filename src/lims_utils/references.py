@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, select, tuple_
+from sqlalchemy.orm import Session
+
+from .cache import MISSING, TTLCache
+from .database import Database
+from .models import ProposalReference
+from .tables import BLSession, Proposal  # type: ignore
+
+_ReferenceKey = tuple[str, int, Optional[int]]
+
+
+@dataclass(frozen=True, slots=True)
+class ResolvedReference:
+    """Database IDs for a proposal reference"""
+
+    proposalId: int
+    sessionId: Optional[int] = None
+
+
+def _to_key(reference: ProposalReference) -> _ReferenceKey:
+    # Proposal codes are compared case insensitively by the database
+    return reference.code.lower(), reference.number, reference.visit_number
+
+
+class ReferenceResolver:
+    """Resolves proposal references (such as cm12345 or cm12345-3) into proposal and session IDs, caching
+    results (including references that don't exist) in process"""
+
+    def __init__(self, ttl: float = 300, negative_ttl: float = 30, maxsize: int = 10000):
+        """
+        Args:
+            ttl: Time (in seconds) before a resolved reference is looked up again
+            negative_ttl: Time (in seconds) before a reference that could not be found is looked up again
+            maxsize: Maximum number of cached references
+        """
+        self.cache: TTLCache[_ReferenceKey, ResolvedReference] = TTLCache(
+            ttl=ttl, maxsize=maxsize, negative_ttl=negative_ttl
+        )
+
+    def resolve(self, reference: ProposalReference, session: Optional[Session] = None) -> Optional[ResolvedReference]:
+        """Resolve a single proposal reference
+
+        Args:
+            reference: Proposal reference, as returned by `parse_proposal`
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Resolved IDs, or None if the proposal (or session, if a visit number is provided) does not exist"""
+        return self.resolve_many([reference], session)[0]
+
+    def resolve_many(
+        self, references: Iterable[ProposalReference], session: Optional[Session] = None
+    ) -> list[Optional[ResolvedReference]]:
+        """Resolve proposal references, querying the database once for all references that aren't cached
+
+        Args:
+            references: Proposal references, as returned by `parse_proposal`
+            session: Database session, uses the session set in `Database` if not set
+
+        Returns:
+            Resolved IDs for each reference, in the same order, or None if it does not exist"""
+        keys = [_to_key(reference) for reference in references]
+        resolved: dict[_ReferenceKey, Optional[ResolvedReference]] = {}
+
+        for key in set(keys):
+            cached = self.cache.get(key)
+            if cached is not MISSING:
+                resolved[key] = cached
+
+        missing = [key for key in set(keys) if key not in resolved]
+
+        if missing:
+            fetched = self._fetch(missing, session or Database().session)
+            for key in missing:
+                value = fetched.get(key)
+                self.cache.set(key, value)
+                resolved[key] = value
+
+        return [resolved[key] for key in keys]
+
+    def invalidate(self, reference: Optional[ProposalReference] = None):
+        """Remove reference from cache
+
+        Args:
+            reference: Reference to remove, clears whole cache if not set"""
+        self.cache.invalidate(None if reference is None else _to_key(reference))
+
+    @staticmethod
+    def _fetch(keys: list[_ReferenceKey], session: Session) -> dict[_ReferenceKey, ResolvedReference]:
+        proposals = {(code, str(number)) for code, number, _ in keys}
+        visit_numbers = {visit_number for _, _, visit_number in keys if visit_number is not None}
+
+        query = (
+            select(
+                Proposal.proposalId,
+                Proposal.proposalCode,
+                Proposal.proposalNumber,
+                BLSession.sessionId,
+                BLSession.visit_number,
+            )
+            .outerjoin(
+                BLSession,
+                and_(BLSession.proposalId == Proposal.proposalId, BLSession.visit_number.in_(visit_numbers)),
+            )
+            .filter(tuple_(Proposal.proposalCode, Proposal.proposalNumber).in_(proposals))
+        )
+
+        fetched: dict[_ReferenceKey, ResolvedReference] = {}
+        for proposal_id, code, number, session_id, visit_number in session.execute(query):
+            proposal_key = (code.lower(), int(number))
+            fetched[(*proposal_key, None)] = ResolvedReference(proposalId=proposal_id)
+            if session_id is not None:
+                fetched[(*proposal_key, visit_number)] = ResolvedReference(proposalId=proposal_id, sessionId=session_id)
+
+        return fetched
@@ -1,7 +1,12 @@
+import ctypes
+import ctypes.util
 import json
+import logging
 import os
+import select
+import threading
 from pathlib import Path
-from typing import Any, Dict, Literal, Tuple, Type
+from typing import Any, Callable, Dict, Generic, List, Literal, Optional, Tuple, Type, TypeVar, Union
 
 from pydantic import BaseModel
 from pydantic.fields import FieldInfo
@@ -11,11 +16,16 @@ from pydantic_settings import (
     SettingsConfigDict,
 )
 
+_logger = logging.getLogger("uvicorn")
+
 
 class Auth(BaseModel):
     endpoint: str = "https://localhost/auth"
     type: Literal["dummy", "micro"] = "micro"
     cookie_key: str = "cookie_key"
+    timeout: float = 5
+    max_connections: int = 100
+    http2: bool = True
 
 
 class DB(BaseModel):
@@ -23,13 +33,70 @@ class DB(BaseModel):
     overflow: int = 6
 
 
+_Stamp = Tuple[int, int, int, int, int]
+
+# (Path, encoding) -> (file stamp, parsed contents)
+_config_cache: Dict[Tuple[str, Optional[str]], Tuple[_Stamp, Dict[str, Any]]] = {}
+
+
+def _file_stamp(path: Path) -> Optional[_Stamp]:
+    """Get values that change whenever the file is modified or replaced. Device and inode numbers catch files
+    swapped in with the same size and modification time (such as Kubernetes config maps, which replace a symlinked
+    directory), and the change time catches modification times being set back"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+
+    return stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size
+
+
+def config_path() -> Path:
+    """Get path of the JSON config file, set by the `CONFIG_PATH` environment variable"""
+    return Path(os.environ.get("CONFIG_PATH") or "config.json")
+
+
+def load_config(path: Union[str, Path, None] = None, encoding: Optional[str] = None) -> Dict[str, Any]:
+    """Read and parse JSON config file. Parsed contents are cached for the whole process, and reused until the
+    file is modified or replaced, so they must not be modified
+
+    Args:
+        path: Config file path, defaults to `config_path()`
+        encoding: File encoding
+
+    Returns:
+        Parsed config"""
+    path = Path(path) if path is not None else config_path()
+    key = (str(path.absolute()), encoding)
+
+    stamp = _file_stamp(path)
+    cached = _config_cache.get(key)
+    if stamp is not None and cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    data = json.loads(path.read_text(encoding))
+    if not isinstance(data, dict):
+        raise ValueError(f"Config file {path} must contain a JSON object, not {type(data).__name__}")
+
+    if stamp is not None:
+        _config_cache[key] = (stamp, data)
+
+    return data
+
+
 class JsonConfigSettingsSource(PydanticBaseSettingsSource):
-    """Reads application settings from JSON file"""
+    """Reads application settings from JSON file. The file is only read once per settings build, and not at all
+    if it hasn't changed since it was last read"""
+
+    def __init__(self, settings_cls: Type[BaseSettings]):
+        super().__init__(settings_cls)
+        self._config: Optional[Dict[str, Any]] = None
 
     def get_field_value(self, field: FieldInfo, field_name: str) -> Tuple[Any, str, bool]:
-        encoding = self.config.get("env_file_encoding")
-        file_content_json = json.loads(Path(os.environ.get("CONFIG_PATH") or "config.json").read_text(encoding))
-        field_value = file_content_json.get(field_name)
+        if self._config is None:
+            self._config = load_config(encoding=self.config.get("env_file_encoding"))
+
+        field_value = self._config.get(field_name)
         return field_value, field_name, False
 
     def prepare_field_value(self, field_name: str, field: FieldInfo, value: Any, value_is_complex: bool) -> Any:
@@ -37,6 +104,7 @@ class JsonConfigSettingsSource(PydanticBaseSettingsSource):
 
     def __call__(self) -> Dict[str, Any]:
         d: Dict[str, Any] = {}
+        self._config = None
 
         for field_name, field in self.settings_cls.model_fields.items():
             field_value, field_key, value_is_complex = self.get_field_value(field, field_name)
@@ -68,3 +136,177 @@ class Settings(BaseSettings):
             init_settings,
             JsonConfigSettingsSource(settings_cls),
         )
+
+
+S = TypeVar("S", bound=BaseSettings)
+
+SettingsSubscriber = Callable[[Any, Any], None]
+"""Function called with the previous and new settings when the settings change"""
+
+_IN_CREATE = 0x100
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_TO = 0x80
+
+
+def _inotify_watch(directory: Path) -> Optional[int]:
+    """Watch directory for files being written or moved into it. Returns None if inotify is not available"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+
+    if fd < 0:
+        return None
+
+    if libc.inotify_add_watch(fd, os.fsencode(directory), _IN_CREATE | _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+        os.close(fd)
+        return None
+
+    return fd
+
+
+def _inotify_drain(fd: int):
+    """Discard pending inotify events. Events are only used as a signal to check the file, since the config file
+    can change without any event naming it (such as when a symlinked directory it is in is replaced)"""
+    try:
+        while os.read(fd, 65536):
+            pass
+    except BlockingIOError:
+        pass
+
+
+class SettingsManager(Generic[S]):
+    """Keeps settings up to date with the JSON config file (`CONFIG_PATH`), so that workers don't need to be
+    restarted when it changes. The file's stamp (see `_file_stamp`) is checked whenever inotify reports changes in
+    its directory, where available, and every `poll_interval` seconds.
+
+    New settings are only swapped in once they've been validated, so a file that can't be parsed or validated never
+    replaces good settings. Subscribers are then called with the previous and new settings, so that they can resize
+    pools or reconfigure caches"""
+
+    def __init__(
+        self,
+        settings_cls: Type[S] = Settings,  # type: ignore[assignment]
+        poll_interval: float = 1,
+        use_inotify: bool = True,
+    ):
+        """
+        Args:
+            settings_cls: Settings class
+            poll_interval: Maximum time (in seconds) between checks for changes. Also bounds how long `stop`
+                takes
+            use_inotify: Use inotify if available
+        """
+        self.settings_cls = settings_cls
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.path = config_path()
+        self._settings: Optional[S] = None
+        self._subscribers: List[SettingsSubscriber] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def settings(self) -> S:
+        """Current settings"""
+        if self._settings is None:
+            raise RuntimeError("SettingsManager must be started or reloaded before use")
+        return self._settings
+
+    def subscribe(self, subscriber: SettingsSubscriber) -> Callable[[], None]:
+        """Call function whenever settings change
+
+        Args:
+            subscriber: Function called with the previous and new settings
+
+        Returns:
+            Function that removes the subscription"""
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+        def unsubscribe():
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+
+        return unsubscribe
+
+    def reload(self) -> bool:
+        """Build settings from config file, replacing the current settings if they are valid and have changed
+
+        Returns:
+            Whether the settings changed"""
+        try:
+            new = self.settings_cls()
+        except (OSError, ValueError) as exc:
+            if self._settings is None:
+                raise
+            _logger.warning("Invalid config file %s, keeping previous settings: %s", self.path, exc)
+            return False
+
+        with self._lock:
+            old = self._settings
+            if old == new:
+                return False
+            self._settings = new
+            subscribers = list(self._subscribers)
+
+        if old is not None:
+            for subscriber in subscribers:
+                try:
+                    subscriber(old, new)
+                except Exception:
+                    _logger.exception("Settings subscriber %r failed", subscriber)
+
+        return True
+
+    def start(self):
+        """Load settings and start watching config file for changes"""
+        # Watch before loading, so that changes made while loading aren't missed
+        fd = _inotify_watch(self.path.absolute().parent) if self.use_inotify else None
+        stamp = _file_stamp(self.path)
+
+        try:
+            if self._settings is None:
+                self.reload()
+        except BaseException:
+            if fd is not None:
+                os.close(fd)
+            raise
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, args=(fd, stamp), name="settings-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching config file"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self, fd: Optional[int], stamp: Optional[_Stamp]):
+        try:
+            while not self._stop.is_set():
+                if fd is not None:
+                    readable, _, _ = select.select([fd], [], [], self.poll_interval)
+                    if readable:
+                        _inotify_drain(fd)
+                else:
+                    self._stop.wait(self.poll_interval)
+
+                new_stamp = _file_stamp(self.path)
+                if new_stamp == stamp:
+                    continue
+                stamp = new_stamp
+
+                try:
+                    self.reload()
+                except Exception:
+                    # Keep watching, so that a later fix to the file is still picked up
+                    _logger.exception("Failed to reload settings from %s", self.path)
+        finally:
+            if fd is not None:
+                os.close(fd)
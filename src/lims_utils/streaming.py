@@ -0,0 +1,123 @@
+import zlib
+from typing import Any, AsyncGenerator, Generator
+
+import anyio
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from .models import dump_json
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def iter_ndjson(
+    session: Session,
+    query: Select,
+    scalar=True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Generator[bytes, None, None]:
+    """Run query with a server-side cursor, yielding results as newline-delimited JSON. Only one chunk of rows is
+    held in memory at a time.
+
+    Args:
+        session: Database session
+        query: Query to run
+        scalar: Is query already scalar (use `execute` instead of `scalars` when executing)
+        chunk_size: Number of rows fetched from the cursor and encoded at a time
+
+    Returns:
+        Generator of NDJSON chunks, each containing up to `chunk_size` lines"""
+    result: Any = session.execute(query, execution_options={"yield_per": chunk_size})
+    try:
+        if not scalar:
+            result = result.scalars()
+
+        for partition in result.partitions():
+            yield b"".join([dump_json(item) + b"\n" for item in partition])
+    finally:
+        result.close()
+
+
+async def stream_ndjson(
+    session: Session,
+    query: Select,
+    scalar=True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    compress=False,
+) -> AsyncGenerator[bytes, None]:
+    """Asynchronous version of `iter_ndjson`. Chunks are only fetched from the database once the previous chunk
+    has been sent, so slow clients slow down the query rather than increasing memory usage.
+
+    Args:
+        session: Database session
+        query: Query to run
+        scalar: Is query already scalar (use `execute` instead of `scalars` when executing)
+        chunk_size: Number of rows fetched from the cursor and encoded at a time
+        compress: Compress output with gzip
+
+    Returns:
+        Asynchronous generator of NDJSON (or gzip compressed NDJSON) chunks"""
+    chunks = iter_ndjson(session, query, scalar, chunk_size)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    try:
+        while (chunk := await run_in_threadpool(next, chunks, None)) is not None:
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+
+        if compressor is not None:
+            yield compressor.flush()
+    finally:
+        # Shielded, since Starlette cancels the response's task group when the client disconnects, which would
+        # otherwise leave the server-side cursor open
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(chunks.close)
+
+
+async def _stream_ndjson_session(
+    session_maker: sessionmaker[Session],
+    query: Select,
+    scalar: bool,
+    chunk_size: int,
+    compress: bool,
+) -> AsyncGenerator[bytes, None]:
+    session = session_maker()
+    try:
+        async for chunk in stream_ndjson(session, query, scalar, chunk_size, compress):
+            yield chunk
+    finally:
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(session.close)
+
+
+def ndjson_response(
+    query: Select,
+    session_maker: sessionmaker[Session],
+    scalar=True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    compress=False,
+) -> StreamingResponse:
+    """Build streaming NDJSON response for query, for result sets too large to be paginated or held in memory.
+    Uses its own session, since request scoped sessions are closed before streaming responses are sent.
+
+    Args:
+        query: Query to run
+        session_maker: Session maker, returned by SQLAlchemy ORM's `sessionmaker` builder
+        scalar: Is query already scalar (use `execute` instead of `scalars` when executing)
+        chunk_size: Number of rows fetched from the cursor and encoded at a time
+        compress: Compress response with gzip
+
+    Returns:
+        Streaming response"""
+    headers = {"Content-Encoding": "gzip"} if compress else None
+
+    return StreamingResponse(
+        _stream_ndjson_session(session_maker, query, scalar, chunk_size, compress),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
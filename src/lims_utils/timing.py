@@ -0,0 +1,255 @@
+import contextlib
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Generator, Literal, Optional, Sequence
+
+from fastapi import APIRouter
+from sqlalchemy import Engine, event
+
+from .metrics import Registry
+
+Phase = Literal["auth", "db", "serialization"]
+PHASES: tuple[Phase, ...] = ("auth", "db", "serialization")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""Latency histogram bucket upper bounds, in seconds"""
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestTiming:
+    """Time spent in each phase of the request being handled. Nested timers for the same phase (such as
+    `AuthResolver` calling `CookieOrHTTPBearer`) are only counted once"""
+
+    __slots__ = ("auth", "db", "serialization", "_active")
+
+    def __init__(self):
+        self.auth = 0.0
+        self.db = 0.0
+        self.serialization = 0.0
+        self._active: set[str] = set()
+
+
+_request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("_request_timing", default=None)
+
+
+@contextlib.contextmanager
+def timed(phase: Phase) -> Generator[None, None, None]:
+    """Add time spent in block to a phase of the current request. Does nothing outside of requests handled by
+    `TimingMiddleware`
+
+    Args:
+        phase: Phase the time is added to"""
+    timing = _request_timing.get()
+    if timing is None or phase in timing._active:
+        yield
+        return
+
+    timing._active.add(phase)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(timing, phase, getattr(timing, phase) + time.perf_counter() - start)
+        timing._active.discard(phase)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context rather than the connection, so that nothing is left behind if the query fails
+    if context is not None:
+        context._lims_query_start = time.perf_counter()
+
+
+def _end_query(context):
+    start = getattr(context, "_lims_query_start", None)
+    if start is None:
+        return
+
+    context._lims_query_start = None
+    timing = _request_timing.get()
+    if timing is not None:
+        timing.db += time.perf_counter() - start
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _end_query(context)
+
+
+def _handle_error(exception_context):
+    _end_query(exception_context.execution_context)
+
+
+def instrument_engine(engine: Engine):
+    """Add time spent running queries on engine (such as the engine behind the session maker passed to
+    `get_session`) to the DB phase of the current request, including queries that fail. Safe to call more than
+    once
+
+    Args:
+        engine: Database engine"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+class RouteStats:
+    """Aggregated measurements for a single route"""
+
+    __slots__ = ("buckets", "count", "total", "phases", "statuses")
+
+    def __init__(self, bucket_count: int):
+        self.buckets = [0] * (bucket_count + 1)
+        self.count = 0
+        self.total = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.statuses: dict[int, int] = {}
+
+
+class TimingMiddleware:
+    """ASGI middleware that records latency histograms, status codes and time spent in auth, DB and
+    serialization for each route, plus the number of requests in flight.
+
+    Aggregates are only updated from the event loop thread, once per request, so they need no locking.
+    Measurements can be read with `snapshot`, or exposed with `metrics_router`. If a registry is passed, they are
+    also recorded as Prometheus metrics, which can be aggregated across worker processes"""
+
+    def __init__(self, app, buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = None):
+        """
+        Args:
+            app: ASGI application
+            buckets: Latency histogram bucket upper bounds, in seconds
+            registry: Metrics registry, such as `lims_utils.metrics.REGISTRY`
+        """
+        self.app = app
+        self.bucket_bounds = tuple(sorted(buckets))
+        self.routes: dict[tuple[str, str], RouteStats] = {}
+        self.in_flight = 0
+
+        self.registry = registry
+        if registry is not None:
+            self._duration = registry.histogram(
+                "lims_http_request_duration_seconds", "Request duration", ["method", "route"], self.bucket_bounds
+            )
+            self._requests = registry.counter(
+                "lims_http_requests_total", "Requests handled", ["method", "route", "status"]
+            )
+            self._phases = registry.counter(
+                "lims_http_request_phase_seconds_total",
+                "Time spent in each request phase",
+                ["method", "route", "phase"],
+            )
+            self._in_flight = registry.gauge("lims_http_requests_in_flight", "Requests being handled")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timing = RequestTiming()
+        token = _request_timing.set(timing)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.in_flight += 1
+        if self.registry is not None:
+            self._in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.in_flight -= 1
+            if self.registry is not None:
+                self._in_flight.dec()
+            _request_timing.reset(token)
+            self._record(scope, status_code, elapsed, timing)
+
+    def _record(self, scope, status_code: int, elapsed: float, timing: RequestTiming):
+        route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+        key = (scope["method"], route)
+
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats(len(self.bucket_bounds))
+
+        stats.buckets[bisect_left(self.bucket_bounds, elapsed)] += 1
+        stats.count += 1
+        stats.total += elapsed
+        stats.statuses[status_code] = stats.statuses.get(status_code, 0) + 1
+        for phase in PHASES:
+            stats.phases[phase] += getattr(timing, phase)
+
+        if self.registry is not None:
+            self._duration.labels(*key).observe(elapsed)
+            self._requests.labels(*key, status_code).inc()
+            for phase in PHASES:
+                self._phases.labels(*key, phase).inc(getattr(timing, phase))
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get copy of current measurements
+
+        Returns:
+            Dictionary with requests in flight and, for each route, request count, total and per-phase time
+            (in seconds), status code counts and cumulative latency histogram"""
+        routes = []
+        for (method, route), stats in list(self.routes.items()):
+            cumulative = 0
+            histogram = {}
+            for bound, count in zip([*map(str, self.bucket_bounds), "+Inf"], stats.buckets):
+                cumulative += count
+                histogram[bound] = cumulative
+
+            routes.append(
+                {
+                    "method": method,
+                    "route": route,
+                    "count": stats.count,
+                    "total": stats.total,
+                    "phases": dict(stats.phases),
+                    "statuses": dict(stats.statuses),
+                    "histogram": histogram,
+                }
+            )
+
+        return {"in_flight": self.in_flight, "routes": routes}
+
+
+def find_timing_middleware(app) -> Optional[TimingMiddleware]:
+    """Find timing middleware in application's middleware stack"""
+    current = getattr(app, "middleware_stack", None)
+    while current is not None:
+        if isinstance(current, TimingMiddleware):
+            return current
+        current = getattr(current, "app", None)
+
+    return None
+
+
+def metrics_router(middleware_or_app: Any, path: str = "/metrics/requests", **kwargs) -> APIRouter:
+    """Build router exposing request measurements. Not included by default, since measurements may reveal
+    details about the application that shouldn't be public
+
+    Args:
+        middleware_or_app: Timing middleware, or application it was added to
+        path: Path of the metrics endpoint. Differs from `prometheus_router`'s, so that both can be included
+        kwargs: Arguments passed to the route, such as `dependencies` to restrict access
+
+    Returns:
+        Router"""
+    router = APIRouter()
+
+    @router.get(path, include_in_schema=False, **kwargs)
+    def get_metrics():
+        middleware = (
+            middleware_or_app
+            if isinstance(middleware_or_app, TimingMiddleware)
+            else find_timing_middleware(middleware_or_app)
+        )
+        return middleware.snapshot() if middleware is not None else {"in_flight": 0, "routes": []}
+
+    return router
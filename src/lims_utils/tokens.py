@@ -0,0 +1,192 @@
+import asyncio
+import time
+from dataclasses import replace
+from typing import Any, Callable, Optional, Sequence
+
+from .auth import GenericUser, TokenValidator
+from .logging import app_logger
+
+try:
+    import httpx
+    import jwt
+except ImportError:  # pragma: no cover
+    httpx = None  # type: ignore
+    jwt = None  # type: ignore
+
+
+def claims_to_user(claims: dict[str, Any]) -> GenericUser:
+    """Build user from standard (OpenID Connect) and ISPyB specific JWT claims
+
+    Args:
+        claims: Verified token claims
+
+    Returns:
+        User"""
+    fedid = claims.get("fedid") or claims["sub"]
+
+    return GenericUser(
+        fedid=fedid,
+        id=str(claims.get("id", fedid)),
+        familyName=claims.get("family_name", ""),
+        title=claims.get("title", ""),
+        givenName=claims.get("given_name", ""),
+        permissions=frozenset(claims.get("permissions", ())),
+        email=claims.get("email"),
+    )
+
+
+class JWTVerifier:
+    """Verifies JWTs locally, using signing keys fetched from a JWKS endpoint. Keys are refreshed in the
+    background every `refresh_interval` seconds, and on demand (at most once every `min_refresh_interval`
+    seconds) if a token is signed with a key that isn't known yet, so that rotated keys are picked up straight
+    away. Opaque (non-JWT) tokens are passed on to `fallback`, such as `AuthClient.get_user`.
+
+    Should be opened and closed in the application's lifespan, like `AuthClient`. Can be used as the validator
+    for `AuthResolver`. Users are returned with `expires_at` set to the token's expiry, so that the resolver
+    never serves them from its cache once the token has expired."""
+
+    def __init__(
+        self,
+        jwks_url: str,
+        algorithms: Sequence[str] = ("RS256", "ES256"),
+        audience: Optional[str] = None,
+        issuer: Optional[str] = None,
+        leeway: float = 0,
+        refresh_interval: float = 300,
+        min_refresh_interval: float = 30,
+        fallback: Optional[TokenValidator] = None,
+        user_factory: Callable[[dict[str, Any]], GenericUser] = claims_to_user,
+        client: Optional["httpx.AsyncClient"] = None,
+    ):
+        """
+        Args:
+            jwks_url: URL of the JSON Web Key Set
+            algorithms: Accepted signing algorithms
+            audience: Expected audience (`aud` claim), not checked if not set
+            issuer: Expected issuer (`iss` claim), not checked if not set
+            leeway: Tolerance (in seconds) when checking expiry, to account for clock skew
+            refresh_interval: Time (in seconds) between background key set refreshes
+            min_refresh_interval: Minimum time (in seconds) between refreshes triggered by unknown keys
+            fallback: Validator for opaque tokens. Opaque tokens are rejected if not set
+            user_factory: Function that builds a user from verified claims
+            client: HTTP client used to fetch the key set. A new client is created if not set
+        """
+        if httpx is None or jwt is None:  # pragma: no cover
+            raise ImportError("httpx and pyjwt are required to use JWTVerifier, install lims-utils[auth]")
+
+        self.jwks_url = jwks_url
+        self.algorithms = list(algorithms)
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.fallback = fallback
+        self.user_factory = user_factory
+        self.keys: dict[Optional[str], jwt.PyJWK] = {}
+
+        self._client = client
+        self._owns_client = client is None
+        self._refreshed_at: Optional[float] = None
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def open(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient()
+
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def refresh(self):
+        """Fetch signing keys. If fetching fails, previously fetched keys are kept"""
+        await self._refresh()
+
+    async def _refresh(self, stale_after: Optional[float] = None):
+        if self._client is None:
+            raise RuntimeError("JWTVerifier must be opened before use")
+
+        async with self._refresh_lock:
+            # Tokens signed with the same unknown key arriving at once should only trigger a single refresh
+            if (
+                stale_after is not None
+                and self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < stale_after
+            ):
+                return
+
+            self._refreshed_at = time.monotonic()
+            try:
+                response = await self._client.get(self.jwks_url)
+                response.raise_for_status()
+                key_set = jwt.PyJWKSet.from_dict(response.json())
+            except (httpx.HTTPError, jwt.PyJWKSetError, ValueError) as exc:
+                app_logger.warning("Could not fetch signing keys from %s: %s", self.jwks_url, exc)
+                return
+
+            # Replaced as a whole, so that verifications running concurrently never see a partial key set
+            self.keys = {key.key_id: key for key in key_set.keys}
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    async def _get_key(self, key_id: Optional[str]) -> Optional["jwt.PyJWK"]:
+        key = self.keys.get(key_id)
+        if key is None:
+            await self._refresh(stale_after=self.min_refresh_interval)
+            key = self.keys.get(key_id)
+
+        return key
+
+    async def verify(self, token: str) -> Optional[GenericUser]:
+        """Verify token, checking its signature and expiry
+
+        Args:
+            token: JWT or opaque token
+
+        Returns:
+            User, or None if the token is invalid"""
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.DecodeError:
+            return None if self.fallback is None else await self.fallback(token)
+
+        key = await self._get_key(header.get("kid"))
+        if key is None:
+            return None
+
+        try:
+            claims = jwt.decode(
+                token,
+                key=key,
+                algorithms=self.algorithms,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={"require": ["exp"], "verify_aud": self.audience is not None},
+            )
+            return replace(self.user_factory(claims), expires_at=float(claims["exp"]))
+        except (jwt.InvalidTokenError, KeyError):
+            return None
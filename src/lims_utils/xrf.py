@@ -0,0 +1,198 @@
+import gzip
+import json
+import zlib
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from .tables import GridInfo  # type: ignore
+
+_DECOMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+    "gzip": gzip.decompress,
+    "gz": gzip.decompress,
+    "zlib": zlib.decompress,
+}
+
+
+def parse_data_format(data_format: str) -> tuple[list[str], str]:
+    """Split XRF map data format into compression steps and encoding
+
+    Args:
+        data_format: Data format, as stored in `XRFFluorescenceMapping.dataFormat`. Compression and encoding
+            are separated by `+`, in any order, such as `json+gzip`, `gzip+float32` or `<u2`
+
+    Returns:
+        Compression steps and payload encoding (either `json` or a NumPy dtype string)"""
+    compression: list[str] = []
+    encoding = None
+
+    for part in data_format.lower().split("+"):
+        part = part.strip()
+        if part in _DECOMPRESSORS:
+            compression.append(part)
+        elif encoding is None:
+            encoding = part
+        else:
+            raise ValueError(f"Invalid data format '{data_format}': more than one encoding")
+
+    if encoding is None:
+        raise ValueError(f"Invalid data format '{data_format}': no encoding")
+
+    if encoding != "json":
+        try:
+            np.dtype(encoding)
+        except TypeError:
+            raise ValueError(f"Invalid data format '{data_format}': unknown encoding '{encoding}'")
+
+    return compression, encoding
+
+
+def grid_shape(grid_info: GridInfo) -> tuple[int, int]:
+    """Get map shape (rows, columns) from grid information
+
+    Args:
+        grid_info: Grid information for the map
+
+    Returns:
+        Map shape"""
+    if grid_info.steps_x is None or grid_info.steps_y is None:
+        raise ValueError("Grid information has no step counts")
+
+    return int(grid_info.steps_y), int(grid_info.steps_x)
+
+
+def decode_map(
+    data: bytes,
+    data_format: str,
+    shape: Optional[tuple[int, int]] = None,
+    snaked: bool = False,
+) -> npt.NDArray:
+    """Decode XRF map blob into NumPy array. Uncompressed binary data is not copied, the returned array is a
+    read-only view of the original buffer. Maps with fewer points than the grid (partially collected maps) are
+    padded with NaN.
+
+    Args:
+        data: Raw map data, as stored in `XRFFluorescenceMapping.data`
+        data_format: Data format, as stored in `XRFFluorescenceMapping.dataFormat`
+        shape: Map shape (rows, columns), such as the one returned by `grid_shape`. Returns flat array if not set
+        snaked: Whether odd rows were collected in reverse (`GridInfo.snaked`)
+
+    Returns:
+        Decoded map"""
+    compression, encoding = parse_data_format(data_format)
+
+    for step in compression:
+        data = _DECOMPRESSORS[step](data)
+
+    if encoding == "json":
+        array = np.asarray(json.loads(data), dtype=np.float64).ravel()
+    else:
+        array = np.frombuffer(data, dtype=np.dtype(encoding))
+
+    if shape is None:
+        return array
+
+    size = shape[0] * shape[1]
+    if array.size < size:
+        padded = np.full(size, np.nan, dtype=np.result_type(array.dtype, np.float32))
+        padded[: array.size] = array
+        array = padded
+    elif array.size > size:
+        raise ValueError(f"Map has {array.size} points, but grid only has {size}")
+
+    array = array.reshape(shape)
+
+    if snaked:
+        array = array.copy()
+        array[1::2] = array[1::2, ::-1]
+
+    return array
+
+
+def scale(
+    array: npt.NDArray,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+) -> npt.NDArray[np.float32]:
+    """Scale map linearly to [0, 1], clipping values outside the range. NaN values are mapped to 0.
+
+    Args:
+        array: Map to scale
+        min_value: Value mapped to 0, uses map minimum if not set
+        max_value: Value mapped to 1, uses map maximum if not set
+
+    Returns:
+        Scaled map"""
+    if min_value is None:
+        min_value = float(np.nanmin(array))
+    if max_value is None:
+        max_value = float(np.nanmax(array))
+
+    out = np.subtract(array, min_value, dtype=np.float32)
+    span = max_value - min_value
+    if span > 0:
+        out *= np.float32(1 / span)
+    np.clip(out, 0, 1, out=out)
+    np.nan_to_num(out, copy=False, nan=0)
+
+    return out
+
+
+def blend(layers: Sequence[npt.NDArray], opacities: Sequence[float]) -> npt.NDArray[np.float32]:
+    """Blend scaled layers with the given opacities, using the "over" operator from bottom to top
+
+    Args:
+        layers: Scaled layers, from bottom to top
+        opacities: Opacity for each layer
+
+    Returns:
+        Blended map"""
+    if len(layers) != len(opacities):
+        raise ValueError("Number of layers and opacities must match")
+
+    out = np.zeros(np.shape(layers[0]), dtype=np.float32)
+    for layer, opacity in zip(layers, opacities):
+        out *= np.float32(1 - opacity)
+        out += np.float32(opacity) * layer
+
+    return out
+
+
+def composite(
+    r: npt.NDArray,
+    g: npt.NDArray,
+    b: npt.NDArray,
+    r_opacity: float = 1,
+    g_opacity: float = 1,
+    b_opacity: float = 1,
+    opacity: float = 1,
+) -> npt.NDArray[np.uint8]:
+    """Build RGBA image from three maps, as described by `XFEFluorescenceComposite`. Each map is scaled to its
+    own minimum and maximum before applying the layer's opacity.
+
+    Args:
+        r: Red layer map
+        g: Green layer map
+        b: Blue layer map
+        r_opacity: Red layer opacity
+        g_opacity: Green layer opacity
+        b_opacity: Blue layer opacity
+        opacity: Total map opacity
+
+    Returns:
+        RGBA image, with shape (rows, columns, 4)"""
+    if not (np.shape(r) == np.shape(g) == np.shape(b)):
+        raise ValueError("All layers must have the same shape")
+
+    image = np.empty((*np.shape(r), 4), dtype=np.uint8)
+
+    for channel, (layer, layer_opacity) in enumerate(((r, r_opacity), (g, g_opacity), (b, b_opacity))):
+        scaled = scale(layer)
+        scaled *= np.float32(layer_opacity * 255)
+        np.rint(scaled, out=scaled)
+        image[..., channel] = scaled
+
+    image[..., 3] = round(opacity * 255)
+
+    return image
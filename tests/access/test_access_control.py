@@ -0,0 +1,108 @@
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.access import AccessControl
+from lims_utils.auth import GenericUser
+from lims_utils.database import get_session
+from lims_utils.tables import BLSession, Person, Proposal, ProposalHasPerson, SessionHasPerson  # type: ignore
+from lims_utils.tokens import claims_to_user
+
+
+def new_user(id: int, *permissions: str):
+    return GenericUser(
+        fedid="abc12345", id=str(id), familyName="Doe", title="Dr", givenName="Jane", permissions=frozenset(permissions)
+    )
+
+
+@pytest.fixture
+def session():
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all(
+            [
+                *[Proposal(proposalId=i, proposalCode="cm", proposalNumber=str(i), personId=1) for i in (1, 2, 3)],
+                *[BLSession(sessionId=10 * i + j, proposalId=i, visit_number=j) for i in (1, 2, 3) for j in (1, 2)],
+                Person(personId=5, login="abc12345"),
+                ProposalHasPerson(proposalHasPersonId=1, proposalId=1, personId=5),
+                SessionHasPerson(sessionId=21, personId=5),
+            ]
+        )
+        session.commit()
+
+        statements: list[str] = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        session.info["statements"] = statements
+
+        yield session
+
+    engine.dispose()
+
+
+def test_filter_proposals(session):
+    """Should only return proposals user is a member of"""
+    assert AccessControl().filter_proposals(new_user(5), [1, 2, 3], session) == {1}
+
+
+def test_filter_sessions(session):
+    """Should return sessions user is a member of, and sessions in proposals user is a member of"""
+    assert AccessControl().filter_sessions(new_user(5), [11, 12, 21, 22, 31], session) == {11, 12, 21}
+
+
+def test_jwt_user(session):
+    """Should look up users without numeric IDs by login, with a single query"""
+    access = AccessControl()
+
+    assert access.filter_proposals(claims_to_user({"sub": "abc12345"}), [1, 2, 3], session) == {1}
+    assert access.filter_proposals(claims_to_user({"sub": "xyz98765"}), [1, 2, 3], session) == set()
+    assert len(session.info["statements"]) == 2
+
+
+def test_admin(session):
+    """Should return all items for admins, without querying the database"""
+    access = AccessControl(admin_permissions=["super_admin"])
+
+    assert access.filter_sessions(new_user(6, "super_admin"), [11, 31], session) == {11, 31}
+    assert session.info["statements"] == []
+
+
+def test_cache(session):
+    """Should only fetch user's memberships once"""
+    access = AccessControl()
+    user = new_user(5)
+
+    for _ in range(3):
+        access.filter_proposals(user, [1, 2], session)
+
+    assert len(session.info["statements"]) == 1
+
+
+def test_no_memberships(session):
+    """Should return nothing for users with no memberships"""
+    assert AccessControl().filter_sessions(new_user(6), [11, 21], session) == set()
+
+
+def test_restrict(session):
+    """Should filter query to accessible rows"""
+    query = AccessControl().restrict(
+        select(BLSession.sessionId).order_by(BLSession.sessionId),
+        new_user(5),
+        session_column=BLSession.sessionId,
+        session=session,
+    )
+
+    assert session.scalars(query).all() == [11, 12, 21]
+
+
+def test_restrict_no_memberships(session):
+    """Should return empty query for users with no memberships"""
+    query = AccessControl().restrict(select(Proposal.proposalId), new_user(6), Proposal.proposalId, session=session)
+
+    assert session.scalars(query).all() == []
+
+
+def test_database_session(session):
+    """Should use session from Database if no session is passed"""
+    with get_session(lambda: session):
+        assert AccessControl().filter_proposals(new_user(5), [1, 2]) == {1}
@@ -0,0 +1,240 @@
+import asyncio
+import json
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+
+from lims_utils.auth import AuthClient, CircuitBreaker, GenericUser
+from lims_utils.settings import Auth
+
+user: dict[str, Any] = {
+    "fedid": "abc12345",
+    "id": "1",
+    "familyName": "Doe",
+    "title": "Dr",
+    "givenName": "Jane",
+    "permissions": [],
+}
+
+
+class StandInServer:
+    """Minimal HTTP/1.1 server with keep-alive, standing in for the auth microservice"""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests: list[str] = []
+        self.status = 200
+        self.delay = 0.0
+        self.body: Any = user
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while request_line := await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    key, value = line.decode().split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+
+                self.requests.append(request_line.decode().split()[1])
+                await asyncio.sleep(self.delay)
+
+                if self.status == 200 and headers.get("authorization") != "Bearer valid":
+                    status, body = 401, {"detail": "Invalid token"}
+                else:
+                    status, body = self.status, self.body
+
+                content = json.dumps(body).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} Status\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(content)}\r\n\r\n".encode()
+                    + content
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest_asyncio.fixture
+async def server():
+    stand_in = StandInServer()
+    server = await asyncio.start_server(stand_in.handle, "127.0.0.1", 0)
+    stand_in.url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/auth"  # type: ignore
+
+    async with server:
+        yield stand_in
+        server.close()
+
+
+@pytest.mark.asyncio
+async def test_get_user(server):
+    """Should return user for valid token and None for invalid token"""
+    async with AuthClient(server.url) as client:
+        assert await client.get_user("valid") == GenericUser(**user)
+        assert await client.get_user("invalid") is None
+
+    assert server.requests == ["/auth/user", "/auth/user"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(["status", "valid"], [(401, False), (403, False), (404, None), (429, None)])
+async def test_get_user_status(server, status, valid):
+    """Should only treat 401 and 403 as invalid tokens, raising 503 for other unexpected responses"""
+    server.status = status
+
+    async with AuthClient(server.url) as client:
+        if valid is None:
+            with pytest.raises(HTTPException) as exc:
+                await client.get_user("valid")
+            assert exc.value.status_code == 503
+        else:
+            assert await client.get_user("valid") is None
+
+
+@pytest.mark.asyncio
+async def test_get_user_fields(server):
+    """Should ignore unknown fields, and raise 503 if the response is missing fields"""
+    server.body = {**user, "newField": "value"}
+
+    async with AuthClient(server.url) as client:
+        assert await client.get_user("valid") == GenericUser(**user)
+
+        server.body = {"fedid": "abc12345"}
+        with pytest.raises(HTTPException) as exc:
+            await client.get_user("valid")
+        assert exc.value.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial(server):
+    """Should release trial call if it is cancelled, so that the circuit can still close"""
+    server.status = 500
+
+    async with AuthClient(server.url, failure_threshold=1, reset_timeout=0.01) as client:
+        with pytest.raises(HTTPException):
+            await client.get_user("valid")
+        assert client.breaker.state == "open"
+
+        await asyncio.sleep(0.02)
+        server.status = 200
+        server.delay = 0.5
+        trial = asyncio.ensure_future(client.get_user("valid"))
+        await asyncio.sleep(0.05)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        server.delay = 0
+        assert await client.get_user("valid") is not None
+        assert client.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_non_trial(server):
+    """Should not release trial call held by another call if a call started before it is cancelled"""
+    server.delay = 0.5
+
+    async with AuthClient(server.url, failure_threshold=1, reset_timeout=0.01) as client:
+        call = asyncio.ensure_future(client.get_user("valid"))
+        await asyncio.sleep(0.05)
+
+        client.breaker.record_failure()
+        await asyncio.sleep(0.02)
+        assert client.breaker.allow() == "trial"
+
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+        assert client.breaker.allow() is None
+
+
+@pytest.mark.asyncio
+async def test_keep_alive(server):
+    """Should reuse connections between requests"""
+    async with AuthClient(server.url) as client:
+        for _ in range(5):
+            await client.get_user("valid")
+
+    assert server.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_not_open(server):
+    """Should raise exception if client is used outside of its lifespan"""
+    with pytest.raises(RuntimeError):
+        await AuthClient(server.url).get_user("valid")
+
+
+@pytest.mark.asyncio
+async def test_server_error(server):
+    """Should raise 503 if auth service fails, and stop calling it once the circuit opens"""
+    server.status = 500
+
+    async with AuthClient(server.url, failure_threshold=2) as client:
+        for _ in range(4):
+            with pytest.raises(HTTPException) as exc:
+                await client.get_user("valid")
+
+            assert exc.value.status_code == 503
+
+    assert len(server.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_timeout(server):
+    """Should raise 503 if auth service does not respond in time"""
+    server.delay = 0.5
+
+    async with AuthClient(server.url, timeout=0.05) as client:
+        with pytest.raises(HTTPException) as exc:
+            await client.get_user("valid")
+
+        assert exc.value.status_code == 503
+        assert client.breaker.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_call(server):
+    """Should count slow calls as failures, while still returning their result"""
+    server.delay = 0.05
+
+    async with AuthClient(server.url, slow_call_threshold=0.01, failure_threshold=1) as client:
+        assert await client.get_user("valid") is not None
+        assert client.breaker.state == "open"
+
+
+def test_circuit_breaker():
+    """Should open after consecutive failures, and allow a single trial call after the reset timeout"""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, timer=lambda: now[0])
+
+    breaker.record_failure()
+    assert breaker.allow() == "call"
+
+    breaker.record_failure()
+    assert breaker.allow() is None
+
+    now[0] = 11
+    assert breaker.allow() == "trial"
+    assert breaker.allow() is None
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] = 22
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_from_settings():
+    """Should create client from settings"""
+    client = AuthClient.from_settings(Auth(endpoint="https://localhost/auth", timeout=1, http2=False))
+
+    assert client.endpoint == "https://localhost/auth/"
+    assert client._client_options["timeout"].read == 1
@@ -0,0 +1,156 @@
+import asyncio
+import gc
+import time
+from dataclasses import replace
+
+import pytest
+from fastapi import HTTPException, Request
+
+from lims_utils.auth import AuthResolver, GenericUser
+
+user = GenericUser(fedid="abc12345", id="1", familyName="Doe", title="Dr", givenName="Jane", permissions=frozenset())
+
+
+class FakeValidator:
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self, token: str):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise ConnectionError("Auth service is down")
+
+        return user if token == "valid" else None
+
+
+@pytest.mark.asyncio
+async def test_resolve():
+    """Should return user for valid tokens and None for invalid tokens"""
+    resolver = AuthResolver(FakeValidator())
+
+    assert await resolver.resolve("valid") == user
+    assert await resolver.resolve("invalid") is None
+
+
+@pytest.mark.asyncio
+async def test_cache():
+    """Should only validate each token once, including invalid tokens"""
+    validator = FakeValidator()
+    resolver = AuthResolver(validator)
+
+    for _ in range(3):
+        await resolver.resolve("valid")
+        await resolver.resolve("invalid")
+
+    assert validator.calls == 2
+    assert "valid" not in str(list(resolver.cache._data))
+
+
+@pytest.mark.asyncio
+async def test_coalesce():
+    """Should share a single validation between concurrent requests with the same token"""
+    validator = FakeValidator()
+    resolver = AuthResolver(validator)
+
+    users = await asyncio.gather(*(resolver.resolve("valid") for _ in range(10)))
+
+    assert users == [user] * 10
+    assert validator.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_validator_error():
+    """Should raise validator errors to all waiting requests, without caching them"""
+    validator = FakeValidator(fail=True)
+    resolver = AuthResolver(validator)
+
+    results = await asyncio.gather(*(resolver.resolve("valid") for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+    validator.fail = False
+    assert await resolver.resolve("valid") == user
+    assert validator.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate():
+    """Should validate token again after it is invalidated"""
+    validator = FakeValidator()
+    resolver = AuthResolver(validator)
+
+    await resolver.resolve("valid")
+    resolver.invalidate("valid")
+    await resolver.resolve("valid")
+
+    assert validator.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_dependency():
+    """Should return user from request, or raise 401 for invalid tokens"""
+    resolver = AuthResolver(FakeValidator())
+
+    def request(token: str):
+        return Request(scope={"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+    assert await resolver(request("valid")) == user
+
+    with pytest.raises(HTTPException) as exc:
+        await resolver(request("invalid"))
+
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_invalidate_pending():
+    """Should not cache result of validation that was running when the token was invalidated"""
+    validator = FakeValidator()
+    resolver = AuthResolver(validator)
+
+    pending = asyncio.ensure_future(resolver.resolve("valid"))
+    await asyncio.sleep(0)
+    resolver.invalidate("valid")
+
+    assert await pending == user
+    assert await resolver.resolve("valid") == user
+    assert validator.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_token_expiry():
+    """Should not cache users past their token's expiry"""
+    validator = FakeValidator()
+    resolver = AuthResolver(validator)
+
+    async def validate(token: str):
+        await validator(token)
+        return replace(user, expires_at=time.time() - 1)
+
+    resolver.validate = validate
+
+    for _ in range(3):
+        assert await resolver.resolve("valid") == user
+
+    assert validator.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelled_validator_error():
+    """Should not log unretrieved exceptions if all requests are cancelled before the validator fails"""
+    loop = asyncio.get_running_loop()
+    contexts = []
+    loop.set_exception_handler(lambda _, context: contexts.append(context))
+
+    resolver = AuthResolver(FakeValidator(fail=True))
+    request = asyncio.ensure_future(resolver.resolve("valid"))
+    await asyncio.sleep(0)
+    request.cancel()
+
+    await asyncio.sleep(0.05)
+    del request
+    gc.collect()
+    loop.set_exception_handler(None)
+
+    assert contexts == []
@@ -0,0 +1,148 @@
+import json
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from lims_utils.auth import GenericUser
+from lims_utils.tokens import JWTVerifier
+
+
+def new_key(key_id: str):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    return private_key, {**jwk, "kid": key_id, "alg": "RS256", "use": "sig"}
+
+
+old_private_key, old_jwk = new_key("old")
+new_private_key, new_jwk = new_key("new")
+
+claims = {"sub": "abc12345", "given_name": "Jane", "family_name": "Doe", "permissions": ["em_admin"]}
+
+
+def sign(private_key=old_private_key, key_id="old", expires_in=60, **extra):
+    return jwt.encode(
+        {**claims, "exp": int(time.time()) + expires_in, **extra},
+        private_key,
+        algorithm="RS256",
+        headers={"kid": key_id},
+    )
+
+
+class FakeJWKS:
+    def __init__(self):
+        self.keys = [old_jwk]
+        self.calls = 0
+
+    def __call__(self, request: httpx.Request):
+        self.calls += 1
+        return httpx.Response(200, json={"keys": self.keys})
+
+
+@pytest.fixture
+def jwks():
+    return FakeJWKS()
+
+
+def verifier(jwks: FakeJWKS, **kwargs):
+    return JWTVerifier(
+        "https://localhost/jwks", client=httpx.AsyncClient(transport=httpx.MockTransport(jwks)), **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_verify(jwks):
+    """Should build user from claims of valid token, without calling the JWKS endpoint again"""
+    async with verifier(jwks) as jwt_verifier:
+        for _ in range(3):
+            user = await jwt_verifier.verify(sign())
+
+    assert user == GenericUser(
+        fedid="abc12345", id="abc12345", familyName="Doe", title="", givenName="Jane", permissions=["em_admin"]
+    )
+    assert jwks.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_expires_at(jwks):
+    """Should set user expiry to the token's expiry"""
+    token = sign()
+    async with verifier(jwks) as jwt_verifier:
+        user = await jwt_verifier.verify(token)
+
+    assert user is not None
+    assert user.expires_at == jwt.decode(token, options={"verify_signature": False})["exp"]
+
+
+@pytest.mark.asyncio
+async def test_expired(jwks):
+    """Should reject expired tokens"""
+    async with verifier(jwks) as jwt_verifier:
+        assert await jwt_verifier.verify(sign(expires_in=-10)) is None
+
+
+@pytest.mark.asyncio
+async def test_bad_signature(jwks):
+    """Should reject tokens not signed with the published key"""
+    async with verifier(jwks) as jwt_verifier:
+        assert await jwt_verifier.verify(sign(private_key=new_private_key)) is None
+
+
+@pytest.mark.asyncio
+async def test_audience(jwks):
+    """Should reject tokens for other audiences"""
+    async with verifier(jwks, audience="lims") as jwt_verifier:
+        assert await jwt_verifier.verify(sign(aud="lims")) is not None
+        assert await jwt_verifier.verify(sign(aud="other")) is None
+
+
+@pytest.mark.asyncio
+async def test_rotation(jwks):
+    """Should fetch keys again when a token is signed with an unknown key"""
+    async with verifier(jwks, min_refresh_interval=0) as jwt_verifier:
+        jwks.keys = [old_jwk, new_jwk]
+
+        assert await jwt_verifier.verify(sign(new_private_key, "new")) is not None
+        assert jwks.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_rotation_rate_limit(jwks):
+    """Should not fetch keys for every token signed with an unknown key"""
+    async with verifier(jwks) as jwt_verifier:
+        for _ in range(3):
+            assert await jwt_verifier.verify(sign(new_private_key, "new")) is None
+
+    assert jwks.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_failure(jwks):
+    """Should keep previous keys if they can't be fetched"""
+    async with verifier(jwks) as jwt_verifier:
+        jwks.keys = []
+        await jwt_verifier.refresh()
+
+        assert await jwt_verifier.verify(sign()) is not None
+
+
+@pytest.mark.asyncio
+async def test_opaque_token(jwks):
+    """Should pass opaque tokens to fallback validator"""
+
+    async def fallback(token: str):
+        return GenericUser(fedid=token, id="1", familyName="", title="", givenName="", permissions=frozenset())
+
+    async with verifier(jwks, fallback=fallback) as jwt_verifier:
+        user = await jwt_verifier.verify("opaque")
+
+    assert user is not None and user.fedid == "opaque"
+
+
+@pytest.mark.asyncio
+async def test_opaque_token_no_fallback(jwks):
+    """Should reject opaque tokens if there is no fallback"""
+    async with verifier(jwks) as jwt_verifier:
+        assert await jwt_verifier.verify("opaque") is None
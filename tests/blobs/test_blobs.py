@@ -0,0 +1,152 @@
+import time
+
+import anyio
+import pytest
+from fastapi import HTTPException, Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lims_utils.blobs import blob_response, iter_blob, parse_range, stream_blob
+from lims_utils.tables import XRFFluorescenceMapping  # type: ignore
+
+DATA = bytes(range(256)) * 40
+
+default_scope = {
+    "type": "http",
+    "path": "http://test.ac.uk",
+    "headers": [],
+}
+
+where = XRFFluorescenceMapping.xrfFluorescenceMappingId == 1
+
+
+@pytest.fixture
+def session_maker():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(
+            text("CREATE TABLE XRFFluorescenceMapping (xrfFluorescenceMappingId INTEGER PRIMARY KEY, data BLOB)")
+        )
+        conn.execute(text("INSERT INTO XRFFluorescenceMapping VALUES (1, :data)"), {"data": DATA})
+
+    yield sessionmaker(engine)
+
+    engine.dispose()
+
+
+async def read_response(response):
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+def test_iter_blob(session_maker: sessionmaker[Session]):
+    """Should read blob in chunks no larger than chunk size"""
+    with session_maker() as session:
+        chunks = list(iter_blob(session, XRFFluorescenceMapping.data, where, chunk_size=1000))
+
+    assert b"".join(chunks) == DATA
+    assert max(len(chunk) for chunk in chunks) == 1000
+
+
+def test_iter_blob_range(session_maker: sessionmaker[Session]):
+    """Should only read bytes within requested range"""
+    with session_maker() as session:
+        chunks = list(iter_blob(session, XRFFluorescenceMapping.data, where, start=100, end=2599, chunk_size=1000))
+
+    assert b"".join(chunks) == DATA[100:2600]
+
+
+@pytest.mark.asyncio
+async def test_stream_blob(session_maker: sessionmaker[Session]):
+    """Should stream blob asynchronously"""
+    chunks = [chunk async for chunk in stream_blob(session_maker, XRFFluorescenceMapping.data, where, chunk_size=999)]
+
+    assert b"".join(chunks) == DATA
+
+
+@pytest.mark.asyncio
+async def test_stream_blob_cancelled(session_maker: sessionmaker[Session]):
+    """Should close session if the stream is cancelled while a chunk is being read, as done by Starlette when
+    the client disconnects"""
+    closed = []
+
+    class TrackedSession(Session):
+        def close(self):
+            super().close()
+            closed.append(self)
+
+    engine = session_maker.kw["bind"]
+    event.listen(engine, "before_cursor_execute", lambda *args: time.sleep(0.2))
+
+    with anyio.move_on_after(0.05) as scope:
+        stream = stream_blob(
+            sessionmaker(engine, class_=TrackedSession), XRFFluorescenceMapping.data, where, chunk_size=1000
+        )
+        async for _ in stream:
+            pass
+
+    assert scope.cancelled_caught
+    assert len(closed) == 1
+
+
+@pytest.mark.asyncio
+async def test_blob_response(session_maker: sessionmaker[Session]):
+    """Should return full blob if no range is requested"""
+    response = await blob_response(Request(scope=default_scope), session_maker, XRFFluorescenceMapping.data, where)
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(DATA))
+    assert await read_response(response) == DATA
+
+
+@pytest.mark.asyncio
+async def test_blob_response_range(session_maker: sessionmaker[Session]):
+    """Should return partial content if range is requested"""
+    request = Request(scope={**default_scope, "headers": [(b"range", b"bytes=10-19")]})
+    response = await blob_response(request, session_maker, XRFFluorescenceMapping.data, where)
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(DATA)}"
+    assert await read_response(response) == DATA[10:20]
+
+
+@pytest.mark.asyncio
+async def test_blob_response_not_found(session_maker: sessionmaker[Session]):
+    """Should raise 404 if row does not exist"""
+    with pytest.raises(HTTPException):
+        await blob_response(
+            Request(scope=default_scope),
+            session_maker,
+            XRFFluorescenceMapping.data,
+            XRFFluorescenceMapping.xrfFluorescenceMappingId == 2,
+        )
+
+
+@pytest.mark.parametrize(
+    ["header", "expected"],
+    [
+        ("bytes=0-9", (0, 9)),
+        ("bytes=90-", (90, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=50-500", (50, 99)),
+    ],
+)
+def test_parse_range(header, expected):
+    """Should parse single byte ranges"""
+    byte_range = parse_range(header, 100)
+
+    assert byte_range is not None
+    assert (byte_range.start, byte_range.end) == expected
+
+
+def test_parse_range_multiple():
+    """Should ignore unsupported range types"""
+    assert parse_range("bytes=0-9,20-29", 100) is None
+
+
+def test_parse_range_unsatisfiable():
+    """Should raise 416 if range starts after end of blob"""
+    with pytest.raises(HTTPException) as exc:
+        parse_range("bytes=100-", 100)
+
+    assert exc.value.status_code == 416
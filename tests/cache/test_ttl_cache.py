@@ -0,0 +1,79 @@
+from lims_utils.cache import MISSING, TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get():
+    """Should return cached value"""
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is MISSING
+
+
+def test_expiry():
+    """Should not return expired values"""
+    timer = FakeTimer()
+    cache = TTLCache(ttl=10, timer=timer)
+    cache.set("a", 1)
+
+    timer.now = 10
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+def test_negative_expiry():
+    """Should expire negative results after negative TTL"""
+    timer = FakeTimer()
+    cache = TTLCache(ttl=10, negative_ttl=1, timer=timer)
+    cache.set("a", None)
+
+    assert cache.get("a") is None
+
+    timer.now = 1
+    assert cache.get("a") is MISSING
+
+
+def test_entry_ttl():
+    """Should expire entries stored with their own TTL after that TTL"""
+    timer = FakeTimer()
+    cache = TTLCache(ttl=10, timer=timer)
+    cache.set("a", 1, ttl=1)
+    cache.set("b", 2)
+
+    timer.now = 1
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+
+
+def test_lru_eviction():
+    """Should evict least recently used entry when full"""
+    cache = TTLCache(ttl=10, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+
+
+def test_invalidate():
+    """Should remove single entry, or all entries"""
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.invalidate("a")
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+
+    cache.invalidate()
+    assert len(cache) == 0
@@ -1,7 +1,9 @@
 from unittest.mock import patch
 
+import pytest
 from sqlalchemy import select
-from tests.mocks import FakeSession, query_eq
+from sqlalchemy.orm import Session
+from tests.mocks import FakeSession, create_sqlite_engine, query_eq
 
 from lims_utils.database import Database, get_session
 from lims_utils.tables import Proposal  # type: ignore
@@ -25,6 +27,18 @@ def test_paginate(mock_session):
     assert query_eq(mock_session.call_args.args[0], query.limit(20).offset(20))
 
 
+@patch.object(fs, "execute")
+def test_paginate_no_validation(mock_session):
+    """Should not validate items returned by the database, which would copy them"""
+
+    data = ["a", "b", "c"]
+    mock_session.return_value.all.return_value = data
+    with get_session(lambda: fs):
+        page = db.paginate(query, 20, 1)
+
+    assert page.items is data
+
+
 @patch.object(fs, "scalars")
 def test_paginate_scalar(mock_session):
     """Should append limits/offset to original query (in scalar form)"""
@@ -68,3 +82,36 @@ def test_fast_count(mock_fast_count):
         response = db.paginate(query, 20, -1, slow_count=False)
         assert response.items == ["a", "b", "c"]
         assert response.total == 150
+
+
+@pytest.fixture
+def sqlite_session():
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all(
+            [Proposal(proposalId=i, proposalCode="cm", proposalNumber=str(i), personId=1) for i in range(1, 6)]
+        )
+        session.commit()
+
+        yield session
+
+    engine.dispose()
+
+
+@pytest.mark.parametrize(
+    ["row_format", "expected"],
+    [
+        ("tuple", [(1, "1"), (2, "2")]),
+        ("dict", [{"proposalId": 1, "proposalNumber": "1"}, {"proposalId": 2, "proposalNumber": "2"}]),
+    ],
+)
+def test_row_format(sqlite_session, row_format, expected):
+    """Should convert rows to plain tuples or dictionaries"""
+    query = select(Proposal.proposalId, Proposal.proposalNumber).order_by(Proposal.proposalId)
+
+    with get_session(lambda: sqlite_session):
+        response = db.paginate(query, 2, 0, row_format=row_format)
+
+    assert response.items == expected
+    assert type(response.items[0]) is type(expected[0])
+    assert response.total == 5
@@ -0,0 +1,136 @@
+import io
+from datetime import datetime, time, timedelta
+from unittest.mock import patch
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import BINARY, DateTime, Double, Enum, Float, Integer, String, Text, Time, select
+from sqlalchemy.dialects.mysql import LONGBLOB
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.__main__ import main
+from lims_utils.export import arrow_type, iter_record_batches, write_arrow, write_parquet
+from lims_utils.tables import Proposal, Shipping  # type: ignore
+
+
+@pytest.fixture
+def session():
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all(
+            [
+                Proposal(
+                    proposalId=i,
+                    proposalCode="cm",
+                    proposalNumber=str(i),
+                    personId=1,
+                    bltimeStamp=datetime(2024, 1, i),
+                    state="Open" if i % 2 else "Closed",
+                )
+                for i in range(1, 11)
+            ]
+        )
+        session.commit()
+
+        yield session
+
+    engine.dispose()
+
+
+@pytest.mark.parametrize(
+    ["column_type", "expected"],
+    [
+        (Integer(), pa.int64()),
+        (Float(), pa.float32()),
+        (Double(), pa.float64()),
+        (DateTime(), pa.timestamp("us")),
+        (Enum("a", "b"), pa.dictionary(pa.int32(), pa.string())),
+        (BINARY(16), pa.binary(16)),
+        (String(45), pa.string()),
+        (Text(), pa.large_string()),
+        (Time(), pa.duration("us")),
+        (LONGBLOB(), pa.large_binary()),
+    ],
+)
+def test_arrow_type(column_type, expected):
+    """Should map SQLAlchemy types to Arrow types"""
+    assert arrow_type(column_type)[0] == expected
+
+
+def test_iter_record_batches(session):
+    """Should yield batches no larger than the batch size"""
+    batches = list(iter_record_batches(session, select(Proposal.proposalId, Proposal.state), batch_size=4))
+
+    assert [batch.num_rows for batch in batches] == [4, 4, 2]
+    assert batches[0].schema.field("proposalId").type == pa.int64()
+    assert batches[0].column("state").to_pylist() == ["Open", "Closed", "Open", "Closed"]
+
+
+def test_iter_record_batches_entity(session):
+    """Should expand ORM entities into their columns"""
+    batch = next(iter_record_batches(session, select(Proposal)))
+
+    assert batch.schema.field("bltimeStamp").type == pa.timestamp("us")
+    assert batch.column("proposalNumber").to_pylist()[0] == "1"
+
+
+def test_write_parquet(session):
+    """Should write all rows to Parquet file"""
+    buffer = io.BytesIO()
+    rows = write_parquet(session, select(Proposal).order_by(Proposal.proposalId), buffer, batch_size=3)
+
+    buffer.seek(0)
+    table = pq.read_table(buffer)
+
+    assert rows == 10
+    assert table.num_rows == 10
+    assert table.column("proposalId").to_pylist() == list(range(1, 11))
+
+
+def test_write_arrow(session):
+    """Should write all rows to Arrow IPC stream"""
+    buffer = io.BytesIO()
+    rows = write_arrow(session, select(Proposal.proposalId, Proposal.state), buffer, batch_size=3)
+
+    table = pa.ipc.open_stream(buffer.getvalue()).read_all()
+
+    assert rows == 10
+    assert table.column("state").to_pylist()[:2] == ["Open", "Closed"]
+
+
+def test_write_empty(session):
+    """Should write file with schema only if there are no results"""
+    buffer = io.BytesIO()
+
+    assert write_parquet(session, select(Proposal).filter(Proposal.proposalId == 0), buffer) == 0
+
+    table = pq.read_table(io.BytesIO(buffer.getvalue()))
+    assert table.num_rows == 0
+    assert table.schema.field("proposalId").type == pa.int64()
+
+
+def test_null_first_batch(session):
+    """Should use column types rather than data, so batches with only nulls share the schema"""
+    session.add_all([Shipping(shippingId=i, proposalId=1) for i in range(1, 6)])
+    session.add(Shipping(shippingId=6, proposalId=1, closeTime=time(17, 30)))
+    session.commit()
+    buffer = io.BytesIO()
+
+    query = select(Shipping.shippingId, Shipping.closeTime).order_by(Shipping.shippingId)
+    assert write_arrow(session, query, buffer, batch_size=5) == 6
+
+    table = pa.ipc.open_stream(buffer.getvalue()).read_all()
+    assert table.schema.field("closeTime").type == pa.duration("us")
+    assert table.column("closeTime").to_pylist()[-1] == timedelta(hours=17, minutes=30)
+
+
+def test_cli_export(session, tmp_path):
+    """Should export table through command line interface"""
+    output = tmp_path / "proposals.parquet"
+
+    with patch("sqlalchemy.create_engine", return_value=session.get_bind()):
+        main(["export", "Proposal", str(output), "--url", "sqlite://", "--where", "proposalId > 5"])
+
+    assert pq.read_table(output).num_rows == 5
@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.hierarchy import PROCESSING_HIERARCHY, Level, load_hierarchy
+from lims_utils.tables import (  # type: ignore
+    AutoProc,
+    AutoProcIntegration,
+    AutoProcProgram,
+    AutoProcScaling,
+    AutoProcScalingStatistics,
+    BLSession,
+    DataCollection,
+    DataCollectionGroup,
+    Proposal,
+)
+
+
+@pytest.fixture
+def session():
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all(
+            [
+                Proposal(proposalId=1, proposalCode="cm", proposalNumber="1", personId=1),
+                Proposal(proposalId=2, proposalCode="cm", proposalNumber="2", personId=1),
+                BLSession(sessionId=10, proposalId=1, visit_number=1),
+                BLSession(sessionId=11, proposalId=1, visit_number=2),
+                BLSession(sessionId=20, proposalId=2, visit_number=1),
+                DataCollectionGroup(dataCollectionGroupId=100, sessionId=10),
+                DataCollection(dataCollectionId=1000, dataCollectionGroupId=100),
+                DataCollection(dataCollectionId=1001, dataCollectionGroupId=100),
+                AutoProcProgram(autoProcProgramId=5),
+                AutoProcIntegration(autoProcIntegrationId=50, dataCollectionId=1000, autoProcProgramId=5),
+                AutoProc(autoProcId=7, autoProcProgramId=5),
+                AutoProcScaling(autoProcScalingId=8, autoProcId=7),
+                AutoProcScalingStatistics(
+                    autoProcScalingStatisticsId=9, autoProcScalingId=8, scalingStatisticsType="overall"
+                ),
+            ]
+        )
+        session.commit()
+
+        yield session
+
+    engine.dispose()
+
+
+def count_queries(session: Session):
+    statements: list[str] = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_load_hierarchy(session: Session):
+    """Should load full tree, with one query per level"""
+    statements = count_queries(session)
+    tree = load_hierarchy(session, [1, 2])
+
+    assert len(statements) == len(PROCESSING_HIERARCHY)
+    assert [proposal["proposalId"] for proposal in tree] == [1, 2]
+    assert [bl_session["sessionId"] for bl_session in tree[0]["BLSession"]] == [10, 11]
+
+    data_collections = tree[0]["BLSession"][0]["DataCollectionGroup"][0]["DataCollection"]
+    assert [dc["dataCollectionId"] for dc in data_collections] == [1000, 1001]
+    assert data_collections[1]["AutoProcProgram"] == []
+
+    statistics = data_collections[0]["AutoProcProgram"][0]["AutoProcScalingStatistics"]
+    assert [(item["autoProcScalingStatisticsId"], item["scalingStatisticsType"]) for item in statistics] == [
+        (9, "overall")
+    ]
+
+
+def test_depth(session: Session):
+    """Should not load levels deeper than requested"""
+    statements = count_queries(session)
+    tree = load_hierarchy(session, [1], depth=2)
+
+    assert len(statements) == 2
+    assert "DataCollectionGroup" not in tree[0]["BLSession"][0]
+
+
+def test_columns(session: Session):
+    """Should only load requested columns (and primary key)"""
+    tree = load_hierarchy(
+        session,
+        [10],
+        levels=[Level(BLSession, columns=[BLSession.visit_number]), Level(DataCollectionGroup, name="groups")],
+    )
+
+    assert tree[0]["visit_number"] == 1
+    assert set(tree[0]) == {"sessionId", "visit_number", "groups"}
+
+
+def test_stop_early(session: Session):
+    """Should not run queries for lower levels if there are no items"""
+    statements = count_queries(session)
+    tree = load_hierarchy(session, [20], levels=PROCESSING_HIERARCHY[1:])
+
+    assert len(statements) == 2
+    assert tree[0]["DataCollectionGroup"] == []
+
+
+def test_batches(session: Session):
+    """Should split parent IDs into batches"""
+    statements = count_queries(session)
+    load_hierarchy(session, [1, 2], depth=2, batch_size=1)
+
+    assert len(statements) == 4
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, select
+from tests.mocks import query_eq
+
+from lims_utils.joins import apply_join_path, join_path, join_select
+from lims_utils.tables import (  # type: ignore
+    AutoProcIntegration,
+    AutoProcProgram,
+    BLSample,
+    BLSession,
+    DataCollection,
+    DataCollectionGroup,
+    Permission,
+    Person,
+    Proposal,
+)
+
+
+def test_join_path():
+    """Should follow main hierarchy from proposal down to data collection"""
+    path = join_path(Proposal, DataCollection)
+
+    assert [step.target for step in path] == [
+        BLSession.__table__,
+        DataCollectionGroup.__table__,
+        DataCollection.__table__,
+    ]
+    assert all(step.indexed for step in path)
+
+
+def test_join_path_reverse():
+    """Should find path going up the hierarchy"""
+    path = join_path(DataCollection, Proposal)
+
+    assert [step.target for step in path] == [
+        DataCollectionGroup.__table__,
+        BLSession.__table__,
+        Proposal.__table__,
+    ]
+
+
+def test_join_path_association_table():
+    """Should go through association tables"""
+    path = join_path(Person, Permission)
+
+    assert [step.target.name for step in path] == [
+        "UserGroup_has_Person",
+        "UserGroup",
+        "UserGroup_has_Permission",
+        "Permission",
+    ]
+
+
+def test_join_path_processing():
+    """Should follow main hierarchy down to processing programs, rather than through screenings"""
+    path = join_path(Proposal, AutoProcProgram)
+
+    assert [step.target for step in path] == [
+        BLSession.__table__,
+        DataCollectionGroup.__table__,
+        DataCollection.__table__,
+        AutoProcIntegration.__table__,
+        AutoProcProgram.__table__,
+    ]
+
+
+def test_join_path_samples():
+    """Should follow sample hierarchy, rather than going through ligands"""
+    path = join_path(Proposal, BLSample)
+
+    assert [step.target.name for step in path] == ["Protein", "Crystal", "BLSample"]
+
+
+def test_join_path_via():
+    """Should go through intermediate models"""
+    path = join_path(Proposal, AutoProcProgram, via=[AutoProcIntegration])
+
+    assert [step.target for step in path][-2:] == [AutoProcIntegration.__table__, AutoProcProgram.__table__]
+
+
+def test_join_path_same_model():
+    """Should return empty path if start and end are the same"""
+    assert join_path(Proposal, Proposal) == ()
+
+
+def test_join_select():
+    """Should build query with joins applied"""
+    assert query_eq(
+        join_select(Proposal, DataCollection, DataCollection.dataCollectionId).filter(Proposal.proposalId == 1),
+        select(DataCollection.dataCollectionId)
+        .select_from(Proposal)
+        .join(BLSession, BLSession.proposalId == Proposal.proposalId)
+        .join(DataCollectionGroup, DataCollectionGroup.sessionId == BLSession.sessionId)
+        .join(DataCollection, DataCollection.dataCollectionGroupId == DataCollectionGroup.dataCollectionGroupId)
+        .filter(Proposal.proposalId == 1),
+    )
+
+
+def test_apply_join_path():
+    """Should append joins to existing query"""
+    query = apply_join_path(select(BLSession).filter(BLSession.sessionId == 1), BLSession, Proposal)
+
+    assert query_eq(
+        query,
+        select(BLSession).join(Proposal, BLSession.proposalId == Proposal.proposalId).filter(BLSession.sessionId == 1),
+    )
+
+
+def test_no_path():
+    """Should raise exception if tables are not connected"""
+    with pytest.raises(ValueError):
+        join_path(Proposal, Table("Unrelated", MetaData(), Column("id", Integer)))
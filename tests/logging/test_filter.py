@@ -1,6 +1,8 @@
+import logging
+
 import pytest
 
-from lims_utils.logging import register_loggers, uvicorn_logger
+from lims_utils.logging import EndpointFilter, register_loggers, uvicorn_logger
 
 
 @pytest.mark.asyncio
@@ -37,3 +39,24 @@ async def test_docs_no_args(caplog):
     uvicorn_logger.error("Message")
 
     assert "Message" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/docs?page=1", "/metrics/", "/metrics/requests?format=text", "/healthz"],
+)
+def test_filter_patterns(path):
+    """Should ignore paths matching exactly or by prefix, disregarding query strings"""
+    endpoint_filter = EndpointFilter(["/docs", "/healthz", "/metrics/*"])
+    record = logging.LogRecord("uvicorn.access", logging.INFO, "", 0, "%s %s %s", ("Arg 1", "GET", path), None)
+
+    assert not endpoint_filter.filter(record)
+
+
+@pytest.mark.parametrize("path", ["/docs/other", "/metrics", "/proposals?q=/docs", "/dots?page=1"])
+def test_filter_patterns_no_match(path):
+    """Should not ignore paths that only partially match"""
+    endpoint_filter = EndpointFilter(["/docs", "/healthz", "/metrics/*"])
+    record = logging.LogRecord("uvicorn.access", logging.INFO, "", 0, "%s %s %s", ("Arg 1", "GET", path), None)
+
+    assert endpoint_filter.filter(record)
@@ -0,0 +1,157 @@
+import io
+import json
+import logging
+
+import pytest
+
+from lims_utils.logging import (
+    JSONFormatter,
+    RequestContextMiddleware,
+    app_logger,
+    get_request_context,
+    register_loggers,
+    set_request_user,
+    uvicorn_logger,
+)
+
+
+def new_record(msg="Message %s", args=("arg",), exc_info=None):
+    record = logging.LogRecord("uvicorn", logging.WARNING, "module.py", 10, msg, args, exc_info)
+    record.created = 1700000000.5
+    return record
+
+
+class FakeRoute:
+    path = "/proposals/{proposalReference}"
+
+
+def test_format():
+    """Should format record as JSON object"""
+    assert json.loads(JSONFormatter().format(new_record())) == {
+        "time": "2023-11-14T22:13:20.500Z",
+        "level": "WARNING",
+        "logger": "uvicorn",
+        "message": "Message arg",
+    }
+
+
+def test_format_time():
+    """Should update formatted timestamp when the second changes"""
+    formatter = JSONFormatter(fields=["time"])
+    record = new_record()
+
+    assert json.loads(formatter.format(record))["time"] == "2023-11-14T22:13:20.500Z"
+    record.created += 1.25
+    assert json.loads(formatter.format(record))["time"] == "2023-11-14T22:13:21.750Z"
+
+
+def test_register_loggers_json():
+    """Should format records with handlers already set up on Uvicorn loggers as JSON"""
+    app_stream, access_stream = io.StringIO(), io.StringIO()
+    original_handlers = app_logger.handlers, uvicorn_logger.handlers
+    app_logger.handlers = [logging.StreamHandler(app_stream)]
+    uvicorn_logger.handlers = [logging.StreamHandler(access_stream)]
+
+    try:
+        register_loggers(json_format=True)
+        uvicorn_logger.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:1234", "GET", "/proposals", "1.1", 200)
+        app_logger.warning("Warning")
+    finally:
+        app_logger.handlers, uvicorn_logger.handlers = original_handlers
+
+    assert json.loads(access_stream.getvalue().splitlines()[0])["message"] == (
+        '127.0.0.1:1234 - "GET /proposals HTTP/1.1" 200'
+    )
+    assert json.loads(app_stream.getvalue().splitlines()[-1])["message"] == "Warning"
+
+
+@pytest.mark.asyncio
+async def test_register_loggers_json_queue():
+    """Should include request context in records formatted in the queue's background thread"""
+    stream = io.StringIO()
+    original_handlers = app_logger.handlers
+    app_logger.handlers = [logging.StreamHandler(stream)]
+
+    async def app(scope, receive, send):
+        set_request_user("abc12345")
+        scope["route"] = FakeRoute()
+        app_logger.warning("Warning")
+
+    try:
+        queue_logging = register_loggers(queue_size=100, json_format=True)
+        assert queue_logging is not None
+        scope = {"type": "http", "headers": [(b"x-request-id", b"request-1")]}
+        await RequestContextMiddleware(app)(scope, None, None)
+        queue_logging.stop()
+    finally:
+        app_logger.handlers = original_handlers
+
+    line = json.loads(stream.getvalue().splitlines()[-1])
+    assert line["message"] == "Warning"
+    assert line["request_id"] == "request-1"
+    assert line["user"] == "abc12345"
+    assert line["route"] == "/proposals/{proposalReference}"
+
+
+def test_format_fields():
+    """Should only include fields provided, and static fields"""
+    formatter = JSONFormatter(fields=["message", "line"], static={"service": "lims"})
+
+    assert json.loads(formatter.format(new_record())) == {"message": "Message arg", "line": 10, "service": "lims"}
+
+
+def test_unknown_field():
+    """Should raise exception for unknown fields"""
+    with pytest.raises(ValueError):
+        JSONFormatter(fields=["message", "unknown"])
+
+
+def test_exception():
+    """Should include formatted exception"""
+    try:
+        raise ValueError("Failure")
+    except ValueError as exc:
+        record = new_record(exc_info=(ValueError, exc, exc.__traceback__))
+
+    assert "ValueError: Failure" in json.loads(JSONFormatter().format(record))["exception"]
+
+
+@pytest.mark.asyncio
+async def test_request_context():
+    """Should include request ID, user and route from request context"""
+    formatter = JSONFormatter()
+    lines = []
+
+    async def app(scope, receive, send):
+        set_request_user("abc12345")
+        scope["route"] = FakeRoute()
+        lines.append(json.loads(formatter.format(new_record())))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "headers": [(b"x-request-id", b"request-1")]}
+    await RequestContextMiddleware(app)(scope, None, send)
+
+    assert lines[0]["request_id"] == "request-1"
+    assert lines[0]["user"] == "abc12345"
+    assert lines[0]["route"] == "/proposals/{proposalReference}"
+    assert (b"x-request-id", b"request-1") in messages[0]["headers"]
+    assert get_request_context() is None
+
+
+@pytest.mark.asyncio
+async def test_request_id_generated():
+    """Should generate request ID if none is provided"""
+    request_ids = []
+
+    async def app(scope, receive, send):
+        request_ids.append(get_request_context().request_id)  # type: ignore
+
+    for _ in range(2):
+        await RequestContextMiddleware(app)({"type": "http", "headers": []}, None, None)
+
+    assert len(set(request_ids)) == 2
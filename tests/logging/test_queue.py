@@ -0,0 +1,162 @@
+import logging
+import threading
+from logging.handlers import QueueHandler
+
+import pytest
+
+from lims_utils.logging import (
+    DuplicateSuppressor,
+    EndpointFilter,
+    QueueLogging,
+    app_logger,
+    register_loggers,
+    uvicorn_logger,
+)
+
+
+class SlowHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.threads: list[str] = []
+        self.messages: list[str] = []
+        self.unblock = threading.Event()
+
+    def emit(self, record: logging.LogRecord):
+        self.unblock.wait(5)
+        self.threads.append(threading.current_thread().name)
+        self.messages.append(self.format(record))
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger("lims_utils.tests.queue")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = SlowHandler()
+    logger.addHandler(handler)
+
+    yield logger, handler
+
+    logger.removeHandler(handler)
+
+
+def test_background_thread(logger):
+    """Should handle records in a background thread, restoring the original handlers when stopped"""
+    test_logger, handler = logger
+    queue_logging = QueueLogging([test_logger])
+    queue_logging.start()
+
+    test_logger.info("Message %s", "arg")
+    handler.unblock.set()
+    queue_logging.stop()
+
+    assert handler.messages == ["Message arg"]
+    assert handler.threads[0] != threading.current_thread().name
+    assert test_logger.handlers[0] is handler
+    assert not any(isinstance(h, QueueHandler) for h in test_logger.handlers)
+
+
+@pytest.fixture
+def app_handler():
+    handler = SlowHandler()
+    handler.unblock.set()
+    original_handlers = app_logger.handlers
+    app_logger.handlers = [handler]
+
+    yield handler
+
+    app_logger.handlers = original_handlers
+
+
+def test_drop_when_full(logger, app_handler):
+    """Should drop records when queue is full, and report how many were dropped through the application
+    logger's handlers"""
+    test_logger, handler = logger
+    queue_logging = QueueLogging([test_logger, app_logger], maxsize=2)
+    queue_logging.start()
+
+    for i in range(10):
+        test_logger.info("Message %d", i)
+
+    assert queue_logging.dropped >= 7
+
+    handler.unblock.set()
+    queue_logging.queue.join()
+    test_logger.info("After")
+    queue_logging.stop()
+
+    assert handler.messages[-1] == "After"
+    assert not any(message.startswith("Log queue full") for message in handler.messages)
+    assert app_handler.messages[-1].startswith("Log queue full, dropped")
+
+
+def test_block_when_full(logger):
+    """Should not drop records if blocking is enabled"""
+    test_logger, handler = logger
+    queue_logging = QueueLogging([test_logger], maxsize=2, block=True)
+    queue_logging.start()
+
+    threading.Timer(0.1, handler.unblock.set).start()
+    for i in range(10):
+        test_logger.info("Message %d", i)
+
+    queue_logging.stop()
+
+    assert handler.messages == [f"Message {i}" for i in range(10)]
+
+
+def test_start_twice(logger):
+    """Should only start once, and leave out loggers already behind another queue"""
+    test_logger, handler = logger
+    handler.unblock.set()
+    queue_logging = QueueLogging([test_logger])
+    queue_logging.start()
+    queue_logging.start()
+    QueueLogging([test_logger]).start()
+
+    test_logger.info("Message")
+    queue_logging.stop()
+
+    assert handler.messages == ["Message"]
+    assert not any(isinstance(h, QueueHandler) for h in test_logger.handlers)
+
+
+def test_exception(logger):
+    """Should include traceback of exceptions logged"""
+    test_logger, handler = logger
+    handler.unblock.set()
+    queue_logging = QueueLogging([test_logger])
+    queue_logging.start()
+
+    try:
+        raise ValueError("Failure")
+    except ValueError:
+        test_logger.exception("Exception")
+
+    queue_logging.stop()
+
+    assert "ValueError: Failure" in handler.messages[0]
+
+
+def test_register_loggers_queue(caplog):
+    """Should install queue logging if queue size is set"""
+    queue_logging = register_loggers(queue_size=100)
+    assert queue_logging is not None
+
+    logging.getLogger("uvicorn").warning("Queued message")
+    queue_logging.stop()
+
+    assert "Queued message" in caplog.text
+
+
+def test_register_loggers_twice():
+    """Should replace filters and queue from previous call"""
+    first = register_loggers(queue_size=100, duplicate_rate=1)
+    second = register_loggers(queue_size=100)
+    assert first is not None and second is not None
+
+    assert first._listener._thread is None
+    assert len([f for f in uvicorn_logger.filters if isinstance(f, EndpointFilter)]) == 1
+    assert not any(isinstance(f, DuplicateSuppressor) for f in app_logger.filters)
+
+    second.stop()
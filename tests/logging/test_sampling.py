@@ -0,0 +1,134 @@
+import logging
+import time
+
+from lims_utils.logging import AccessLogSampler, DuplicateSuppressor, SamplingRule
+
+
+def access_record(path: str, status: int):
+    return logging.LogRecord(
+        "uvicorn.access",
+        logging.INFO,
+        "",
+        0,
+        '%s - "%s %s HTTP/%s" %d',
+        ("127.0.0.1:1234", "GET", path, "1.1", status),
+        None,
+    )
+
+
+def warning_record(url: str):
+    return logging.LogRecord("uvicorn", logging.WARNING, "", 0, "%s @ %s: %s", ("user", url, "Not found"), None)
+
+
+def test_sampling():
+    """Should log a fraction of successful requests"""
+    sampler = AccessLogSampler([SamplingRule(rate=0.25)])
+
+    assert sum(sampler.filter(access_record("/proposals", 200)) for _ in range(100)) == 25
+
+
+def test_sampling_fractional():
+    """Should log the exact fraction of requests for rates that aren't the inverse of a whole number"""
+    sampler = AccessLogSampler([SamplingRule(rate=0.4)])
+
+    results = [sampler.filter(access_record("/proposals", 200)) for _ in range(100)]
+    assert sum(results) == 40
+    assert sum(results[:5]) == 2
+
+
+def test_sampling_errors():
+    """Should log all errors by default"""
+    sampler = AccessLogSampler([SamplingRule(rate=0.25)])
+
+    assert all(sampler.filter(access_record("/proposals", 500)) for _ in range(10))
+
+
+def test_sampling_rules():
+    """Should apply first matching rule"""
+    sampler = AccessLogSampler(
+        [
+            SamplingRule(rate=0, paths=["/healthz"], status=["2xx", "5xx"]),
+            SamplingRule(rate=0.5, paths=["/proposals/*"]),
+        ]
+    )
+
+    assert not sampler.filter(access_record("/healthz?probe=1", 503))
+    assert sum(sampler.filter(access_record("/proposals/cm1/sessions", 200)) for _ in range(10)) == 5
+    assert sampler.filter(access_record("/sessions", 200))
+
+
+def test_suppress_duplicates():
+    """Should suppress identical messages after burst, reporting suppressed count on next message"""
+    now = [0.0]
+    suppressor = DuplicateSuppressor(rate=1, burst=2, timer=lambda: now[0])
+
+    results = [suppressor.filter(warning_record("/proposals/1")) for _ in range(10)]
+    assert results == [True, True] + [False] * 8
+
+    assert suppressor.filter(warning_record("/proposals/2"))
+
+    now[0] = 1
+    record = warning_record("/proposals/1")
+    assert suppressor.filter(record)
+    assert record.getMessage() == "user @ /proposals/1: Not found (suppressed 8 similar messages)"
+
+
+def test_suppress_duplicates_bounded():
+    """Should only track up to maxsize distinct messages"""
+    suppressor = DuplicateSuppressor(maxsize=10)
+
+    for i in range(100):
+        suppressor.filter(warning_record(f"/proposals/{i}"))
+
+    assert len(suppressor._buckets) == 10
+
+
+def test_suppress_duplicates_summary(caplog):
+    """Should log summary of suppressed messages once they could be logged again, if none get through"""
+    now = [0.0]
+    suppressor = DuplicateSuppressor(rate=1, burst=1, timer=lambda: now[0])
+    caplog.set_level(logging.WARNING, logger="uvicorn")
+
+    assert [suppressor.filter(warning_record("/proposals/1")) for _ in range(4)] == [True, False, False, False]
+    assert caplog.messages == []
+
+    now[0] = 0.5
+    assert suppressor.filter(warning_record("/proposals/2"))
+    assert caplog.messages == []
+
+    now[0] = 1.5
+    assert suppressor.filter(warning_record("/proposals/2"))
+    assert caplog.messages == ["user @ /proposals/1: Not found (suppressed 3 similar messages)"]
+
+    now[0] = 3
+    record = warning_record("/proposals/1")
+    assert suppressor.filter(record)
+    assert record.getMessage() == "user @ /proposals/1: Not found"
+
+
+def test_suppress_duplicates_evicted(caplog):
+    """Should log summary of suppressed messages when they are forgotten"""
+    suppressor = DuplicateSuppressor(rate=0, burst=1, maxsize=2)
+    caplog.set_level(logging.WARNING, logger="uvicorn")
+
+    for _ in range(3):
+        suppressor.filter(warning_record("/proposals/1"))
+    suppressor.filter(warning_record("/proposals/2"))
+    assert caplog.messages == []
+
+    suppressor.filter(warning_record("/proposals/3"))
+    assert caplog.messages == ["user @ /proposals/1: Not found (suppressed 2 similar messages)"]
+
+
+def test_suppress_duplicates_summary_timer(caplog):
+    """Should log summary of suppressed messages once due, without waiting for another record"""
+    suppressor = DuplicateSuppressor(rate=20, burst=1)
+    caplog.set_level(logging.WARNING, logger="uvicorn")
+
+    for _ in range(3):
+        suppressor.filter(warning_record("/proposals/1"))
+
+    time.sleep(0.2)
+    suppressor.close()
+
+    assert caplog.messages == ["user @ /proposals/1: Not found (suppressed 2 similar messages)"]
@@ -0,0 +1,153 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.database import get_session
+from lims_utils.lookups import LookupCache
+from lims_utils.tables import ContainerType, ExperimentType, Proposal  # type: ignore
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def session():
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all(
+            [
+                ExperimentType(experimentTypeId=1, name="SAD"),
+                ExperimentType(experimentTypeId=2, name="MAD"),
+                ContainerType(containerTypeId=1, name="Puck", capacity=16),
+            ]
+        )
+        session.commit()
+
+        statements: list[str] = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        session.info["statements"] = statements
+
+        yield session
+
+    engine.dispose()
+
+
+def test_get(session):
+    """Should get rows by primary key and natural key"""
+    cache = LookupCache()
+
+    assert cache.get(ExperimentType, 2, session).name == "MAD"
+    assert cache.find(ContainerType, "Puck", session).capacity == 16
+    assert cache.get(ExperimentType, 3, session) is None
+    assert [row.name for row in cache.all(ExperimentType, session)] == ["SAD", "MAD"]
+
+
+def test_get_database_session(session):
+    """Should use session from Database if no session is passed"""
+    with get_session(lambda: session):
+        assert LookupCache().find(ExperimentType, "SAD").experimentTypeId == 1
+
+
+def test_read_through(session):
+    """Should only query database once per table while the snapshot is fresh"""
+    cache = LookupCache()
+    for _ in range(5):
+        cache.get(ExperimentType, 1, session)
+
+    # Fingerprint and rows
+    assert len(session.info["statements"]) == 2
+
+
+def test_change_detection(session):
+    """Should reload table if rows were added, but only check fingerprint otherwise"""
+    timer = FakeTimer()
+    cache = LookupCache(check_interval=10, timer=timer)
+    cache.get(ExperimentType, 1, session)
+
+    timer.now = 11
+    assert cache.get(ExperimentType, 3, session) is None
+    assert len(session.info["statements"]) == 3
+
+    session.add(ExperimentType(experimentTypeId=3, name="OSC"))
+    session.commit()
+
+    timer.now = 22
+    assert cache.get(ExperimentType, 3, session).name == "OSC"
+
+
+def test_max_age(session):
+    """Should reload table after max age, even if fingerprint has not changed"""
+    timer = FakeTimer()
+    cache = LookupCache(check_interval=10, max_age=100, timer=timer)
+    cache.get(ExperimentType, 1, session)
+
+    session.get(ExperimentType, 1).name = "Native"
+    session.commit()
+
+    timer.now = 50
+    assert cache.get(ExperimentType, 1, session).name == "SAD"
+
+    timer.now = 101
+    assert cache.get(ExperimentType, 1, session).name == "Native"
+
+
+def test_stale_while_refreshing(session):
+    """Should return current snapshot of stale table while another thread refreshes it, without holding up
+    other tables"""
+    timer = FakeTimer()
+    cache = LookupCache(check_interval=10, timer=timer)
+    cache.get(ExperimentType, 1, session)
+
+    timer.now = 11
+    with cache._locks[ExperimentType]:
+        assert cache.get(ExperimentType, 1, session).name == "SAD"
+        assert cache.find(ContainerType, "Puck", session) is not None
+
+    # Fingerprint and rows for each table, without refreshing the stale one
+    assert len(session.info["statements"]) == 4
+
+
+def test_invalidate(session):
+    """Should reload table after invalidation"""
+    cache = LookupCache()
+    cache.get(ExperimentType, 1, session)
+    cache.invalidate(ExperimentType)
+    cache.get(ExperimentType, 1, session)
+
+    assert len(session.info["statements"]) == 4
+
+
+def test_immutable(session):
+    """Should not allow snapshots to be modified"""
+    snapshot = LookupCache().snapshot(ExperimentType, session)
+
+    with pytest.raises(TypeError):
+        snapshot.by_id[3] = None  # type: ignore
+
+    with pytest.raises(AttributeError):
+        snapshot.rows[0].name = "Changed"
+
+
+def test_join(session):
+    """Should add lookup table columns to items"""
+    items = [
+        {"dataCollectionGroupId": 1, "experimentTypeId": 2},
+        {"dataCollectionGroupId": 2, "experimentTypeId": None},
+    ]
+
+    assert LookupCache().join(items, ExperimentType, "experimentTypeId", {"experimentType": "name"}, session) == [
+        {"dataCollectionGroupId": 1, "experimentTypeId": 2, "experimentType": "MAD"},
+        {"dataCollectionGroupId": 2, "experimentTypeId": None, "experimentType": None},
+    ]
+
+
+def test_not_lookup_table(session):
+    """Should raise exception for tables that aren't cached"""
+    with pytest.raises(KeyError):
+        LookupCache().get(Proposal, 1, session)
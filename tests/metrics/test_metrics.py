@@ -0,0 +1,210 @@
+import multiprocessing
+import os
+import threading
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from tests.mocks import FakeSession
+
+from lims_utils.database import get_session
+from lims_utils.metrics import CONTENT_TYPE, REGISTRY, Registry, _MmapStore, prometheus_router
+from lims_utils.timing import TimingMiddleware, metrics_router
+
+
+def test_render():
+    """Should render metrics in the Prometheus text format"""
+    registry = Registry()
+    registry.counter("requests_total", "Requests handled", ["method"]).labels("GET").inc(2)
+    registry.gauge("in_flight", "Requests in flight").set(3)
+    histogram = registry.histogram("duration_seconds", 'Duration "quoted"', buckets=[0.1, 1])
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+
+    assert registry.render() == "\n".join(
+        [
+            "# HELP requests_total Requests handled",
+            "# TYPE requests_total counter",
+            'requests_total{method="GET"} 2.0',
+            "# HELP in_flight Requests in flight",
+            "# TYPE in_flight gauge",
+            "in_flight 3.0",
+            '# HELP duration_seconds Duration "quoted"',
+            "# TYPE duration_seconds histogram",
+            'duration_seconds_bucket{le="0.1"} 1.0',
+            'duration_seconds_bucket{le="1.0"} 2.0',
+            'duration_seconds_bucket{le="+Inf"} 2.0',
+            "duration_seconds_sum 0.55",
+            "duration_seconds_count 2.0",
+            "",
+        ]
+    )
+
+
+def test_escape_labels():
+    """Should escape quotes, backslashes and newlines in label values"""
+    registry = Registry()
+    registry.counter("errors_total", "Errors", ["message"]).labels('a "b"\\\n').inc()
+
+    assert 'errors_total{message="a \\"b\\"\\\\\\n"} 1.0' in registry.render()
+
+
+def test_register():
+    """Should return existing metric if registered again, and reject conflicting definitions"""
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests", ["method"])
+
+    assert registry.counter("requests_total", "Requests", ["method"]) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Requests", ["method"])
+    with pytest.raises(ValueError):
+        counter.labels("GET", "extra")
+    with pytest.raises(ValueError):
+        counter.labels("GET").inc(-1)
+    with pytest.raises(ValueError, match="labels"):
+        counter.inc()
+
+
+def test_threads():
+    """Should not lose updates made from multiple threads"""
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests")
+
+    def increment():
+        for _ in range(10000):
+            counter.inc()
+
+    threads = [threading.Thread(target=increment) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert "requests_total 80000.0" in registry.render()
+
+
+def _worker(directory: str, amount: int):
+    registry = Registry(multiprocess_dir=directory)
+    registry.counter("requests_total", "Requests", ["method"]).labels("GET").inc(amount)
+    registry.gauge("in_flight", "Requests in flight").set(5)
+    registry.histogram("duration_seconds", "Duration", buckets=[1]).observe(amount)
+
+
+def test_multiprocess(tmp_path):
+    """Should aggregate values of all processes, skipping gauges of processes that have exited"""
+    registry = Registry(multiprocess_dir=tmp_path)
+    registry.counter("requests_total", "Requests", ["method"]).labels("GET").inc()
+    registry.gauge("in_flight", "Requests in flight").set(1)
+    registry.histogram("duration_seconds", "Duration", buckets=[1])
+
+    context = multiprocessing.get_context("fork")
+    for amount in (2, 3):
+        process = context.Process(target=_worker, args=(str(tmp_path), amount))
+        process.start()
+        process.join()
+
+    rendered = registry.render()
+
+    assert len(list(tmp_path.glob("*.db"))) == 3
+    assert 'requests_total{method="GET"} 6.0' in rendered
+    assert "in_flight 1.0" in rendered
+    assert 'duration_seconds_bucket{le="1.0"} 0.0' in rendered
+    assert 'duration_seconds_bucket{le="+Inf"} 2.0' in rendered
+    assert "duration_seconds_sum 5.0" in rendered
+
+
+def test_multiprocess_grow(tmp_path):
+    """Should grow file once it is full, keeping existing values"""
+    registry = Registry(multiprocess_dir=tmp_path)
+    counter = registry.counter("requests_total", "Requests", ["route"])
+
+    for i in range(2000):
+        counter.labels(f"/route/{i}").inc(i)
+
+    rendered = registry.render()
+    assert 'requests_total{route="/route/0"} 0.0' in rendered
+    assert 'requests_total{route="/route/1999"} 1999.0' in rendered
+
+
+def test_multiprocess_reopen(tmp_path):
+    """Should keep values written to an existing file by the same process"""
+    Registry(multiprocess_dir=tmp_path).counter("requests_total", "Requests").inc(2)
+
+    registry = Registry(multiprocess_dir=tmp_path)
+    registry.counter("requests_total", "Requests").inc()
+
+    assert "requests_total 3.0" in registry.render()
+
+
+def test_multiprocess_lazy(tmp_path):
+    """Should only create file once a value is updated, reporting metrics created before that as 0"""
+    registry = Registry(multiprocess_dir=tmp_path)
+    counter = registry.counter("requests_total", "Requests")
+    registry.gauge("in_flight", "Requests in flight", ["route"]).labels("/proposals")
+
+    assert list(tmp_path.iterdir()) == []
+    assert "requests_total 0.0" in registry.render()
+    assert 'in_flight{route="/proposals"} 0.0' in registry.render()
+
+    counter.inc()
+    assert [path.name for path in tmp_path.iterdir()] == [f"{os.getpid()}.db"]
+
+
+def test_multiprocess_stale_file(tmp_path):
+    """Should empty file left behind by an earlier process with the same PID"""
+    _MmapStore(tmp_path).add(((("requests_total", "", ()), 5),))
+
+    registry = Registry(multiprocess_dir=tmp_path)
+    registry.counter("requests_total", "Requests").inc()
+
+    assert "requests_total 1.0" in registry.render()
+
+
+@pytest.mark.asyncio
+async def test_router():
+    """Should serve metrics with Prometheus content type"""
+    registry = Registry()
+    registry.counter("requests_total", "Requests").inc()
+
+    app = FastAPI()
+    app.include_router(prometheus_router(registry))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/metrics")
+
+    assert response.headers["content-type"] == CONTENT_TYPE
+    assert "requests_total 1.0" in response.text
+
+
+@pytest.mark.asyncio
+async def test_router_with_timing():
+    """Should not clash with request measurements router"""
+    app = FastAPI()
+    app.add_middleware(TimingMiddleware)
+    app.include_router(prometheus_router(Registry()))
+    app.include_router(metrics_router(app))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        prometheus, timing = await client.get("/metrics"), await client.get("/metrics/requests")
+
+    assert prometheus.headers["content-type"] == CONTENT_TYPE
+    assert "routes" in timing.json()
+
+
+def test_session_metrics():
+    """Should count open sessions and rollbacks in the default registry"""
+
+    def rollbacks():
+        line = next(line for line in REGISTRY.render().splitlines() if line.startswith("lims_db_session_rollbacks"))
+        return float(line.split()[-1])
+
+    before = rollbacks()
+    with pytest.raises(ValueError):
+        with get_session(lambda: FakeSession()):  # type: ignore[arg-type]
+            assert "lims_db_sessions_open 1.0" in REGISTRY.render()
+            raise ValueError("Failure")
+
+    assert rollbacks() == before + 1
+    assert "lims_db_sessions_open 0.0" in REGISTRY.render()
@@ -1,4 +1,7 @@
-from sqlalchemy import Select
+from sqlalchemy import Column, MetaData, Select, Table, create_engine
+from sqlalchemy.pool import StaticPool
+
+from lims_utils.tables import Base  # type: ignore
 
 
 class FakeExecute:
@@ -27,3 +30,24 @@ def query_eq(q1: Select, q2: Select):
     return str(q1.compile(compile_kwargs={"literal_binds": True})) == str(
         q2.compile(compile_kwargs={"literal_binds": True})
     )
+
+
+def create_sqlite_engine():
+    """Create in-memory SQLite database containing simplified (generic types, no constraints) versions of all
+    table models, for tests that need to run actual queries"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    metadata = MetaData()
+
+    for table in Base.metadata.sorted_tables:
+        Table(
+            table.name,
+            metadata,
+            *(
+                Column(column.name, column.type.as_generic(), primary_key=column.primary_key)
+                for column in table.columns
+            ),
+        )
+
+    metadata.create_all(engine)
+
+    return engine
@@ -0,0 +1,123 @@
+import datetime
+import json
+from decimal import Decimal
+from unittest.mock import patch
+from uuid import UUID
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.models import FastJSONResponse, Paged, dump_json
+from lims_utils.tables import GridInfo, Proposal, XRFFluorescenceMapping  # type: ignore
+
+EXTERNAL_ID = UUID("12345678-1234-5678-1234-567812345678")
+
+
+@pytest.fixture
+def proposal():
+    return Proposal(
+        proposalId=1,
+        personId=2,
+        proposalCode="cm",
+        proposalNumber="1",
+        externalId=EXTERNAL_ID.bytes,
+        startDate=datetime.datetime(2024, 1, 2, 3, 4, 5),
+        state="Open",
+    )
+
+
+@pytest.fixture(params=[True, False], ids=["orjson", "json"])
+def use_orjson(request):
+    if request.param:
+        yield
+    else:
+        with patch("lims_utils.models.orjson", new=None):
+            yield
+
+
+def test_orm_object(use_orjson, proposal):
+    """Should serialise columns of ORM object"""
+    data = json.loads(dump_json(proposal))
+
+    assert data["proposalId"] == 1
+    assert data["externalId"] == str(EXTERNAL_ID)
+    assert data["startDate"] == "2024-01-02T03:04:05"
+    assert data["state"] == "Open"
+    assert data["title"] is None
+    assert "BLSession" not in data
+
+
+def test_decimal(use_orjson):
+    """Should serialise decimals as numbers"""
+    data = json.loads(dump_json(GridInfo(gridInfoId=1, dx_mm=Decimal("0.25"), steps_x=Decimal("10"))))
+
+    assert data["dx_mm"] == 0.25
+    assert data["steps_x"] == 10
+
+
+def test_decimal_not_finite(use_orjson):
+    """Should serialise decimals that aren't finite as null"""
+    data = json.loads(dump_json({"a": Decimal("NaN"), "b": Decimal("Infinity"), "c": Decimal("-Infinity")}))
+
+    assert data == {"a": None, "b": None, "c": None}
+
+
+def test_deferred_columns(use_orjson):
+    """Should not serialise (and load) deferred columns"""
+    assert "data" not in json.loads(dump_json(XRFFluorescenceMapping(xrfFluorescenceMappingId=1)))
+
+
+def test_paged(use_orjson, proposal):
+    """Should serialise page"""
+    data = json.loads(dump_json(Paged.from_trusted(items=[proposal], total=1, page=0, limit=25)))
+
+    assert data["total"] == 1
+    assert data["items"][0]["proposalId"] == 1
+
+
+def test_rows(use_orjson, proposal):
+    """Should serialise rows as objects"""
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add(proposal)
+        session.commit()
+        rows = session.execute(select(Proposal.proposalId, Proposal.bltimeStamp, Proposal.title)).all()
+
+    assert json.loads(dump_json(rows)) == [{"proposalId": 1, "bltimeStamp": None, "title": None}]
+
+
+def test_rows_uuid(use_orjson, proposal):
+    """Should serialise BINARY(16) columns in rows as UUIDs, as in ORM objects"""
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add(proposal)
+        session.commit()
+        rows = session.execute(select(Proposal.proposalId, Proposal.externalId)).all()
+
+    assert json.loads(dump_json(rows)) == [{"proposalId": 1, "externalId": str(EXTERNAL_ID)}]
+
+
+def test_binary(use_orjson):
+    """Should base64 encode binary data"""
+    assert json.loads(dump_json({"a": b"\x00\xff"})) == {"a": "AP8="}
+
+
+def test_non_string_keys(use_orjson):
+    """Should convert non-string keys to strings, whether orjson is installed or not"""
+    assert json.loads(dump_json({1: "a", 2.5: "b", None: "c"})) == {"1": "a", "2.5": "b", "null": "c"}
+
+
+def test_unsupported(use_orjson):
+    """Should raise error if object can't be serialised"""
+    with pytest.raises(TypeError):
+        dump_json({"a": object()})
+
+
+def test_response(proposal):
+    """Should render page in response"""
+    response = FastJSONResponse(Paged.from_trusted(items=[proposal], total=1, page=0, limit=25))
+
+    assert response.headers["content-type"] == "application/json"
+    assert json.loads(response.body)["items"][0]["proposalCode"] == "cm"
@@ -1,6 +1,6 @@
 import pytest
 
-from lims_utils.models import pagination
+from lims_utils.models import Paged, pagination
 
 
 @pytest.mark.asyncio
@@ -10,3 +10,12 @@ async def test_pagination(caplog):
 
     assert pagination_model["page"] == 5
     assert pagination_model["limit"] == 50
+
+
+def test_paged_from_trusted():
+    """Should build page without converting items"""
+    items = ("a", "b")
+    page = Paged.from_trusted(items=items, total=2, page=0, limit=25)
+
+    assert page.items is items
+    assert page.total == 2
@@ -1,7 +1,7 @@
 import pytest
 from pydantic import ValidationError
 
-from lims_utils.models import ProposalReference, parse_proposal
+from lims_utils.models import ProposalReference, parse_proposal, parse_proposals
 
 
 def test_proposal_reference():
@@ -47,3 +47,41 @@ def test_string():
 def test_string_with_visit():
     """Should provide conversion to string (with visit number)"""
     str(ProposalReference(code="cm", number=1, visit_number=5)) == "cm1-5"
+
+
+def test_fast_path_equivalent():
+    """Should return the same object as the validated path"""
+    assert parse_proposal("cm123", 1) == ProposalReference(code="cm", number=123, visit_number=1)
+
+
+def test_proposal_reference_leading_zeros():
+    """Should handle numbers with leading zeros"""
+    assert parse_proposal("cm00123").number == 123
+
+
+def test_parse_proposals():
+    """Should parse list of references, with or without visit numbers"""
+    assert parse_proposals(["cm123", "mx5-2"]) == [
+        ProposalReference(code="cm", number=123),
+        ProposalReference(code="mx", number=5, visit_number=2),
+    ]
+
+
+def test_parse_proposals_errors():
+    """Should return errors for each invalid item"""
+    results = parse_proposals(["cm1", "c0123", "c", "cm1a-2"])
+
+    assert results[0] == ProposalReference(code="cm", number=1)
+    assert isinstance(results[1], ValidationError)
+    assert isinstance(results[2], ValueError)
+    assert isinstance(results[3], ValidationError)
+
+
+def test_immutable():
+    """Should not allow cached references to be modified"""
+    reference = parse_proposal("cm123")
+
+    with pytest.raises(ValidationError):
+        reference.number = 1  # type: ignore[misc]
+
+    assert reference.model_copy(update={"number": 1}).number == 1
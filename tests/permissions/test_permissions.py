@@ -0,0 +1,100 @@
+import dataclasses
+import json
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.auth import GenericUser
+from lims_utils.permissions import PermissionIndex, require_permission
+from lims_utils.tables import Permission  # type: ignore
+
+
+def new_user(*permissions: str):
+    return GenericUser(
+        fedid="abc12345", id="1", familyName="Doe", title="Dr", givenName="Jane", permissions=frozenset(permissions)
+    )
+
+
+def get_user():
+    pass
+
+
+def test_user_immutable():
+    """Should store permissions as frozenset and not allow user to be modified"""
+    user = new_user("em_admin", "mx_admin")
+
+    assert user.permissions == frozenset(["em_admin", "mx_admin"])
+    assert user.has_permission("mx_admin", "super_admin")
+    assert not user.has_permission("super_admin")
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        user.fedid = "other"  # type: ignore
+
+
+def test_require_permission():
+    """Should return user if they have any of the permissions"""
+    check = require_permission("em_admin", "super_admin", user=get_user)
+    user = new_user("em_admin")
+
+    assert check(user) is user
+
+
+def test_require_permission_forbidden():
+    """Should raise 403 if user has none of the permissions"""
+    check = require_permission("em_admin", user=get_user)
+
+    with pytest.raises(HTTPException) as exc:
+        check(new_user("mx_admin"))
+
+    assert exc.value.status_code == 403
+
+
+def test_require_all_permissions():
+    """Should require all permissions if require_all is set"""
+    check = require_permission("em_admin", "mx_admin", user=get_user, require_all=True)
+
+    assert check(new_user("em_admin", "mx_admin", "other"))
+    with pytest.raises(HTTPException):
+        check(new_user("em_admin"))
+
+
+def test_permission_index():
+    """Should build masks from permission types, ignoring unknown types"""
+    index = PermissionIndex(["em_admin", "mx_admin", "super_admin"])
+    required = index.mask(["mx_admin", "super_admin"])
+
+    assert index.user_mask(new_user("mx_admin", "unknown")) & required
+    assert not index.user_mask(new_user("em_admin")) & required
+
+
+def test_permission_index_from_database():
+    """Should assign bits to permissions in the Permission table"""
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all([Permission(permissionId=1, type="em_admin"), Permission(permissionId=2, type="mx_admin")])
+        session.commit()
+
+        index = PermissionIndex.from_database(session)
+
+    engine.dispose()
+
+    assert index.bits == {"em_admin": 1, "mx_admin": 2}
+
+
+def test_user_from_json():
+    """Should build user with permissions from any iterable, such as a JSON list"""
+    user = GenericUser(
+        **json.loads(
+            '{"fedid": "abc12345", "id": "1", "familyName": "Doe", "title": "Dr", "givenName": "Jane",'
+            '"permissions": ["em_admin", "em_admin"]}'
+        )
+    )
+
+    assert user.permissions == frozenset({"em_admin"})
+    assert user.has_permission("em_admin")
+    assert dataclasses.replace(user, permissions=["mx_admin"]).permissions == frozenset({"mx_admin"})
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        user.fedid = "xyz98765"  # type: ignore[misc]
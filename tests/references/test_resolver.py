@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.database import get_session
+from lims_utils.models import parse_proposal
+from lims_utils.references import ReferenceResolver, ResolvedReference
+from lims_utils.tables import BLSession, Proposal  # type: ignore
+
+
+@pytest.fixture
+def session():
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all(
+            [
+                Proposal(proposalId=1, proposalCode="cm", proposalNumber="1", personId=1),
+                Proposal(proposalId=2, proposalCode="mx", proposalNumber="2", personId=1),
+                BLSession(sessionId=10, proposalId=1, visit_number=1),
+                BLSession(sessionId=11, proposalId=1, visit_number=2),
+                BLSession(sessionId=20, proposalId=2, visit_number=1),
+            ]
+        )
+        session.commit()
+
+        statements: list[str] = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        session.info["statements"] = statements
+
+        yield session
+
+    engine.dispose()
+
+
+def test_resolve(session: Session):
+    """Should resolve proposal and session IDs"""
+    resolver = ReferenceResolver()
+
+    assert resolver.resolve(parse_proposal("cm1"), session) == ResolvedReference(proposalId=1)
+    assert resolver.resolve(parse_proposal("cm1", 2), session) == ResolvedReference(proposalId=1, sessionId=11)
+
+
+def test_resolve_database_session(session):
+    """Should use session from Database if no session is passed"""
+    with get_session(lambda: session):
+        assert ReferenceResolver().resolve(parse_proposal("mx2", 1)) == ResolvedReference(proposalId=2, sessionId=20)
+
+
+def test_resolve_missing(session: Session):
+    """Should return None for proposals or sessions that don't exist"""
+    resolver = ReferenceResolver()
+
+    assert resolver.resolve(parse_proposal("cm3"), session) is None
+    assert resolver.resolve(parse_proposal("cm1", 5), session) is None
+
+
+def test_cache(session: Session):
+    """Should not query database for cached references (including negative results)"""
+    resolver = ReferenceResolver()
+    resolver.resolve(parse_proposal("cm1", 1), session)
+    resolver.resolve(parse_proposal("cm3"), session)
+    resolver.resolve(parse_proposal("cm1", 1), session)
+    resolver.resolve(parse_proposal("cm3"), session)
+
+    assert len(session.info["statements"]) == 2
+
+
+def test_resolve_many(session: Session):
+    """Should resolve all references with a single query"""
+    resolver = ReferenceResolver()
+    references = [parse_proposal("cm1"), parse_proposal("cm1", 2), parse_proposal("mx2", 1), parse_proposal("mx2", 2)]
+
+    assert resolver.resolve_many(references, session) == [
+        ResolvedReference(proposalId=1),
+        ResolvedReference(proposalId=1, sessionId=11),
+        ResolvedReference(proposalId=2, sessionId=20),
+        None,
+    ]
+    assert len(session.info["statements"]) == 1
+
+
+def test_invalidate(session: Session):
+    """Should query database again after reference is invalidated"""
+    resolver = ReferenceResolver()
+    resolver.resolve(parse_proposal("cm1"), session)
+    resolver.invalidate(parse_proposal("cm1"))
+    resolver.resolve(parse_proposal("cm1"), session)
+
+    assert len(session.info["statements"]) == 2
@@ -1,3 +1,5 @@
+import json
+import os
 from unittest.mock import patch
 
 import pytest
@@ -63,3 +65,39 @@ async def test_nested(mock_json_loads):
     assert settings.nested.nested.endpoint == "https://localhost/diff-auth"
 
     assert settings.db.pool == 90
+
+
+def test_parse_once(tmp_path, monkeypatch):
+    """Should parse config file once, until it is modified"""
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"auth": {"endpoint": "https://localhost/first"}, "db": {"pool": 5}}))
+    monkeypatch.setenv("CONFIG_PATH", str(config))
+
+    with patch("lims_utils.settings.json.loads", wraps=json.loads) as mock_json_loads:
+        ExpandedSettings(nested={"nested": {}})
+        settings = Settings()
+        assert mock_json_loads.call_count == 1
+        assert settings.db.pool == 5
+
+        config.write_text(json.dumps({"auth": {"endpoint": "https://localhost/second"}}))
+        os.utime(config, ns=(0, 0))
+
+        assert Settings().auth.endpoint == "https://localhost/second"
+        assert mock_json_loads.call_count == 2
+
+
+def test_parse_replaced(tmp_path, monkeypatch):
+    """Should parse config file again if it is replaced by a file with the same size and modification time"""
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"db": {"pool": 5}}))
+    os.utime(config, ns=(0, 0))
+    monkeypatch.setenv("CONFIG_PATH", str(config))
+
+    assert Settings().db.pool == 5
+
+    replacement = tmp_path / "replacement.json"
+    replacement.write_text(json.dumps({"db": {"pool": 6}}))
+    os.utime(replacement, ns=(0, 0))
+    os.replace(replacement, config)
+
+    assert Settings().db.pool == 6
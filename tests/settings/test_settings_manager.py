@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+
+import pytest
+from pydantic import model_validator
+
+from lims_utils.settings import Settings, SettingsManager, _inotify_watch
+
+
+class FailingSettings(Settings):
+    @model_validator(mode="after")
+    def fail_without_pool(self):
+        if self.db.pool == 0:
+            raise RuntimeError("Unexpected failure")
+        return self
+
+
+def skip_without_inotify(directory):
+    fd = _inotify_watch(directory)
+    if fd is None:
+        pytest.skip("inotify not available")
+    os.close(fd)
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"db": {"pool": 5}}))
+    monkeypatch.setenv("CONFIG_PATH", str(path))
+    return path
+
+
+def watch(config, manager: SettingsManager):
+    changes: list[tuple[Settings, Settings]] = []
+    changed = threading.Event()
+
+    def on_change(old, new):
+        changes.append((old, new))
+        changed.set()
+
+    manager.subscribe(on_change)
+    manager.start()
+
+    config.write_text(json.dumps({"db": {"pool": 10, "overflow": 20}}))
+    assert changed.wait(5)
+    manager.stop()
+
+    return changes
+
+
+def test_poll(config):
+    """Should swap in new settings and notify subscribers when the config file changes"""
+    manager = SettingsManager(poll_interval=0.01, use_inotify=False)
+    changes = watch(config, manager)
+
+    assert manager.settings.db.pool == 10
+    assert changes[0][0].db.pool == 5
+    assert changes[0][1] is manager.settings
+
+
+def test_inotify(config):
+    """Should watch config file with inotify if available"""
+    skip_without_inotify(config.parent)
+
+    manager = SettingsManager(poll_interval=0.1)
+    changes = watch(config, manager)
+
+    assert manager.settings.db.overflow == 20
+    assert len(changes) == 1
+
+
+@pytest.mark.parametrize("contents", ["{", "[]", json.dumps({"db": {"pool": "many"}})])
+def test_invalid(config, contents):
+    """Should keep previous settings if the config file is invalid"""
+    manager = SettingsManager()
+    manager.reload()
+    changes = []
+    manager.subscribe(lambda old, new: changes.append(new))
+
+    config.write_text(contents)
+
+    assert not manager.reload()
+    assert manager.settings.db.pool == 5
+    assert changes == []
+
+
+def test_inotify_symlink_swap(tmp_path, monkeypatch):
+    """Should pick up config file replaced by swapping the symlinked directory it is in, as done for Kubernetes
+    config maps, even though no event names the file"""
+    skip_without_inotify(tmp_path)
+
+    for version, pool in (("v1", 5), ("v2", 10)):
+        (tmp_path / version).mkdir()
+        (tmp_path / version / "config.json").write_text(json.dumps({"db": {"pool": pool, "overflow": pool}}))
+    (tmp_path / "..data").symlink_to("v1")
+    (tmp_path / "config.json").symlink_to("..data/config.json")
+    monkeypatch.setenv("CONFIG_PATH", str(tmp_path / "config.json"))
+
+    manager = SettingsManager(poll_interval=2)
+    changed = threading.Event()
+    manager.subscribe(lambda old, new: changed.set())
+    manager.start()
+
+    (tmp_path / "..data_tmp").symlink_to("v2")
+    os.replace(tmp_path / "..data_tmp", tmp_path / "..data")
+
+    # Well before the poll interval, so that the change must have been picked up through inotify
+    assert changed.wait(1)
+    manager.stop()
+    assert manager.settings.db.pool == 10
+
+
+def test_watch_failure(config):
+    """Should keep watching if reloading fails unexpectedly"""
+    manager = SettingsManager(FailingSettings, poll_interval=0.01, use_inotify=False)
+    manager.start()
+
+    changed = threading.Event()
+    manager.subscribe(lambda old, new: changed.set())
+    config.write_text(json.dumps({"db": {"pool": 0}}))
+    assert not changed.wait(0.2)
+
+    config.write_text(json.dumps({"db": {"pool": 10, "overflow": 20}}))
+    assert changed.wait(5)
+    manager.stop()
+    assert manager.settings.db.pool == 10
+
+
+def test_invalid_initial(config):
+    """Should raise exception if there are no previous settings to fall back to"""
+    config.write_text("{")
+
+    with pytest.raises(ValueError):
+        SettingsManager().reload()
+
+
+def test_subscriber_failure(config):
+    """Should notify all subscribers even if one fails, and stop notifying unsubscribed functions"""
+    manager = SettingsManager()
+    manager.reload()
+    changes = []
+
+    def fail(old, new):
+        raise RuntimeError("Failure")
+
+    manager.subscribe(fail)
+    unsubscribe = manager.subscribe(lambda old, new: changes.append(new.db.pool))
+
+    config.write_text(json.dumps({"db": {"pool": 7}}))
+    assert manager.reload()
+    assert not manager.reload()
+
+    unsubscribe()
+    config.write_text(json.dumps({"db": {"pool": 8}}))
+    assert manager.reload()
+
+    assert changes == [7]
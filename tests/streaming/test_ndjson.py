@@ -0,0 +1,111 @@
+import gzip
+import json
+import time
+
+import anyio
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.streaming import iter_ndjson, ndjson_response, stream_ndjson
+from lims_utils.tables import Proposal  # type: ignore
+
+query = select(Proposal.proposalId, Proposal.proposalNumber).order_by(Proposal.proposalId)
+
+
+@pytest.fixture
+def session():
+    engine = create_sqlite_engine()
+    with Session(engine) as session:
+        session.add_all(
+            [Proposal(proposalId=i, proposalCode="cm", proposalNumber=str(i), personId=1) for i in range(1, 11)]
+        )
+        session.commit()
+
+        yield session
+
+    engine.dispose()
+
+
+def parse(body: bytes):
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+
+def test_iter_ndjson(session):
+    """Should yield rows as JSON lines, in chunks"""
+    chunks = list(iter_ndjson(session, query, chunk_size=4))
+
+    assert len(chunks) == 3
+    assert parse(b"".join(chunks))[0] == {"proposalId": 1, "proposalNumber": "1"}
+
+
+def test_iter_ndjson_scalars(session):
+    """Should serialise ORM objects"""
+    lines = parse(b"".join(iter_ndjson(session, select(Proposal), scalar=False)))
+
+    assert len(lines) == 10
+    assert lines[9]["proposalNumber"] == "10"
+
+
+@pytest.mark.asyncio
+async def test_stream_ndjson_gzip(session):
+    """Should compress output"""
+    body = b"".join([chunk async for chunk in stream_ndjson(session, query, chunk_size=3, compress=True)])
+
+    assert len(parse(gzip.decompress(body))) == 10
+
+
+@pytest.mark.asyncio
+async def test_stream_ndjson_close(session):
+    """Should close cursor if stream is closed early"""
+    stream = stream_ndjson(session, query, chunk_size=1)
+
+    assert parse(await stream.__anext__()) == [{"proposalId": 1, "proposalNumber": "1"}]
+    await stream.aclose()
+
+    assert session.execute(select(Proposal.proposalId)).all()
+
+
+@pytest.mark.asyncio
+async def test_response(session):
+    """Should stream response with its own session, closed once the response is sent"""
+    sessions = []
+
+    def session_maker():
+        sessions.append(Session(session.get_bind()))
+        return sessions[-1]
+
+    response = ndjson_response(query, session_maker, compress=True)  # type: ignore[arg-type]
+    assert sessions == []
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.media_type == "application/x-ndjson"
+    assert len(parse(gzip.decompress(body))) == 10
+    assert len(sessions) == 1
+    assert not sessions[0].in_transaction()
+
+
+@pytest.mark.asyncio
+async def test_response_cancelled(session):
+    """Should close session if the stream is cancelled while a chunk is being fetched, as done by Starlette when
+    the client disconnects"""
+    closed = []
+
+    class TrackedSession(Session):
+        def close(self):
+            super().close()
+            closed.append(self)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", lambda *args: time.sleep(0.2))
+
+    response = ndjson_response(query, lambda: TrackedSession(engine))  # type: ignore[arg-type]
+    with anyio.move_on_after(0.05) as scope:
+        async for _ in response.body_iterator:
+            pass
+
+    assert scope.cancelled_caught
+    assert len(closed) == 1
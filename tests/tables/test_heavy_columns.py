@@ -0,0 +1,37 @@
+from sqlalchemy import LargeBinary, select
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, undefer
+
+from lims_utils.deferral import heavy_columns
+from lims_utils.tables import Proposal, XRFFluorescenceMapping  # type: ignore
+
+
+def test_heavy_columns():
+    """Should list large binary/text columns in model"""
+    assert heavy_columns(XRFFluorescenceMapping) == (XRFFluorescenceMapping.data,)
+
+
+def test_no_heavy_columns():
+    """Should return empty tuple if model has no large columns"""
+    assert heavy_columns(Proposal) == ()
+
+
+def test_deferred_by_default():
+    """Should not select large columns unless explicitly undeferred"""
+    query = select(XRFFluorescenceMapping)
+
+    assert '"XRFFluorescenceMapping".data' not in str(query)
+    assert '"XRFFluorescenceMapping".data' in str(query.options(undefer(XRFFluorescenceMapping.data)))
+
+
+def test_other_models():
+    """Should not defer large columns of models that aren't based on the table models' base class"""
+
+    class OtherBase(DeclarativeBase):
+        pass
+
+    class Attachment(OtherBase):
+        __tablename__ = "Attachment"
+        attachmentId: Mapped[int] = mapped_column(primary_key=True)
+        data: Mapped[bytes] = mapped_column(LargeBinary)
+
+    assert '"Attachment".data' in str(select(Attachment))
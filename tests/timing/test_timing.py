@@ -0,0 +1,135 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from tests.mocks import create_sqlite_engine
+
+from lims_utils.auth import AuthResolver, GenericUser
+from lims_utils.metrics import Registry
+from lims_utils.models import FastJSONResponse
+from lims_utils.timing import TimingMiddleware, instrument_engine, metrics_router, timed
+
+
+async def validate(token: str):
+    await asyncio.sleep(0.01)
+    return GenericUser(fedid="abc12345", id="1", familyName="", title="", givenName="", permissions=frozenset())
+
+
+@pytest.fixture
+def app():
+    engine = create_sqlite_engine()
+    instrument_engine(engine)
+    instrument_engine(engine)
+
+    app = FastAPI()
+    resolver = AuthResolver(validate)
+
+    @app.get("/proposals/{proposalReference}")
+    def get_proposal(proposalReference: str, user=Depends(resolver)):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1")).all()
+        return FastJSONResponse({"proposal": proposalReference})
+
+    @app.get("/failure")
+    def get_failure():
+        raise ValueError("Failure")
+
+    @app.get("/query-failure")
+    def get_query_failure():
+        with engine.connect() as conn:
+            try:
+                conn.execute(text("SELECT * FROM unknown_table"))
+            except OperationalError:
+                assert conn.info == {}
+        return {}
+
+    app.add_middleware(TimingMiddleware, buckets=[1, 0.001])
+    app.include_router(metrics_router(app))
+    return app
+
+
+async def get(app, *paths: str):
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return [await client.get(path, headers={"Authorization": "Bearer token"}) for path in paths]
+
+
+def get_route(snapshot, route: str):
+    return next(r for r in snapshot["routes"] if r["route"] == route)
+
+
+@pytest.mark.asyncio
+async def test_route_stats(app):
+    """Should group requests by route template, recording status codes and latency histogram"""
+    await get(app, "/proposals/cm1", "/proposals/cm2", "/failure")
+    (response,) = await get(app, "/metrics/requests")
+
+    snapshot = response.json()
+    proposals = get_route(snapshot, "/proposals/{proposalReference}")
+
+    assert snapshot["in_flight"] == 1
+    assert proposals["count"] == 2
+    assert proposals["statuses"] == {"200": 2}
+    assert proposals["histogram"]["+Inf"] == 2
+    assert list(proposals["histogram"]) == ["0.001", "1", "+Inf"]
+    assert get_route(snapshot, "/failure")["statuses"] == {"500": 1}
+
+
+@pytest.mark.asyncio
+async def test_phases(app):
+    """Should split time spent in auth, database and serialization"""
+    await get(app, "/proposals/cm1")
+    (response,) = await get(app, "/metrics/requests")
+
+    phases = get_route(response.json(), "/proposals/{proposalReference}")["phases"]
+
+    assert 0.01 <= phases["auth"] < 1
+    assert phases["db"] > 0
+    assert phases["serialization"] > 0
+
+
+@pytest.mark.asyncio
+async def test_query_failure(app):
+    """Should count time spent in failed queries, without leaving state on the connection"""
+    (failure,) = await get(app, "/query-failure")
+    (response,) = await get(app, "/metrics/requests")
+
+    assert failure.status_code == 200
+    assert get_route(response.json(), "/query-failure")["phases"]["db"] > 0
+
+
+@pytest.mark.asyncio
+async def test_unmatched(app):
+    """Should group requests that don't match a route together"""
+    await get(app, "/unknown/1", "/unknown/2")
+    (response,) = await get(app, "/metrics/requests")
+
+    assert get_route(response.json(), "<unmatched>")["statuses"] == {"404": 2}
+
+
+def test_timed_outside_request():
+    """Should do nothing outside of requests"""
+    with timed("db"):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_registry():
+    """Should also record measurements in metrics registry if set"""
+    registry = Registry()
+    timed_app = FastAPI()
+
+    @timed_app.get("/items/{itemId}")
+    def get_item(itemId: int):
+        return {"id": itemId}
+
+    timed_app.add_middleware(TimingMiddleware, registry=registry)
+    await get(timed_app, "/items/1", "/items/2")
+
+    rendered = registry.render()
+    assert 'lims_http_requests_total{method="GET",route="/items/{itemId}",status="200"} 2.0' in rendered
+    assert 'lims_http_request_duration_seconds_count{method="GET",route="/items/{itemId}"} 2.0' in rendered
+    assert "lims_http_requests_in_flight 0.0" in rendered
@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from lims_utils.tables import GridInfo  # type: ignore
+from lims_utils.xrf import blend, composite, decode_map, grid_shape, parse_data_format, scale
+
+
+def test_parse_data_format():
+    """Should split compression and encoding"""
+    assert parse_data_format("json+gzip") == (["gzip"], "json")
+    assert parse_data_format("gzip+float32") == (["gzip"], "float32")
+
+
+def test_parse_data_format_invalid():
+    """Should raise error if encoding is unknown"""
+    with pytest.raises(ValueError):
+        parse_data_format("gzip+notadtype")
+
+
+def test_decode_binary_no_copy():
+    """Should decode raw binary data without copying it"""
+    data = np.arange(6, dtype=np.float32).tobytes()
+    decoded = decode_map(data, "float32", shape=(2, 3))
+
+    assert decoded.shape == (2, 3)
+    assert not decoded.flags.owndata
+    assert np.shares_memory(decoded, np.frombuffer(data, dtype=np.uint8))
+
+
+def test_decode_json_gzip():
+    """Should decode compressed JSON data"""
+    data = gzip.compress(json.dumps([1, 2, 3, 4]).encode())
+
+    np.testing.assert_array_equal(decode_map(data, "json+gzip", shape=(2, 2)), [[1, 2], [3, 4]])
+
+
+def test_decode_partial():
+    """Should pad partially collected maps with NaN"""
+    decoded = decode_map(np.arange(3, dtype=np.uint16).tobytes(), "uint16", shape=(2, 2))
+
+    assert np.isnan(decoded[1, 1])
+    assert decoded[0, 1] == 1
+
+
+def test_decode_snaked():
+    """Should reverse odd rows if grid is snaked"""
+    decoded = decode_map(np.arange(6, dtype=np.int32).tobytes(), "int32", shape=(2, 3), snaked=True)
+
+    np.testing.assert_array_equal(decoded, [[0, 1, 2], [5, 4, 3]])
+
+
+def test_grid_shape():
+    """Should return grid shape as rows, columns"""
+    assert grid_shape(GridInfo(steps_x=10, steps_y=5)) == (5, 10)
+
+
+def test_scale():
+    """Should scale map to [0, 1]"""
+    np.testing.assert_allclose(scale(np.array([2, 4, np.nan, 6])), [0, 0.5, 0, 1])
+
+
+def test_scale_clip():
+    """Should clip values outside of provided range"""
+    np.testing.assert_allclose(scale(np.array([0, 5, 10]), 2, 8), [0, 0.5, 1])
+
+
+def test_blend():
+    """Should blend layers according to opacity"""
+    blended = blend([np.ones(2), np.zeros(2)], [1, 0.25])
+
+    np.testing.assert_allclose(blended, [0.75, 0.75])
+
+
+def test_composite():
+    """Should build RGBA image out of three layers"""
+    layer = np.array([[0, 1], [2, 4]], dtype=np.float32)
+    image = composite(layer, layer, np.zeros((2, 2)), g_opacity=0.5, opacity=0.5)
+
+    assert image.shape == (2, 2, 4)
+    assert image.dtype == np.uint8
+    np.testing.assert_array_equal(image[1, 1], [255, 128, 0, 128])